@@ -0,0 +1,1819 @@
+"""
+Benchmarks for the Munder Difflin helper functions and agent pipeline.
+
+Every benchmark runs against a throwaway SQLite database in a temporary directory, so the
+project's own munder_difflin.db is never touched. Run from the repository root (the seed
+CSVs are read from the working directory):
+
+    python benchmarks.py financial_report --sizes 1000,10000,100000,1000000
+    python benchmarks.py catalog_matcher --sizes 46,50000
+    python benchmarks.py pipeline --latency-ms 0
+"""
+import argparse
+import ast
+import io
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, redirect_stdout
+from typing import Callable, Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event, Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql import text
+
+# Benchmarks never call a hosted model; the offline backend needs no API key
+os.environ.setdefault("MODEL_BACKEND", "scripted")
+
+import agent_team  # noqa: E402
+import project_starter as ps  # noqa: E402
+from smolagents import ChatMessage, ChatMessageToolCall, MessageRole, Model, TokenUsage, ToolCallingAgent  # noqa: E402
+from smolagents.models import ChatMessageToolCallFunction  # noqa: E402
+
+
+# =====================================================================
+# Shared helpers
+# =====================================================================
+
+@contextmanager
+def temporary_database(engine_factory: Callable[[str], Engine] = ps.create_db_engine) -> Iterator[Engine]:
+    """Point project_starter at a freshly initialized database in a temp directory.
+
+    `engine_factory` builds the engine from the database path (default: the project's
+    create_db_engine configuration).
+    """
+    original_engine = ps.db_engine
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = engine_factory(os.path.join(tmp_dir, "benchmark.db"))
+        ps.db_engine = engine
+        try:
+            ps.init_database(engine)
+            yield engine
+        finally:
+            ps.db_engine = original_engine
+            engine.dispose()
+
+
+def seed_transactions(engine: Engine, count: int, seed: int = 7) -> None:
+    """Bulk-insert `count` synthetic sales and stock orders dated through 2025, then rebuild the ledger.
+
+    Rows bypass create_transaction() so millions of them load in seconds; the stock and cash
+    ledgers are rebuilt once at the end instead.
+    """
+    rng = np.random.default_rng(seed)
+    item_names = pd.read_sql("SELECT item_name FROM inventory", engine)["item_name"].to_numpy()
+    days = pd.date_range("2025-01-02", "2025-12-31").strftime("%Y-%m-%d").to_numpy()
+    dates = np.sort(days[rng.integers(0, len(days), count)]).tolist()
+
+    rows = zip(
+        item_names[rng.integers(0, len(item_names), count)].tolist(),
+        np.where(rng.random(count) < 0.7, "sales", "stock_orders").tolist(),
+        rng.integers(1, 50, count).tolist(),
+        np.round(rng.random(count) * 20, 2).tolist(),
+        dates,
+        [ps._day_number(date) for date in dates],
+    )
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO transactions (item_name, transaction_type, units, price, transaction_date, transaction_day) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            list(rows),
+        )
+    ps.rebuild_ledgers(engine)
+
+
+def median_seconds(fn: Callable[[], object], repeat: int) -> float:
+    """Run `fn` `repeat` times and return the median wall time in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def peak_allocated_mb(fn: Callable[[], object]) -> float:
+    """Run `fn` once under tracemalloc and return its peak Python allocation in MB."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def print_table(rows: List[Dict]) -> None:
+    """Print benchmark rows as an aligned table."""
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+# =====================================================================
+# generate_financial_report
+# =====================================================================
+
+def legacy_financial_report(as_of_date: str) -> Dict:
+    """Reference copy of the original report: full-ledger cash read plus one stock query per item."""
+    transactions = pd.read_sql(
+        text("SELECT * FROM transactions WHERE transaction_date <= :as_of_date"),
+        ps.db_engine,
+        params={"as_of_date": as_of_date},
+    )
+    cash = float(
+        transactions.loc[transactions["transaction_type"] == "sales", "price"].sum()
+        - transactions.loc[transactions["transaction_type"] == "stock_orders", "price"].sum()
+    )
+
+    inventory_df = pd.read_sql("SELECT * FROM inventory", ps.db_engine)
+    inventory_value = 0.0
+    for _, item in inventory_df.iterrows():
+        stock = pd.read_sql(
+            text("""
+                SELECT COALESCE(SUM(CASE
+                    WHEN transaction_type = 'stock_orders' THEN units
+                    WHEN transaction_type = 'sales' THEN -units
+                    ELSE 0
+                END), 0) AS current_stock
+                FROM transactions
+                WHERE item_name = :item_name AND transaction_date <= :as_of_date
+            """),
+            ps.db_engine,
+            params={"item_name": item["item_name"], "as_of_date": as_of_date},
+        )["current_stock"].iloc[0]
+        inventory_value += stock * item["unit_price"]
+
+    top_sales = pd.read_sql(
+        text("""
+            SELECT item_name, SUM(units) as total_units, SUM(price) as total_revenue
+            FROM transactions
+            WHERE transaction_type = 'sales' AND transaction_date <= :as_of_date
+            GROUP BY item_name
+            ORDER BY total_revenue DESC
+            LIMIT 5
+        """),
+        ps.db_engine,
+        params={"as_of_date": as_of_date},
+    )
+    return {
+        "cash_balance": cash,
+        "inventory_value": inventory_value,
+        "top_selling_products": top_sales.to_dict(orient="records"),
+    }
+
+
+def bench_financial_report(sizes: List[int], repeat: int) -> None:
+    """Per-report latency of the N+1 report vs. the set-based one as the ledger grows."""
+    rows = []
+    for size in sizes:
+        with temporary_database() as engine:
+            seed_transactions(engine, size)
+            # Mid-year exercises checkpoint + tail replay; year-end reads the running balances
+            for as_of_date in ("2025-06-30", "2025-12-31"):
+                legacy = legacy_financial_report(as_of_date)
+                current = ps.generate_financial_report(as_of_date)
+                assert abs(legacy["inventory_value"] - current["inventory_value"]) < 1e-6
+                assert abs(legacy["cash_balance"] - current["cash_balance"]) < 1e-3
+                assert [p["item_name"] for p in legacy["top_selling_products"]] == [
+                    p["item_name"] for p in current["top_selling_products"]
+                ]
+
+                legacy_s = median_seconds(lambda: legacy_financial_report(as_of_date), repeat)
+                current_s = median_seconds(lambda: ps.generate_financial_report(as_of_date), repeat)
+                rows.append({
+                    "transactions": size,
+                    "as_of_date": as_of_date,
+                    "legacy_ms": round(legacy_s * 1000, 2),
+                    "set_based_ms": round(current_s * 1000, 2),
+                    "speedup": round(legacy_s / current_s, 1),
+                })
+    print_table(rows)
+
+
+# =====================================================================
+# get_cash_balance
+# =====================================================================
+
+def legacy_cash_balance(as_of_date: str) -> float:
+    """Reference copy of the original get_cash_balance: load every transaction, sum in pandas."""
+    transactions = pd.read_sql(
+        text("SELECT * FROM transactions WHERE transaction_date <= :as_of_date"),
+        ps.db_engine,
+        params={"as_of_date": as_of_date},
+    )
+    total_sales = transactions.loc[transactions["transaction_type"] == "sales", "price"].sum()
+    total_purchases = transactions.loc[transactions["transaction_type"] == "stock_orders", "price"].sum()
+    return float(total_sales - total_purchases)
+
+
+def bench_cash_balance(sizes: List[int], repeat: int) -> None:
+    """Latency and peak memory of one cash balance read as the ledger grows."""
+    rows = []
+    for size in sizes:
+        with temporary_database() as engine:
+            seed_transactions(engine, size)
+            for as_of_date in ("2025-06-30", "2025-12-31"):
+                assert abs(legacy_cash_balance(as_of_date) - ps.get_cash_balance(as_of_date)) < 1e-3
+                legacy_s = median_seconds(lambda: legacy_cash_balance(as_of_date), repeat)
+                current_s = median_seconds(lambda: ps.get_cash_balance(as_of_date), repeat)
+                rows.append({
+                    "transactions": size,
+                    "as_of_date": as_of_date,
+                    "legacy_ms": round(legacy_s * 1000, 2),
+                    "ledger_ms": round(current_s * 1000, 2),
+                    "legacy_peak_mb": round(peak_allocated_mb(lambda: legacy_cash_balance(as_of_date)), 2),
+                    "ledger_peak_mb": round(peak_allocated_mb(lambda: ps.get_cash_balance(as_of_date)), 3),
+                })
+    print_table(rows)
+
+
+# =====================================================================
+# Daily ledger snapshots
+# =====================================================================
+
+def legacy_interval_checkpoints(engine: Engine, stock_interval: int = 50, cash_interval: int = 200) -> None:
+    """Replace the daily snapshots with the former checkpoints: every Nth transaction plus the latest."""
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM stock_checkpoints"))
+        conn.execute(text("DELETE FROM cash_checkpoints"))
+        conn.execute(text(f"""
+            INSERT OR REPLACE INTO stock_checkpoints (item_name, checkpoint_day, units, sales_units, sales_revenue)
+            SELECT item_name, transaction_day, running_units, running_sales_units, running_sales_revenue
+            FROM (
+                SELECT
+                    item_name,
+                    transaction_day,
+                    COALESCE(SUM({ps.STOCK_DELTA_SQL}) OVER running, 0) AS running_units,
+                    COALESCE(SUM({ps.SALES_UNITS_SQL}) OVER running, 0) AS running_sales_units,
+                    COALESCE(SUM({ps.SALES_REVENUE_SQL}) OVER running, 0.0) AS running_sales_revenue,
+                    ROW_NUMBER() OVER running AS position,
+                    COUNT(*) OVER (PARTITION BY item_name) AS item_count
+                FROM transactions
+                WHERE item_name IS NOT NULL
+                WINDOW running AS (PARTITION BY item_name ORDER BY transaction_day)
+            )
+            WHERE position % :interval = 0 OR position = item_count
+        """), {"interval": stock_interval})
+        conn.execute(text("""
+            INSERT OR REPLACE INTO cash_checkpoints (checkpoint_day, balance)
+            SELECT transaction_day, running_balance
+            FROM (
+                SELECT
+                    transaction_day,
+                    COALESCE(SUM(CASE WHEN transaction_type = 'sales' THEN price ELSE -price END)
+                        OVER (ORDER BY transaction_day), 0.0) AS running_balance,
+                    ROW_NUMBER() OVER (ORDER BY transaction_day) AS position,
+                    COUNT(*) OVER () AS transaction_count
+                FROM transactions
+                WHERE transaction_type IN ('sales', 'stock_orders')
+            )
+            WHERE position % :interval = 0 OR position = transaction_count
+        """), {"interval": cash_interval})
+
+
+def bench_snapshots(sizes: List[int], dates: int) -> None:
+    """As-of reads on interval checkpoints vs. daily snapshots, and the cost of writes that keep them.
+
+    Reads ask for every item's stock, the cash balance and the financial report at `dates`
+    days spread through the year, i.e. with the year's later transactions to step over.
+    """
+    rng = np.random.default_rng(11)
+    as_of_dates = sorted(pd.date_range("2025-01-02", "2025-12-30").strftime("%Y-%m-%d")[
+        rng.choice(363, size=dates, replace=False)
+    ])
+    rows = []
+    for size in sizes:
+        with temporary_database() as engine:
+            seed_transactions(engine, size)
+            items = pd.read_sql("SELECT item_name FROM inventory ORDER BY item_name", engine)["item_name"].tolist()
+            expected = {}
+            for scheme in ("interval checkpoints", "daily snapshots"):
+                if scheme == "interval checkpoints":
+                    legacy_interval_checkpoints(engine)
+                else:
+                    ps.rebuild_ledgers(engine)
+                with engine.connect() as conn:
+                    snapshot_rows = conn.execute(text(
+                        "SELECT (SELECT COUNT(*) FROM stock_checkpoints) + (SELECT COUNT(*) FROM cash_checkpoints)"
+                    )).scalar()
+
+                def read_all():
+                    return [
+                        (ps.get_cash_balance(day), ps.generate_financial_report(day)["inventory_value"],
+                         [int(ps.get_stock_level(item, day)["current_stock"].iloc[0]) for item in items[:10]])
+                        for day in as_of_dates
+                    ]
+
+                results = read_all()
+                expected.setdefault("reads", results)
+                for (cash, value, stock), (expected_cash, expected_value, expected_stock) in zip(results, expected["reads"]):
+                    assert abs(cash - expected_cash) < 1e-3 and abs(value - expected_value) < 1e-3
+                    assert stock == expected_stock
+                reads_s = median_seconds(read_all, 3)
+                rows.append({
+                    "transactions": size,
+                    "scheme": scheme,
+                    "snapshot_rows": snapshot_rows,
+                    "ms_per_as_of_date": round(reads_s / len(as_of_dates) * 1000, 2),
+                })
+
+            # Writes keeping the daily snapshots: on the latest date, and back-dated to March
+            for label, day in (("write_latest_ms", "2025-12-31"), ("write_backdated_ms", "2025-03-01")):
+                rows[-1][label] = round(median_seconds(
+                    lambda: ps.create_transaction(items[0], "stock_orders", 1, 0.01, day), 20
+                ) * 1000, 2)
+    print(f"\nReads per as-of date: cash, financial report and stock of 10 items; {dates} dates")
+    print_table(rows)
+
+
+# =====================================================================
+# Integer transaction days
+# =====================================================================
+
+# The former ISO-string indexes, widened to cover the same columns as DAY_INDEX_SCHEMAS so the
+# comparison is string keys vs. integer keys and nothing else
+STRING_DATE_INDEXES = [
+    "CREATE INDEX idx_transactions_item_date ON transactions (item_name, transaction_date, transaction_type, units, price)",
+    "CREATE INDEX idx_transactions_type_date ON transactions (transaction_type, transaction_date, price)",
+]
+
+# Range queries behind the ledger tails and reports, written once per key: {column} is
+# transaction_date or transaction_day, :start and :end the ISO dates or their day numbers
+DATE_RANGE_QUERIES = {
+    "item_tail": f"""
+        SELECT SUM({ps.STOCK_DELTA_SQL}) FROM transactions
+        WHERE item_name = :item_name AND {{column}} > :start AND {{column}} <= :end
+    """,
+    "cash_tail": """
+        SELECT SUM(CASE WHEN transaction_type = 'sales' THEN price ELSE -price END) FROM transactions
+        WHERE transaction_type IN ('sales', 'stock_orders') AND {column} > :start AND {column} <= :end
+    """,
+    "daily_sales": """
+        SELECT {column}, SUM(price) FROM transactions
+        WHERE transaction_type = 'sales' AND {column} > :start AND {column} <= :end
+        GROUP BY {column}
+    """,
+}
+
+
+def bench_date_columns(sizes: List[int], repeat: int) -> None:
+    """Range queries on ISO-string transaction dates vs. integer day numbers, each on a covering index.
+
+    Windows are a week, a month and a quarter ending mid-year. Each query runs on both keys
+    and must return the same result with the same kind of plan (a search of its covering index).
+    String and integer runs alternate, so cache warmth and background load hit both alike; the
+    summary gives the full range of speedups, not just the typical one. Index sizes come from
+    SQLite's dbstat table.
+    """
+    windows = {"week": ("2025-06-23", "2025-06-30"), "month": ("2025-05-31", "2025-06-30"),
+               "quarter": ("2025-03-31", "2025-06-30")}
+    rows = []
+    index_rows = []
+    for size in sizes:
+        with temporary_database() as engine:
+            seed_transactions(engine, size)
+            with engine.begin() as conn:
+                for ddl in STRING_DATE_INDEXES:
+                    conn.execute(text(ddl))
+                conn.execute(text("ANALYZE"))
+                index_kb = dict(conn.execute(text(
+                    "SELECT name, SUM(pgsize) / 1024 FROM dbstat WHERE name LIKE 'idx_transactions_%' GROUP BY name"
+                )).all())
+            item_name = pd.read_sql("SELECT item_name FROM inventory ORDER BY item_name", engine)["item_name"].iloc[0]
+
+            with engine.connect() as conn:
+                for window, (start, end) in windows.items():
+                    for query_name, query in DATE_RANGE_QUERIES.items():
+                        string_sql = text(query.format(column="transaction_date"))
+                        day_sql = text(query.format(column="transaction_day"))
+                        string_params = {"item_name": item_name, "start": start, "end": end}
+                        day_params = {"item_name": item_name, "start": ps._day_number(start), "end": ps._day_number(end)}
+
+                        # The sum is the last column; daily_sales keys its rows by the date itself
+                        string_result = conn.execute(string_sql, string_params).all()
+                        day_result = conn.execute(day_sql, day_params).all()
+                        assert len(string_result) == len(day_result)
+                        assert all(abs((a[-1] or 0) - (b[-1] or 0)) < 1e-6 for a, b in zip(string_result, day_result))
+                        string_plan = conn.execute(text("EXPLAIN QUERY PLAN " + string_sql.text), string_params).all()
+                        day_plan = conn.execute(text("EXPLAIN QUERY PLAN " + day_sql.text), day_params).all()
+                        assert [row[-1].replace("date", "day") for row in string_plan] == [row[-1] for row in day_plan]
+                        assert all("USING COVERING INDEX" in row[-1] for row in day_plan)
+
+                        string_times, day_times = [], []
+                        for _ in range(repeat):
+                            for sql, params, times in (
+                                (string_sql, string_params, string_times), (day_sql, day_params, day_times)
+                            ):
+                                start_time = time.perf_counter()
+                                conn.execute(sql, params).all()
+                                times.append(time.perf_counter() - start_time)
+                        string_s = statistics.median(string_times)
+                        day_s = statistics.median(day_times)
+                        rows.append({
+                            "transactions": size,
+                            "window": window,
+                            "query": query_name,
+                            "string_ms": round(string_s * 1000, 3),
+                            "day_ms": round(day_s * 1000, 3),
+                            "speedup": round(string_s / day_s, 2),
+                        })
+            index_rows.append({
+                "transactions": size,
+                "string_index_kb": index_kb["idx_transactions_item_date"] + index_kb["idx_transactions_type_date"],
+                "day_index_kb": index_kb["idx_transactions_item_day"] + index_kb["idx_transactions_type_day"],
+            })
+    print_table(rows)
+    speedups = pd.DataFrame(rows).groupby("transactions")["speedup"]
+    print("\nInteger vs. string speedup per size (median run of each query):")
+    print_table([
+        {"transactions": size, "min": group.min(), "median": group.median(), "max": group.max()}
+        for size, group in speedups
+    ])
+    print()
+    print_table(index_rows)
+
+
+# =====================================================================
+# match_item_name
+# =====================================================================
+
+def legacy_match_item_name(catalog_items: Dict[str, str], requested_name: str) -> Union[str, None]:
+    """Reference copy of the original linear scan over a {lowercase: exact} catalog."""
+    lower_name = requested_name.strip().lower()
+    if lower_name in catalog_items:
+        return catalog_items[lower_name]
+
+    best_match = None
+    best_score = 0
+    for catalog_lower, catalog_exact in catalog_items.items():
+        if catalog_lower in lower_name:
+            score = len(catalog_lower)
+            if score > best_score:
+                best_score = score
+                best_match = catalog_exact
+        elif lower_name in catalog_lower:
+            score = len(lower_name)
+            if score > best_score:
+                best_score = score
+                best_match = catalog_exact
+
+    if best_match is None:
+        request_words = set(lower_name.split())
+        for catalog_lower, catalog_exact in catalog_items.items():
+            overlap = len(request_words & set(catalog_lower.split()))
+            if overlap > best_score:
+                best_score = overlap
+                best_match = catalog_exact
+
+    return best_match if best_score > 0 else None
+
+
+def synthetic_catalog(size: int, seed: int = 7) -> List[str]:
+    """The real catalog followed by generated SKUs built from its vocabulary plus sizes and colors."""
+    rng = np.random.default_rng(seed)
+    base_names = [p["item_name"] for p in ps.paper_supplies]
+    qualifiers = ["recycled", "premium", "bulk", "matte", "glossy", "heavyweight", "eco", "deluxe"]
+    colors = ["white", "ivory", "blue", "red", "green", "kraft", "black", "pastel"]
+    sizes = ["A3", "A4", "A5", "letter", "legal", "8x10", "11x17", "4x6"]
+
+    names = list(base_names)
+    seen = {name.lower() for name in names}
+    while len(names) < size:
+        name = " ".join([
+            rng.choice(qualifiers), rng.choice(colors), rng.choice(sizes),
+            rng.choice(base_names), f"#{rng.integers(0, 10 * size)}",
+        ])
+        if name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+
+def request_phrases(limit: int) -> List[str]:
+    """Item-like phrases: every 1-4 word window of the seed customer requests, plus edge cases."""
+    requests = (
+        pd.read_csv("quote_requests.csv")["response"].tolist()
+        + pd.read_csv("quote_requests_sample.csv")["request"].tolist()
+    )
+    phrases = {"", "  ", "a", "pa", "A4 paper", "Glossy paper", "paper"}
+    for request in requests:
+        words = request.replace(",", " ").replace(".", " ").split()
+        for width in range(1, 5):
+            phrases.update(" ".join(words[i:i + width]) for i in range(len(words) - width + 1))
+    return sorted(phrases)[:limit]
+
+
+def bench_catalog_matcher(sizes: List[int], queries: int) -> None:
+    """Per-lookup latency of the linear scan vs. the prebuilt index (cold and warm cache)."""
+    phrases = request_phrases(queries)
+
+    # The index must agree with the original algorithm on the shipped catalog for every phrase
+    for phrase in request_phrases(100_000):
+        assert ps.match_item_name(phrase) == legacy_match_item_name(ps.CATALOG_ITEMS, phrase), phrase
+
+    rows = []
+    for size in sizes:
+        names = synthetic_catalog(size)
+        catalog_items = {name.lower(): name for name in names}
+        build_start = time.perf_counter()
+        matcher = ps.CatalogMatcher(names, cache_size=len(phrases))
+        build_s = time.perf_counter() - build_start
+
+        legacy_start = time.perf_counter()
+        expected = [legacy_match_item_name(catalog_items, p) for p in phrases]
+        legacy_s = time.perf_counter() - legacy_start
+        cold_s = median_seconds(lambda: [matcher._match(p) for p in phrases], 1)
+        assert [matcher.match(p) for p in phrases] == expected
+        warm_s = median_seconds(lambda: [matcher.match(p) for p in phrases], 3)
+        rows.append({
+            "catalog_size": size,
+            "queries": len(phrases),
+            "index_build_ms": round(build_s * 1000, 1),
+            "legacy_us": round(legacy_s / len(phrases) * 1e6, 1),
+            "index_cold_us": round(cold_s / len(phrases) * 1e6, 1),
+            "index_cached_us": round(warm_s / len(phrases) * 1e6, 2),
+            "speedup_cold": round(legacy_s / cold_s, 1),
+        })
+    print_table(rows)
+
+
+# =====================================================================
+# search_quote_history
+# =====================================================================
+
+def legacy_search_quote_history(search_terms: List[str], limit: int = 5) -> List[Dict]:
+    """Reference copy of the original LIKE scan over quotes JOIN quote_requests.
+
+    NOT INDEXED keeps it off idx_quotes_order_date, which the original schema did not have.
+    """
+    conditions = []
+    params = {}
+    for i, term in enumerate(search_terms):
+        conditions.append(f"(LOWER(qr.response) LIKE :term_{i} OR LOWER(q.quote_explanation) LIKE :term_{i})")
+        params[f"term_{i}"] = f"%{term.lower()}%"
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+    with ps.db_engine.connect() as conn:
+        result = conn.execute(text(f"""
+            SELECT {ps.QUOTE_SEARCH_COLUMNS}
+            FROM quotes q NOT INDEXED
+            JOIN quote_requests qr ON q.request_id = qr.id
+            WHERE {where_clause}
+            ORDER BY q.order_date DESC
+            LIMIT {limit}
+        """), params)
+        return [dict(row._mapping) for row in result]
+
+
+def seed_quotes(engine: Engine, count: int, seed: int = 7) -> None:
+    """Grow the quote history to `count` quotes by copying seed quotes with random dates.
+
+    Rows go through the quotes insert trigger, so quotes_fts is kept in sync exactly as in production.
+    """
+    rng = np.random.default_rng(seed)
+    existing = pd.read_sql("SELECT * FROM quotes", engine)
+    extra = count - len(existing)
+    if extra <= 0:
+        return
+    copies = existing.iloc[rng.integers(0, len(existing), extra)].drop(columns=["id"])
+    copies["order_date"] = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 2000, extra), unit="D")
+    copies["order_date"] = copies["order_date"].dt.strftime("%Y-%m-%d")
+    copies.to_sql("quotes", engine, if_exists="append", index=False, chunksize=10_000)
+
+
+def bench_quote_search(sizes: List[int], repeat: int) -> None:
+    """Per-search latency of the LIKE scan vs. the FTS5 index, by date and by BM25 relevance."""
+    searches = [["cardstock"], ["ceremony", "large"], ["glossy paper"], ["poster board", "discount"], ["no such item"]]
+    rows = []
+    for size in sizes:
+        with temporary_database() as engine:
+            seed_quotes(engine, size)
+            for terms in searches:
+                legacy_hits = legacy_search_quote_history(terms, limit=size)
+                fts_hits = ps.search_quote_history(terms, limit=size)
+                assert sorted(map(str, legacy_hits)) == sorted(map(str, fts_hits)), terms
+
+                legacy_s = median_seconds(lambda: legacy_search_quote_history(terms), repeat)
+                date_s = median_seconds(lambda: ps.search_quote_history(terms), repeat)
+                relevance_s = median_seconds(lambda: ps.search_quote_history(terms, rank_by="relevance"), repeat)
+                rows.append({
+                    "quotes": size,
+                    "terms": ", ".join(terms),
+                    "matches": len(fts_hits),
+                    "like_ms": round(legacy_s * 1000, 2),
+                    "fts_date_ms": round(date_s * 1000, 2),
+                    "fts_relevance_ms": round(relevance_s * 1000, 2),
+                    "speedup": round(legacy_s / date_s, 1),
+                })
+    print_table(rows)
+
+
+# =====================================================================
+# build_quote / pricing engine
+# =====================================================================
+
+def legacy_build_quote(items: List[Dict]) -> Dict:
+    """Reference copy of the original build_quote: one Python loop per quote, tiers inline."""
+    total_units = sum(item["quantity"] for item in items)
+    if total_units > 5000:
+        discount = 0.15
+    elif total_units > 1000:
+        discount = 0.10
+    elif total_units > 500:
+        discount = 0.05
+    else:
+        discount = 0.0
+    lines = []
+    subtotal = 0.0
+    for item in items:
+        qty = item["quantity"]
+        matched_name = ps.match_item_name(item["item_name"])
+        if matched_name and matched_name in CATALOG_PRICES:
+            unit_price = CATALOG_PRICES[matched_name]
+            line_total = qty * unit_price
+            subtotal += line_total
+        else:
+            matched_name, unit_price, line_total = None, None, None
+        lines.append({
+            "item_name": item["item_name"],
+            "catalog_name": matched_name,
+            "quantity": qty,
+            "unit_price": unit_price,
+            "line_total": line_total,
+        })
+    discount_amount = subtotal * discount
+    return {
+        "lines": lines,
+        "subtotal": subtotal,
+        "discount": discount,
+        "discount_amount": discount_amount,
+        "total": round(subtotal - discount_amount, 2),
+    }
+
+
+CATALOG_PRICES = {p["item_name"]: p["unit_price"] for p in ps.paper_supplies}
+
+
+def synthetic_order_lines(count: int, lines_per_quote: int = 4, seed: int = 11) -> pd.DataFrame:
+    """`count` random order lines (catalog names and request phrases, some unknown) in quotes of ~`lines_per_quote`."""
+    rng = np.random.default_rng(seed)
+    names = [p["item_name"] for p in ps.paper_supplies] + request_phrases(200) + ["unobtainium", "vellum"]
+    return pd.DataFrame({
+        "quote_id": np.sort(rng.integers(0, max(1, count // lines_per_quote), count)),
+        "item_name": rng.choice(np.array(names, dtype=object), count),
+        "quantity": rng.choice([10, 100, 250, 500, 1000, 2000, 5000], count),
+    })
+
+
+def bench_pricing(sizes: List[int], repeat: int, price_changes: int) -> None:
+    """Quote many line items: a build_quote loop per quote (original) vs. one PricingEngine pass.
+
+    Checks that both give the same total for every quote, and times build_quote's single-quote
+    path (PricingEngine.quote) per quote too, then prices all of quote_requests.csv.
+    Name matching is warm in the LRU cache for both, so this measures the pricing itself.
+    Last, quotes dated requests after `price_changes` dated price changes, with the compiled
+    lookups cached and rebuilt per quote, counting the SQL statements each quote runs.
+    """
+    with temporary_database():
+        bench_pricing_engine(sizes, repeat)
+        bench_dated_quotes(price_changes, repeat)
+
+
+def bench_pricing_engine(sizes: List[int], repeat: int) -> None:
+    """Legacy build_quote loop vs. the engine's per-quote path and one batch pass, from the seeded pricing store."""
+    engine = ps.pricing_engine()
+    rows = []
+    for size in sizes:
+        lines = synthetic_order_lines(size)
+        quotes = [
+            group[["item_name", "quantity"]].to_dict("records") for _, group in lines.groupby("quote_id")
+        ]
+
+        def engine_pass() -> pd.DataFrame:
+            priced = engine.price_lines(lines["item_name"], lines["quantity"], lines["quote_id"])
+            return engine.summarize(priced)
+
+        legacy_totals = [legacy_build_quote(items)["total"] for items in quotes]
+        assert engine_pass()["total"].tolist() == legacy_totals
+        assert [engine.quote(items)["total"] for items in quotes] == legacy_totals
+        legacy_s = median_seconds(lambda: [legacy_build_quote(items) for items in quotes], repeat)
+        per_quote_s = median_seconds(lambda: [engine.quote(items) for items in quotes], repeat)
+        engine_s = median_seconds(engine_pass, repeat)
+        rows.append({
+            "lines": size,
+            "quotes": len(quotes),
+            "legacy_ms": round(legacy_s * 1000, 2),
+            "per_quote_ms": round(per_quote_s * 1000, 2),
+            "batch_ms": round(engine_s * 1000, 2),
+            "per_quote_speedup": round(legacy_s / per_quote_s, 2),
+            "batch_speedup": round(legacy_s / engine_s, 2),
+        })
+    print_table(rows)
+
+    requests = pd.read_csv("quote_requests.csv")["response"]
+    start = time.perf_counter()
+    order_lines = ps.order_lines_from_requests(requests)
+    priced = engine.price_lines(order_lines["item_name"], order_lines["quantity"], order_lines["quote_id"])
+    summary = engine.summarize(priced)
+    print(
+        f"\nquote_requests.csv: {len(order_lines)} order lines in {len(summary)} requests priced in "
+        f"{(time.perf_counter() - start) * 1000:.1f} ms ({priced['catalog_name'].notna().mean():.0%} of lines in the catalog)"
+    )
+
+
+def bench_dated_quotes(price_changes: int, repeat: int) -> None:
+    """Quote each sample request at its request date after dated price and tier changes."""
+    rng = np.random.default_rng(5)
+    change_dates = pd.date_range("2025-04-01", "2025-04-30", periods=price_changes).strftime("%Y-%m-%d")
+    for change_date in change_dates:
+        item = ps.paper_supplies[rng.integers(len(ps.paper_supplies))]
+        ps.set_item_price(item["item_name"], round(item["unit_price"] * rng.uniform(0.8, 1.3), 2), change_date)
+        ps.set_discount_tiers([(200, 0.03), (800, 0.08)], change_date, scope="category", scope_value=item["category"])
+
+    sample = pd.read_csv("quote_requests_sample.csv")
+    sample["request_date"] = pd.to_datetime(sample["request_date"], format="%m/%d/%y").dt.strftime("%Y-%m-%d")
+    order_lines = ps.order_lines_from_requests(sample["request"])
+    orders = [
+        (lines[["item_name", "quantity"]].to_dict("records"), sample.at[quote_id, "request_date"])
+        for quote_id, lines in order_lines.groupby("quote_id")
+    ]
+
+    statements = Counter()
+
+    @event.listens_for(ps.db_engine, "before_cursor_execute")
+    def count_statement(*_):
+        statements["sql"] += 1
+
+    def quote_all(cold: bool) -> None:
+        for items, quote_date in orders:
+            if cold:
+                ps._pricing_cache["engines"].clear()
+            ps.build_quote(items, quote_date)
+
+    rows = []
+    for cold in (True, False):
+        quote_all(cold)
+        statements.clear()
+        quote_all(cold)
+        rows.append({
+            "lookups": "rebuilt per quote" if cold else "cached",
+            "quotes": len(orders),
+            "sql_per_quote": round(statements["sql"] / len(orders), 1),
+            "ms_per_quote": round(median_seconds(lambda: quote_all(cold), repeat) / len(orders) * 1000, 3),
+        })
+    event.remove(ps.db_engine, "before_cursor_execute", count_statement)
+    print(f"\n{price_changes} dated price changes, {len(ps._pricing_cache['engines'])} compiled snapshots cached")
+    print_table(rows)
+
+
+# =====================================================================
+# Deterministic fast path
+# =====================================================================
+
+# Fewest model calls the agent workflow can take for an order: the orchestrator delegates to
+# the inventory, quoting and sales agents and answers (4 calls), and each worker agent makes
+# at least one tool call and one final answer (2 calls each)
+MIN_AGENT_MODEL_CALLS = 4 + 3 * 2
+
+
+def bench_fast_path(request_date: str) -> None:
+    """Share of requests the rule-based pre-parser resolves, and fast-path latency per request."""
+    datasets = {
+        "quote_requests.csv": pd.read_csv("quote_requests.csv")["response"].tolist(),
+        "quote_requests_sample.csv": pd.read_csv("quote_requests_sample.csv")["request"].tolist(),
+    }
+    rows = []
+    for dataset, requests in datasets.items():
+        texts = [f"{request} (Date of request: {request_date})" for request in requests]
+        parse_s = median_seconds(lambda: [ps.parse_order_request(t) for t in texts], 5) / len(texts)
+        fast_texts = [t for t in texts if ps.parse_order_request(t) is not None]
+
+        timings = []
+        with temporary_database():
+            for request_text in fast_texts:
+                start = time.perf_counter()
+                assert ps.run_fast_path(request_text) is not None
+                timings.append(time.perf_counter() - start)
+        rows.append({
+            "dataset": dataset,
+            "requests": len(texts),
+            "fast_path": len(fast_texts),
+            "fast_path_pct": round(100 * len(fast_texts) / len(texts), 1),
+            "parse_us": round(parse_s * 1e6, 1),
+            "fast_p50_ms": round(np.percentile(timings, 50) * 1000, 2) if timings else None,
+            "fast_p99_ms": round(np.percentile(timings, 99) * 1000, 2) if timings else None,
+            "model_calls_avoided": len(fast_texts) * MIN_AGENT_MODEL_CALLS,
+        })
+    print_table(rows)
+    print(f"\nEach fast-path request skips at least {MIN_AGENT_MODEL_CALLS} sequential model calls "
+          "(several seconds with a hosted model); the rest still go through the agents.")
+
+
+# =====================================================================
+# LLM completion cache
+# =====================================================================
+
+def message_text(message) -> str:
+    """Plain text of a chat message whose content may be a list of typed parts."""
+    content = message.content if isinstance(message, ChatMessage) else message["content"]
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content)
+    return str(content or "")
+
+
+class StubToolModel(Model):
+    """Offline stand-in for the chat model: checks stock, then answers, after a fixed delay.
+
+    Its first completion for a task calls check_item_stock for the item and date named in the
+    task; once a tool result is in the conversation it calls final_answer with that result.
+    """
+
+    def __init__(self, latency_s: float):
+        super().__init__(model_id="stub-tool-model")
+        self.latency_s = latency_s
+        self.calls = 0
+
+    def generate(self, messages, stop_sequences=None, response_format=None, tools_to_call_from=None, **kwargs):
+        time.sleep(self.latency_s)
+        self.calls += 1
+        texts = [message_text(m) for m in messages]
+        roles = [m.role if isinstance(m, ChatMessage) else m["role"] for m in messages]
+        item_name, as_of_date = texts[1].split("|")[-2:]
+        step = roles.count(MessageRole.TOOL_RESPONSE)
+        if step == 0:
+            name, arguments = "check_item_stock", {"item_name": item_name.strip(), "as_of_date": as_of_date.strip()[:10]}
+        else:
+            name, arguments = "final_answer", {"answer": texts[-1].removeprefix("Observation:").strip()}
+        return ChatMessage(
+            role=MessageRole.ASSISTANT,
+            content=None,
+            tool_calls=[ChatMessageToolCall(
+                id=f"call_{step}", type="function",
+                function=ChatMessageToolCallFunction(name=name, arguments=arguments),
+            )],
+            token_usage=TokenUsage(input_tokens=1000, output_tokens=50),
+        )
+
+
+def bench_llm_cache(requests: int, latency_ms: float) -> None:
+    """Cold vs. replayed agent runs through CachedModel on memory and SQLite stores (offline stub model).
+
+    Hits and misses are those of each run alone; cache_info() counts from the model's creation.
+    """
+    tasks = [
+        f"Check stock | {item['item_name']} | 2025-0{1 + i % 9}-15"
+        for i, item in enumerate(ps.paper_supplies * (requests // len(ps.paper_supplies) + 1))
+    ][:requests]
+
+    rows = []
+    with temporary_database(), tempfile.TemporaryDirectory() as tmp_dir:
+        for store_name, make_store in [
+            ("memory", lambda: agent_team.MemoryCompletionStore()),
+            ("sqlite", lambda: agent_team.SQLiteCompletionStore(os.path.join(tmp_dir, "llm_cache.db"))),
+        ]:
+            stub = StubToolModel(latency_ms / 1000)
+            cached = agent_team.CachedModel(stub, make_store())
+            answers = {}
+            for run in ("cold", "replay"):
+                agent = ToolCallingAgent(tools=[agent_team.check_item_stock], model=cached, max_steps=3, verbosity_level=0)
+                calls_before = stub.calls
+                info_before = cached.cache_info()
+                start = time.perf_counter()
+                answers[run] = [str(agent.run(task)) for task in tasks]
+                elapsed = time.perf_counter() - start
+                info = cached.cache_info()
+                rows.append({
+                    "store": store_name,
+                    "run": run,
+                    "requests": len(tasks),
+                    "model_calls": stub.calls - calls_before,
+                    "hits": info["hits"] - info_before["hits"],
+                    "misses": info["misses"] - info_before["misses"],
+                    "seconds": round(elapsed, 3),
+                    "ms_per_request": round(elapsed / len(tasks) * 1000, 2),
+                })
+            assert answers["cold"] == answers["replay"]
+    print_table(rows)
+
+
+# =====================================================================
+# Parallel and batched tool calls
+# =====================================================================
+
+class TurnScriptModel(Model):
+    """Offline model that issues fixed turns of tool calls, then answers with the last observation.
+
+    Args:
+        turns: One list of (tool name, arguments) per model turn, all calls of a turn issued together.
+        latency_s: Seconds to sleep per completion.
+    """
+
+    def __init__(self, turns: List[List[tuple]], latency_s: float):
+        super().__init__(model_id="turn-script")
+        self.turns = turns
+        self.latency_s = latency_s
+        self.calls = 0
+
+    def generate(self, messages, stop_sequences=None, response_format=None, tools_to_call_from=None, **kwargs):
+        time.sleep(self.latency_s)
+        turn = self.calls
+        self.calls += 1
+        if turn < len(self.turns):
+            calls = self.turns[turn]
+        else:
+            calls = [("final_answer", {"answer": message_text(messages[-1]).removeprefix("Observation:").strip()})]
+        return ChatMessage(
+            role=MessageRole.ASSISTANT,
+            content=None,
+            tool_calls=[
+                ChatMessageToolCall(
+                    id=f"call_{turn}_{index}", type="function",
+                    function=ChatMessageToolCallFunction(name=name, arguments=arguments),
+                )
+                for index, (name, arguments) in enumerate(calls)
+            ],
+            token_usage=TokenUsage(input_tokens=0, output_tokens=0),
+        )
+
+
+def bench_tool_calls(items: int, latency_ms: float, trials: int) -> None:
+    """A multi-item stock check as one call per step, parallel calls in one step, or one batched call.
+
+    Then checks write ordering: one turn issues "sell all the stock, reorder it, sell it again".
+    Run in that order, all three succeed with increasing transaction IDs. The plain
+    ToolCallingAgent runs them in whatever order its threads get to them; the serializing
+    agent runs them in the order issued.
+    """
+    check_date = "2025-04-01"
+    tools = [agent_team.check_item_stock, agent_team.check_order_stock, agent_team.finalize_sale, agent_team.reorder_stock]
+    rows = []
+    with temporary_database():
+        order = [
+            {"item_name": name, "quantity": 50}
+            for name in sorted(ps.get_all_inventory(check_date))[:items]
+        ]
+        single_calls = [("check_item_stock", {"item_name": item["item_name"], "as_of_date": check_date}) for item in order]
+        for mode, turns in (
+            ("one call per step", [[call] for call in single_calls]),
+            ("parallel calls, one step", [single_calls]),
+            ("batched tool", [[("check_order_stock", {"items_json": json.dumps(order), "as_of_date": check_date})]]),
+        ):
+            model = TurnScriptModel(turns, latency_ms / 1000)
+            agent = agent_team.TracedToolCallingAgent(tools=tools, model=model, max_steps=items + 2, verbosity_level=0)
+            start = time.perf_counter()
+            agent.run(f"Check stock for {len(order)} items")
+            rows.append({
+                "mode": mode,
+                "items": len(order),
+                "model_calls": model.calls,
+                "steps": len(agent.memory.steps) - 1,
+                "seconds": round(time.perf_counter() - start, 3),
+            })
+    print(f"\nSimulated model latency: {latency_ms:g} ms per call")
+    print_table(rows)
+
+    rows = []
+    for label, agent_class in (
+        ("ToolCallingAgent", ToolCallingAgent),
+        ("TracedToolCallingAgent", agent_team.TracedToolCallingAgent),
+    ):
+        in_order = 0
+        with temporary_database():
+            item = max(ps.get_all_inventory(check_date).items(), key=lambda entry: entry[1])[0]
+            for _ in range(trials):
+                stock = int(ps.get_stock_level(item, check_date)["current_stock"].iloc[0])
+                sell = ("finalize_sale", {"item_name": item, "quantity": stock, "sale_price": 1.0, "sale_date": check_date})
+                reorder = ("reorder_stock", {"item_name": item, "quantity": stock, "unit_price": 0.01, "order_date": check_date})
+                model = TurnScriptModel([[sell, reorder, sell]], latency_s=0)
+                agent = agent_class(tools=tools, model=model, max_steps=3, verbosity_level=0, max_tool_threads=3)
+                agent.run("Sell, reorder, sell")
+                # Observations are listed in issue order; transaction IDs show the order the writes ran in
+                txn_ids = [int(txn_id) for txn_id in re.findall(r"Transaction ID: (\d+)", agent.memory.steps[1].observations)]
+                in_order += len(txn_ids) == 3 and txn_ids == sorted(txn_ids)
+        rows.append({"agent": label, "trials": trials, "ran_in_issued_order": in_order})
+    print_table(rows)
+
+
+# =====================================================================
+# End-to-end agent pipeline (offline)
+# =====================================================================
+
+@contextmanager
+def timed_sql(engine: Engine) -> Iterator[List[float]]:
+    """Collect the wall time of every SQL statement executed on `engine` into the yielded list."""
+    timings: List[float] = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        timings.append(time.perf_counter() - conn.info["query_start"].pop())
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    try:
+        yield timings
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+        event.remove(engine, "after_cursor_execute", after)
+
+
+def bench_pipeline(limit: int, latency_ms: float) -> None:
+    """Drive quote_requests.csv through process_customer_request on the offline ScriptedModel.
+
+    Reports throughput, latency percentiles, time spent in SQL vs. the rest of the agent stack
+    (framework, tools, logging; simulated model latency excluded) and peak Python allocations,
+    for the agent workflow alone and with the deterministic fast path in front of it.
+    """
+    requests = pd.read_csv("quote_requests.csv")["response"].tolist()[:limit]
+    dates = pd.date_range("2025-01-02", periods=len(requests), freq="D").strftime("%Y-%m-%d")
+    texts = [f"{request} (Date of request: {day})" for request, day in zip(requests, dates)]
+
+    rows = []
+    for mode, fast_path in (("agents", False), ("fast_path+agents", True)):
+        for measure in ("time", "memory"):
+            scripted = agent_team.ScriptedModel(latency_s=latency_ms / 1000)
+            agent = agent_team.build_orchestrator_agent(scripted)
+            latencies, db_seconds, peaks = [], [], []
+            with temporary_database() as engine, timed_sql(engine) as sql_timings:
+                if measure == "memory":
+                    tracemalloc.start()
+                start = time.perf_counter()
+                for request_text in texts:
+                    sql_before = len(sql_timings)
+                    if measure == "memory":
+                        tracemalloc.reset_peak()
+                    request_start = time.perf_counter()
+                    with redirect_stdout(io.StringIO()):
+                        agent_team.process_customer_request(request_text, agent=agent, fast_path=fast_path)
+                    latencies.append(time.perf_counter() - request_start)
+                    db_seconds.append(sum(sql_timings[sql_before:]))
+                    if measure == "memory":
+                        peaks.append(tracemalloc.get_traced_memory()[1] / 1e6)
+                elapsed = time.perf_counter() - start
+                if measure == "memory":
+                    tracemalloc.stop()
+
+            if measure == "memory":
+                rows[-1]["peak_alloc_mb_p50"] = round(float(np.percentile(peaks, 50)), 2)
+                rows[-1]["peak_alloc_mb_max"] = round(max(peaks), 2)
+                continue
+            model_seconds = scripted.calls * latency_ms / 1000
+            rows.append({
+                "mode": mode,
+                "requests": len(texts),
+                "req_per_s": round(len(texts) / elapsed, 1),
+                "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+                "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2),
+                "model_calls_per_req": round(scripted.calls / len(texts), 1),
+                "db_ms_per_req": round(sum(db_seconds) / len(texts) * 1000, 2),
+                "agent_ms_per_req": round((elapsed - sum(db_seconds) - model_seconds) / len(texts) * 1000, 2),
+            })
+    print_table(rows)
+
+
+def bench_plan_mode(limit: int, latency_ms: float) -> None:
+    """The sample requests through the managed agents and through plan mode (ScriptedModel).
+
+    Both modes run the same inventory -> quote -> sale steps, so they must end with the same
+    cash and inventory; plan mode replaces the agents' model round trips with one planning call.
+    """
+    sample = pd.read_csv("quote_requests_sample.csv").head(limit)
+    dates = pd.to_datetime(sample["request_date"], format="%m/%d/%y").dt.strftime("%Y-%m-%d")
+    texts = [f"{request} (Date of request: {day})" for request, day in zip(sample["request"], dates)]
+
+    rows = []
+    for mode, factory in (
+        ("agents", agent_team.build_orchestrator_agent),
+        ("plan", agent_team.build_planning_orchestrator),
+    ):
+        scripted = agent_team.ScriptedModel(latency_s=latency_ms / 1000)
+        orchestrator = factory(scripted)
+        latencies = []
+        with temporary_database():
+            for request_text in texts:
+                request_start = time.perf_counter()
+                with redirect_stdout(io.StringIO()):
+                    agent_team.process_customer_request(request_text, agent=orchestrator, fast_path=False)
+                latencies.append(time.perf_counter() - request_start)
+            final_report = ps.generate_financial_report(dates.max())
+        rows.append({
+            "mode": mode,
+            "requests": len(texts),
+            "model_calls_per_req": round(scripted.calls / len(texts), 2),
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+            "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+            "final_cash": round(final_report["cash_balance"], 2),
+            "final_inventory": round(final_report["inventory_value"], 2),
+        })
+    print(f"\nSimulated model latency: {latency_ms:g} ms per call")
+    print_table(rows)
+
+
+def legacy_finalize_sale(item_name: str, quantity: int, sale_price: float, sale_date: str) -> bool:
+    """The original finalize_sale check-then-write: stock check and insert as separate statements."""
+    current_stock = int(ps.get_stock_level(item_name, sale_date)["current_stock"].iloc[0])
+    if current_stock < quantity:
+        return False
+    ps.create_transaction(item_name, "sales", quantity, sale_price, sale_date)
+    return True
+
+
+def legacy_reorder_stock(item_name: str, quantity: int, unit_price: float, order_date: str) -> bool:
+    """The original reorder_stock check-then-write: cash check and insert as separate statements."""
+    total_cost = quantity * unit_price
+    if total_cost > ps.get_cash_balance(order_date):
+        return False
+    ps.create_transaction(item_name, "stock_orders", quantity, total_cost, order_date)
+    return True
+
+
+def checked_finalize_sale(item_name: str, quantity: int, sale_price: float, sale_date: str) -> bool:
+    return agent_team.finalize_sale(item_name, quantity, sale_price, sale_date).startswith("Sale completed")
+
+
+def checked_reorder_stock(item_name: str, quantity: int, unit_price: float, order_date: str) -> bool:
+    return agent_team.reorder_stock(item_name, quantity, unit_price, order_date).startswith("Reorder placed")
+
+
+def bench_oversell(threads: int, attempts: int) -> None:
+    """Stress test: many threads sell one item (and spend the cash) at once.
+
+    Every thread repeatedly tries to sell 7 units of the same item, then to reorder stock
+    costing 1/20 of the starting cash. Afterwards the item's stock and the cash balance must
+    not be negative. The original check-then-write oversells; the checked writes must not.
+    """
+    sale_date = "2025-06-01"
+    rows = []
+    for label, sell, reorder in (
+        ("check_then_write", legacy_finalize_sale, legacy_reorder_stock),
+        ("checked_writes", checked_finalize_sale, checked_reorder_stock),
+    ):
+        with temporary_database():
+            item = max(ps.get_all_inventory(sale_date).items(), key=lambda entry: entry[1])[0]
+            initial_stock = int(ps.get_stock_level(item, sale_date)["current_stock"].iloc[0])
+            initial_cash = ps.get_cash_balance(sale_date)
+            barrier = threading.Barrier(threads)
+            outcomes = Counter()
+
+            def worker(call: Callable, *args) -> None:
+                barrier.wait()
+                for _ in range(attempts):
+                    try:
+                        outcomes[call(*args)] += 1
+                    except OperationalError:
+                        outcomes["error"] += 1
+
+            start = time.perf_counter()
+            for phase in (
+                (sell, item, 7, 1.0, sale_date),
+                (reorder, item, 1, initial_cash / 20, sale_date),
+            ):
+                pool = [threading.Thread(target=worker, args=phase) for _ in range(threads)]
+                for thread in pool:
+                    thread.start()
+                for thread in pool:
+                    thread.join()
+            elapsed = time.perf_counter() - start
+
+            # Recompute the balances from the raw transactions, independently of the ledger updates
+            ps.rebuild_ledgers(ps.db_engine)
+            sold = pd.read_sql(
+                text("SELECT COALESCE(SUM(units), 0) AS units FROM transactions "
+                     "WHERE transaction_type = 'sales' AND item_name = :item AND transaction_date = :date"),
+                ps.db_engine, params={"item": item, "date": sale_date},
+            )["units"].iloc[0]
+            final_stock = int(ps.get_stock_level(item, sale_date)["current_stock"].iloc[0])
+            final_cash = ps.get_cash_balance(sale_date)
+
+        rows.append({
+            "mode": label,
+            "threads": threads,
+            "initial_stock": initial_stock,
+            "units_sold": int(sold),
+            "final_stock": final_stock,
+            "final_cash": round(final_cash, 2),
+            "accepted": outcomes[True],
+            "rejected": outcomes[False],
+            "errors": outcomes["error"],
+            "seconds": round(elapsed, 2),
+            "oversold": final_stock < 0 or final_cash < 0,
+        })
+    print_table(rows)
+
+
+def bench_tracing(limit: int) -> None:
+    """Cost of request tracing: the same agent requests untraced and inside request_trace().
+
+    Uses the offline ScriptedModel with no simulated latency, so the overhead shows against
+    the framework, tool and SQL time alone (its worst case).
+    """
+    requests = pd.read_csv("quote_requests.csv")["response"].tolist()[:limit]
+    dates = pd.date_range("2025-01-02", periods=len(requests), freq="D").strftime("%Y-%m-%d")
+    texts = [f"{request} (Date of request: {day})" for request, day in zip(requests, dates)]
+
+    rows = []
+    for mode in ("untraced", "traced"):
+        agent = agent_team.build_orchestrator_agent(agent_team.ScriptedModel(latency_s=0))
+        latencies, span_counts = [], []
+        with temporary_database():
+            for index, request_text in enumerate(texts):
+                request_start = time.perf_counter()
+                with redirect_stdout(io.StringIO()):
+                    if mode == "traced":
+                        with ps.request_trace(f"request-{index}") as trace:
+                            agent_team.process_customer_request(request_text, agent=agent, fast_path=False)
+                        span_counts.append(len(trace.spans))
+                    else:
+                        agent_team.process_customer_request(request_text, agent=agent, fast_path=False)
+                latencies.append(time.perf_counter() - request_start)
+        rows.append({
+            "mode": mode,
+            "requests": len(texts),
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+            "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+            "spans_per_req": round(statistics.mean(span_counts), 1) if span_counts else 0,
+        })
+    print_table(rows)
+
+
+def bench_prompt_tokens(limit: int) -> None:
+    """Prompt tokens per sample request with the original, filtered and compact tool outputs.
+
+    Runs quote_requests_sample.csv through the agent workflow on the offline ScriptedModel,
+    which reports the estimated tokens of the messages it is sent (tool schemas excluded), and
+    sums them per request from the request traces.
+    """
+    sample = pd.read_csv("quote_requests_sample.csv").head(limit)
+    dates = pd.to_datetime(sample["request_date"], format="%m/%d/%y").dt.strftime("%Y-%m-%d")
+    texts = [f"{request} (Date of request: {day})" for request, day in zip(sample["request"], dates)]
+
+    rows = []
+    saved_settings = dict(agent_team.TOOL_OUTPUT)
+    try:
+        for mode, compact, filter_inventory in (
+            ("text, full inventory", False, False),
+            ("text, requested items", False, True),
+            ("compact", True, True),
+        ):
+            agent_team.TOOL_OUTPUT["compact"] = compact
+            model = agent_team.TracedModel(agent_team.ScriptedModel(filter_inventory=filter_inventory))
+            agent = agent_team.build_orchestrator_agent(model)
+            summaries, tool_tokens = [], []
+            with temporary_database():
+                for index, request_text in enumerate(texts):
+                    with redirect_stdout(io.StringIO()), ps.request_trace(f"request-{index}") as trace:
+                        agent_team.process_customer_request(request_text, agent=agent, fast_path=False)
+                    summaries.append(trace.summary())
+                    tool_tokens.append(sum(
+                        (span["attributes"].get("output_chars", 0) + 3) // 4
+                        for span in trace.spans if span["category"] == "tool"
+                    ))
+            tokens = [summary["llm_input_tokens"] for summary in summaries]
+            rows.append({
+                "tool_output": mode,
+                "requests": len(texts),
+                "llm_calls_per_req": round(statistics.mean(s["llm_calls"] for s in summaries), 1),
+                "tool_output_tokens": round(statistics.mean(tool_tokens)),
+                "prompt_tokens_mean": round(statistics.mean(tokens)),
+                "prompt_tokens_p50": round(float(np.percentile(tokens, 50))),
+                "prompt_tokens_max": max(tokens),
+            })
+    finally:
+        agent_team.TOOL_OUTPUT.update(saved_settings)
+    baseline = rows[0]["prompt_tokens_mean"]
+    for row in rows:
+        row["vs_original"] = f"{row['prompt_tokens_mean'] / baseline:.0%}"
+    print(f"\nToken budget per compact tool output: {agent_team.TOOL_OUTPUT['token_budget']}")
+    print_table(rows)
+
+    # The scripted workflow never calls search_quotes or get_financial_report; size their outputs directly
+    order_lines = ps.order_lines_from_requests(sample["request"])
+    requested = [
+        ", ".join(order_lines.loc[order_lines["quote_id"] == index, "item_name"].unique())
+        for index in range(len(sample))
+    ]
+    calls = {
+        "check_inventory (all items)": lambda i: agent_team.check_inventory(dates.iloc[i]),
+        "check_inventory (requested)": lambda i: agent_team.check_inventory(dates.iloc[i], requested[i]),
+        "search_quotes": lambda i: agent_team.search_quotes(sample.at[i, "event"]),
+        "get_financial_report": lambda i: agent_team.get_financial_report(dates.iloc[i]),
+    }
+    tool_rows = []
+    try:
+        with temporary_database():
+            for tool_name, call in calls.items():
+                row = {"tool": tool_name}
+                for mode, compact in (("text", False), ("compact", True)):
+                    agent_team.TOOL_OUTPUT["compact"] = compact
+                    sizes = [agent_team.estimate_tokens(call(i)) for i in range(len(sample))]
+                    row[f"{mode}_tokens_mean"] = round(statistics.mean(sizes))
+                    row[f"{mode}_tokens_max"] = max(sizes)
+                tool_rows.append(row)
+    finally:
+        agent_team.TOOL_OUTPUT.update(saved_settings)
+    print_table(tool_rows)
+
+
+def default_engine(path: str) -> Engine:
+    """The original engine configuration: rollback journal, synchronous=FULL, 5 s lock timeout."""
+    return create_engine(f"sqlite:///{path}")
+
+
+def bench_concurrent_rw(readers: int, writers: int, seconds: float, write_rate: float) -> None:
+    """get_all_inventory readers running alongside create_transaction writers, per engine configuration.
+
+    Writers are paced to the same total `write_rate` on every engine, so both configurations
+    carry the same write load (writes_per_s shows the rate actually reached). Each engine is
+    read first without writers, then with them; read_wait_p50_ms / read_wait_p99_ms are the
+    increase in read latency under write load, i.e. how long reads wait behind writers.
+    Failed operations count "database is locked" errors.
+    """
+    write_interval = writers / write_rate
+    rows = []
+    for label, factory in (("default", default_engine), ("create_db_engine", ps.create_db_engine)):
+        with temporary_database(factory) as engine:
+            seed_transactions(engine, 20_000)
+            items = pd.read_sql("SELECT item_name FROM inventory", engine)["item_name"].tolist()
+            errors = Counter()
+
+            def run_phase(phase_writers: int) -> Tuple[List[float], List[float]]:
+                stop = threading.Event()
+                read_latencies: List[float] = []
+                write_latencies: List[float] = []
+
+                def reader() -> None:
+                    while not stop.is_set():
+                        start = time.perf_counter()
+                        try:
+                            ps.get_all_inventory("2025-12-31")
+                        except OperationalError:
+                            errors["read"] += 1
+                            continue
+                        read_latencies.append(time.perf_counter() - start)
+
+                def writer(worker: int) -> None:
+                    # Fixed schedule: a slow write delays the next one but never raises the rate
+                    next_write = time.perf_counter() + write_interval * worker / writers
+                    index = 0
+                    while not stop.wait(max(next_write - time.perf_counter(), 0)):
+                        next_write += write_interval
+                        item = items[(worker + index) % len(items)]
+                        index += 1
+                        start = time.perf_counter()
+                        try:
+                            ps.create_transaction(item, "stock_orders", 10, 1.0, "2025-12-31")
+                        except OperationalError:
+                            errors["write"] += 1
+                            continue
+                        write_latencies.append(time.perf_counter() - start)
+
+                threads = [threading.Thread(target=reader) for _ in range(readers)]
+                threads += [threading.Thread(target=writer, args=(worker,)) for worker in range(phase_writers)]
+                for thread in threads:
+                    thread.start()
+                time.sleep(seconds)
+                stop.set()
+                for thread in threads:
+                    thread.join()
+                return read_latencies, write_latencies
+
+            idle_reads, _ = run_phase(0)
+            read_latencies, write_latencies = run_phase(writers)
+
+        idle_p50, idle_p99 = (float(np.percentile(idle_reads, q)) * 1000 for q in (50, 99))
+        read_p50, read_p99 = (float(np.percentile(read_latencies, q)) * 1000 for q in (50, 99))
+        rows.append({
+            "engine": label,
+            "writes_per_s": round(len(write_latencies) / seconds, 1),
+            "write_p99_ms": round(float(np.percentile(write_latencies, 99)) * 1000, 2),
+            "reads_per_s": round(len(read_latencies) / seconds, 1),
+            "idle_read_p99_ms": round(idle_p99, 2),
+            "read_p99_ms": round(read_p99, 2),
+            "read_wait_p50_ms": round(read_p50 - idle_p50, 2),
+            "read_wait_p99_ms": round(read_p99 - idle_p99, 2),
+            "reads_over_20ms": sum(latency > 0.02 for latency in read_latencies),
+            "failed_reads": errors["read"],
+            "failed_writes": errors["write"],
+        })
+    print_table(rows)
+
+
+# =====================================================================
+# init_database
+# =====================================================================
+
+def legacy_init_database(engine: Engine, quote_requests_path: str, quotes_path: str, seed: int = 137) -> None:
+    """Reference copy of the original init: drop everything, read each CSV whole, parse every metadata row."""
+    ps.drop_schema(engine)
+    ps.create_schema(engine)
+    initial_date = "2025-01-01T00:00:00"
+
+    quote_requests_df = pd.read_csv(quote_requests_path)
+    quote_requests_df["id"] = range(1, len(quote_requests_df) + 1)
+    quote_requests_df.to_sql("quote_requests", engine, if_exists="append", index=False)
+
+    quotes_df = pd.read_csv(quotes_path)
+    quotes_df["request_id"] = range(1, len(quotes_df) + 1)
+    quotes_df["order_date"] = initial_date
+    quotes_df["request_metadata"] = quotes_df["request_metadata"].apply(
+        lambda x: ast.literal_eval(x) if isinstance(x, str) else x
+    )
+    for field in ("job_type", "order_size", "event_type"):
+        quotes_df[field] = quotes_df["request_metadata"].apply(lambda x: x.get(field, ""))
+    quotes_df = quotes_df[[
+        "request_id", "total_amount", "quote_explanation", "order_date", "job_type", "order_size", "event_type"
+    ]]
+    quotes_df.to_sql("quotes", engine, if_exists="append", index=False)
+
+    inventory_df = ps.generate_sample_inventory(ps.paper_supplies, seed=seed)
+    initial_transactions = [
+        {"item_name": None, "transaction_type": "sales", "units": None, "price": 50000.0,
+         "transaction_date": initial_date, "transaction_day": ps._day_number(initial_date)}
+    ] + [
+        {"item_name": item["item_name"], "transaction_type": "stock_orders", "units": item["current_stock"],
+         "price": item["current_stock"] * item["unit_price"], "transaction_date": initial_date,
+         "transaction_day": ps._day_number(initial_date)}
+        for _, item in inventory_df.iterrows()
+    ]
+    pd.DataFrame(initial_transactions).to_sql("transactions", engine, if_exists="append", index=False)
+    inventory_df.to_sql("inventory", engine, if_exists="append", index=False)
+    ps.rebuild_ledgers(engine)
+    with engine.begin() as conn:
+        ps.seed_pricing(conn)
+
+
+def write_seed_csvs(tmp_dir: str, rows: int) -> tuple:
+    """Copies of quote_requests.csv and quotes.csv grown to `rows` rows each by repeating their rows."""
+    paths = []
+    for name in ("quote_requests.csv", "quotes.csv"):
+        seed_df = pd.read_csv(name)
+        grown = seed_df.iloc[np.arange(rows) % len(seed_df)]
+        path = os.path.join(tmp_dir, name)
+        grown.to_csv(path, index=False)
+        paths.append(path)
+    return tuple(paths)
+
+
+def bench_init_database(sizes: List[int]) -> None:
+    """Re-initialization cost with seed CSVs of `sizes` rows: original full reload vs. incremental init.
+
+    'changed quotes' rewrites quotes.csv (one extra space), so only the quotes table reloads.
+    Peak allocation is measured separately under tracemalloc.
+    """
+    rows = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            quote_requests_path, quotes_path = write_seed_csvs(tmp_dir, size)
+            engine = ps.create_db_engine(os.path.join(tmp_dir, "benchmark.db"))
+            original_engine, ps.db_engine = ps.db_engine, engine
+            try:
+                def incremental() -> None:
+                    ps.init_database(engine, quote_requests_path=quote_requests_path, quotes_path=quotes_path)
+
+                def timed(label: str, fn: Callable[[], object]) -> None:
+                    start = time.perf_counter()
+                    fn()
+                    rows.append({"rows": size, "run": label, "ms": round((time.perf_counter() - start) * 1000, 1)})
+
+                timed("original", lambda: legacy_init_database(engine, quote_requests_path, quotes_path))
+                legacy_peak = peak_allocated_mb(lambda: legacy_init_database(engine, quote_requests_path, quotes_path))
+                timed("incremental, cold", incremental)
+                timed("incremental, unchanged", incremental)
+                with open(quotes_path, "a") as quotes_file:
+                    quotes_file.write(" ")
+                timed("incremental, changed quotes", incremental)
+                full_peak = peak_allocated_mb(lambda: ps.init_database(
+                    engine, quote_requests_path=quote_requests_path, quotes_path=quotes_path, reuse_unchanged=False
+                ))
+                quote_count = pd.read_sql("SELECT COUNT(*) AS n FROM quotes", engine)["n"].iloc[0]
+                assert quote_count == size, quote_count
+                print(f"{size} rows: peak allocation {legacy_peak:.1f} MB original, {full_peak:.1f} MB chunked reload")
+            finally:
+                ps.db_engine = original_engine
+                engine.dispose()
+    print_table(rows)
+
+
+# =====================================================================
+# migrate_database
+# =====================================================================
+
+# Orders written after the seed, as (item index, transaction type, units, unit price, date). The
+# dates mix the plain ISO dates the tools write with the timestamps of datetime arguments.
+MIGRATION_ORDERS = [
+    (0, "sales", 20, 0.5, "2025-01-15"),
+    (1, "stock_orders", 300, 0.1, "2025-02-01T00:00:00"),
+    (2, "sales", 15, 1.0, "2025-03-10"),
+    (0, "stock_orders", 100, 0.05, "2025-03-10T00:00:00"),
+    (3, "sales", 5, 2.0, "2025-04-01"),
+]
+
+
+def baseline_init_database(engine: Engine, seed: int = 137) -> None:
+    """Build the database the original init_database() and create_transaction() wrote.
+
+    Every table comes from DataFrame.to_sql: inferred column types, no primary keys, no
+    indexes, no ledgers and PRAGMA user_version 0. MIGRATION_ORDERS are appended afterwards,
+    one to_sql call each, as the original create_transaction() did.
+    """
+    initial_date = "2025-01-01T00:00:00"
+    pd.DataFrame({
+        "id": [], "item_name": [], "transaction_type": [], "units": [], "price": [], "transaction_date": [],
+    }).to_sql("transactions", engine, if_exists="replace", index=False)
+
+    quote_requests_df = pd.read_csv("quote_requests.csv")
+    quote_requests_df["id"] = range(1, len(quote_requests_df) + 1)
+    quote_requests_df.to_sql("quote_requests", engine, if_exists="replace", index=False)
+
+    quotes_df = pd.read_csv("quotes.csv")
+    quotes_df["request_id"] = range(1, len(quotes_df) + 1)
+    quotes_df["order_date"] = initial_date
+    quotes_df["request_metadata"] = quotes_df["request_metadata"].apply(
+        lambda x: ast.literal_eval(x) if isinstance(x, str) else x
+    )
+    for field in ("job_type", "order_size", "event_type"):
+        quotes_df[field] = quotes_df["request_metadata"].apply(lambda x: x.get(field, ""))
+    quotes_df[[
+        "request_id", "total_amount", "quote_explanation", "order_date", "job_type", "order_size", "event_type"
+    ]].to_sql("quotes", engine, if_exists="replace", index=False)
+
+    inventory_df = ps.generate_sample_inventory(ps.paper_supplies, seed=seed)
+    initial_transactions = [
+        {"item_name": None, "transaction_type": "sales", "units": None, "price": 50000.0,
+         "transaction_date": initial_date}
+    ] + [
+        {"item_name": item["item_name"], "transaction_type": "stock_orders", "units": item["current_stock"],
+         "price": item["current_stock"] * item["unit_price"], "transaction_date": initial_date}
+        for _, item in inventory_df.iterrows()
+    ]
+    pd.DataFrame(initial_transactions).to_sql("transactions", engine, if_exists="append", index=False)
+    inventory_df.to_sql("inventory", engine, if_exists="replace", index=False)
+
+    item_names = inventory_df["item_name"].tolist()
+    for index, transaction_type, units, unit_price, date in MIGRATION_ORDERS:
+        pd.DataFrame([{
+            "item_name": item_names[index], "transaction_type": transaction_type, "units": units,
+            "price": units * unit_price, "transaction_date": date,
+        }]).to_sql("transactions", engine, if_exists="append", index=False)
+
+
+def bench_migration(as_of_dates: List[str]) -> None:
+    """Upgrade a database built by the original code and compare it with a freshly initialized one.
+
+    Both databases get the seed plus MIGRATION_ORDERS; the fresh one records the orders through
+    create_transactions(). After migrate_database() the schema version must be SCHEMA_VERSION,
+    and get_cash_balance() and get_all_inventory() must agree with the fresh database on every date.
+    """
+    results = {}
+    original_engine = ps.db_engine
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label in ("migrated", "fresh"):
+            engine = ps.create_db_engine(os.path.join(tmp_dir, f"{label}.db"))
+            ps.db_engine = engine
+            try:
+                start = time.perf_counter()
+                if label == "migrated":
+                    baseline_init_database(engine)
+                    version = ps.migrate_database(engine)
+                else:
+                    ps.init_database(engine)
+                    item_names = pd.read_sql("SELECT item_name FROM inventory ORDER BY rowid", engine)["item_name"]
+                    ps.create_transactions([
+                        {"item_name": item_names.iloc[index], "transaction_type": transaction_type,
+                         "quantity": units, "price": units * unit_price, "date": date}
+                        for index, transaction_type, units, unit_price, date in MIGRATION_ORDERS
+                    ])
+                    with engine.connect() as conn:
+                        version = conn.execute(text("PRAGMA user_version")).scalar()
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                results[label] = {
+                    "version": version,
+                    "ms": elapsed_ms,
+                    "reads": {
+                        date: (ps.get_cash_balance(date), ps.get_all_inventory(date)) for date in as_of_dates
+                    },
+                }
+            finally:
+                ps.db_engine = original_engine
+                engine.dispose()
+
+    migrated, fresh = results["migrated"], results["fresh"]
+    assert migrated["version"] == ps.SCHEMA_VERSION, (migrated["version"], ps.SCHEMA_VERSION)
+    rows = []
+    for date in as_of_dates:
+        (migrated_cash, migrated_stock), (fresh_cash, fresh_stock) = migrated["reads"][date], fresh["reads"][date]
+        assert abs(migrated_cash - fresh_cash) < 1e-6, (date, migrated_cash, fresh_cash)
+        assert {k: int(v) for k, v in migrated_stock.items()} == {k: int(v) for k, v in fresh_stock.items()}, date
+        rows.append({
+            "as_of_date": date,
+            "cash": round(migrated_cash, 2),
+            "items_in_stock": len(migrated_stock),
+            "units_in_stock": int(sum(migrated_stock.values())),
+        })
+    print(f"Migrated a baseline database from user_version 0 to {migrated['version']} "
+          f"in {migrated['ms']:.0f} ms (fresh init with the same orders: {fresh['ms']:.0f} ms)")
+    print("Cash and inventory match the fresh database on every date:")
+    print_table(rows)
+
+
+# =====================================================================
+# Import time
+# =====================================================================
+
+# What a script pays to start: the helpers alone, the agent module, and the agent module
+# with the shared orchestrator team (and model) built
+IMPORT_TARGETS = {
+    "project_starter": "import project_starter",
+    "agent_team": "import agent_team",
+    "agent_team + agents": "import agent_team; agent_team.orchestrator_agent",
+}
+
+
+def import_profile(code: str) -> Dict:
+    """Run `code` in a fresh interpreter under -X importtime; total and heaviest imports one level down."""
+    env = {**os.environ, "MODEL_BACKEND": "scripted"}
+    probe = f"{code}; import sys; print(int('smolagents' in sys.modules), int('openai' in sys.modules))"
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe], capture_output=True, text=True, env=env, check=True
+    )
+    wall_s = time.perf_counter() - start
+    top_level, second_level = {}, {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package", nested imports indented by two spaces
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, package = line.split("|")
+        depth = (len(package) - len(package.lstrip()) - 1) // 2
+        if depth == 0:
+            top_level[package.strip()] = int(cumulative) / 1000
+        elif depth == 1:
+            second_level[package.strip()] = int(cumulative) / 1000
+    smolagents_loaded, openai_loaded = result.stdout.split()
+    return {
+        "import_ms": sum(top_level.values()),
+        "wall_ms": wall_s * 1000,
+        "smolagents": smolagents_loaded == "1",
+        "openai": openai_loaded == "1",
+        "heaviest": sorted(second_level.items(), key=lambda item: -item[1])[:3],
+    }
+
+
+def bench_import_time(repeat: int) -> None:
+    """Startup cost of each import target, from `python -X importtime` in fresh interpreters.
+
+    import_ms sums the top-level imports as importtime reports them; wall_ms also includes
+    interpreter startup and anything the code runs after importing. Medians of `repeat` runs.
+    """
+    rows = []
+    for label, code in IMPORT_TARGETS.items():
+        profiles = [import_profile(code) for _ in range(repeat)]
+        rows.append({
+            "target": label,
+            "import_ms": round(statistics.median(p["import_ms"] for p in profiles), 1),
+            "wall_ms": round(statistics.median(p["wall_ms"] for p in profiles), 1),
+            "smolagents": profiles[-1]["smolagents"],
+            "openai": profiles[-1]["openai"],
+            "heaviest_imports": ", ".join(f"{name} {ms:.0f}ms" for name, ms in profiles[-1]["heaviest"]),
+        })
+    print_table(rows)
+
+
+# =====================================================================
+# Command line
+# =====================================================================
+
+def parse_sizes(value: str) -> List[int]:
+    return [int(size) for size in value.split(",") if size.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    report_parser = subparsers.add_parser("financial_report", help="generate_financial_report latency vs. ledger size")
+    report_parser.add_argument("--sizes", type=parse_sizes, default=[1_000, 10_000, 100_000, 1_000_000])
+    report_parser.add_argument("--repeat", type=int, default=5)
+
+    cash_parser = subparsers.add_parser("cash_balance", help="get_cash_balance latency and memory vs. ledger size")
+    cash_parser.add_argument("--sizes", type=parse_sizes, default=[1_000, 10_000, 100_000, 1_000_000])
+    cash_parser.add_argument("--repeat", type=int, default=5)
+
+    snapshots_parser = subparsers.add_parser("snapshots", help="as-of reads on interval checkpoints vs. daily snapshots")
+    snapshots_parser.add_argument("--sizes", type=parse_sizes, default=[10_000, 100_000])
+    snapshots_parser.add_argument("--dates", type=int, default=20, help="as-of dates to read")
+
+    days_parser = subparsers.add_parser("date_columns", help="date range queries on ISO strings vs. integer days")
+    days_parser.add_argument("--sizes", type=parse_sizes, default=[10_000, 100_000, 1_000_000])
+    days_parser.add_argument("--repeat", type=int, default=20)
+
+    matcher_parser = subparsers.add_parser("catalog_matcher", help="match_item_name latency vs. catalog size")
+    matcher_parser.add_argument("--sizes", type=parse_sizes, default=[46, 1_000, 10_000, 50_000])
+    matcher_parser.add_argument("--queries", type=int, default=2_000)
+
+    search_parser = subparsers.add_parser("quote_search", help="search_quote_history latency vs. quote history size")
+    search_parser.add_argument("--sizes", type=parse_sizes, default=[108, 10_000, 100_000, 500_000])
+    search_parser.add_argument("--repeat", type=int, default=5)
+
+    pricing_parser = subparsers.add_parser("pricing", help="build_quote loop vs. vectorized pricing engine")
+    pricing_parser.add_argument("--sizes", type=parse_sizes, default=[4, 100, 1_000, 10_000, 100_000])
+    pricing_parser.add_argument("--repeat", type=int, default=3)
+    pricing_parser.add_argument("--price-changes", type=int, default=10)
+
+    fast_parser = subparsers.add_parser("fast_path", help="fast-path coverage and latency on the seed requests")
+    fast_parser.add_argument("--request-date", default="2025-04-01")
+
+    cache_parser = subparsers.add_parser("llm_cache", help="agent runs with a cold vs. replayed completion cache")
+    cache_parser.add_argument("--requests", type=int, default=100)
+    cache_parser.add_argument("--latency-ms", type=float, default=50.0, help="simulated model latency per call")
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="quote_requests.csv through the full agent stack, offline")
+    pipeline_parser.add_argument("--limit", type=int, default=None, help="number of requests (default: all)")
+    pipeline_parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated model latency per call")
+
+    plan_parser = subparsers.add_parser("plan_mode", help="managed agents vs. one planning call per request")
+    plan_parser.add_argument("--limit", type=int, default=20, help="sample requests to run")
+    plan_parser.add_argument("--latency-ms", type=float, default=300.0, help="simulated latency per model call")
+
+    tools_parser = subparsers.add_parser("tool_calls", help="per-step vs. parallel vs. batched tool calls, write ordering")
+    tools_parser.add_argument("--items", type=int, default=5, help="order lines to check")
+    tools_parser.add_argument("--latency-ms", type=float, default=300.0, help="simulated latency per model call")
+    tools_parser.add_argument("--trials", type=int, default=20, help="sell/reorder/sell turns per agent class")
+
+    rw_parser = subparsers.add_parser("concurrent_rw", help="inventory readers alongside transaction writers")
+    rw_parser.add_argument("--readers", type=int, default=4)
+    rw_parser.add_argument("--writers", type=int, default=2)
+    rw_parser.add_argument("--seconds", type=float, default=5.0)
+    rw_parser.add_argument("--write-rate", type=float, default=40.0, help="total writes per second, all engines")
+
+    oversell_parser = subparsers.add_parser("oversell", help="concurrent sales/reorders must not overdraw stock or cash")
+    oversell_parser.add_argument("--threads", type=int, default=16)
+    oversell_parser.add_argument("--attempts", type=int, default=20, help="sales/reorders tried per thread")
+
+    tracing_parser = subparsers.add_parser("tracing", help="agent request latency with and without tracing")
+    tracing_parser.add_argument("--limit", type=int, default=200, help="number of requests")
+
+    tokens_parser = subparsers.add_parser("prompt_tokens", help="prompt tokens per sample request by tool output mode")
+    tokens_parser.add_argument("--limit", type=int, default=20, help="sample requests to run")
+
+    init_parser = subparsers.add_parser("init_database", help="original vs. incremental database initialization")
+    init_parser.add_argument("--sizes", type=parse_sizes, default=[100, 10_000])
+
+    migration_parser = subparsers.add_parser("migration", help="migrate a baseline-built database and compare with a fresh one")
+    migration_parser.add_argument("--dates", type=lambda value: value.split(","),
+                                  default=["2025-01-01", "2025-02-01", "2025-03-10", "2025-04-30"])
+
+    import_parser = subparsers.add_parser("importtime", help="startup cost of the helpers vs. the agent system")
+    import_parser.add_argument("--repeat", type=int, default=5)
+
+    args = parser.parse_args()
+    if args.benchmark == "financial_report":
+        bench_financial_report(args.sizes, args.repeat)
+    elif args.benchmark == "cash_balance":
+        bench_cash_balance(args.sizes, args.repeat)
+    elif args.benchmark == "snapshots":
+        bench_snapshots(args.sizes, args.dates)
+    elif args.benchmark == "date_columns":
+        bench_date_columns(args.sizes, args.repeat)
+    elif args.benchmark == "catalog_matcher":
+        bench_catalog_matcher(args.sizes, args.queries)
+    elif args.benchmark == "quote_search":
+        bench_quote_search(args.sizes, args.repeat)
+    elif args.benchmark == "pricing":
+        bench_pricing(args.sizes, args.repeat, args.price_changes)
+    elif args.benchmark == "fast_path":
+        bench_fast_path(args.request_date)
+    elif args.benchmark == "llm_cache":
+        bench_llm_cache(args.requests, args.latency_ms)
+    elif args.benchmark == "pipeline":
+        bench_pipeline(args.limit, args.latency_ms)
+    elif args.benchmark == "plan_mode":
+        bench_plan_mode(args.limit, args.latency_ms)
+    elif args.benchmark == "tool_calls":
+        bench_tool_calls(args.items, args.latency_ms, args.trials)
+    elif args.benchmark == "concurrent_rw":
+        bench_concurrent_rw(args.readers, args.writers, args.seconds, args.write_rate)
+    elif args.benchmark == "oversell":
+        bench_oversell(args.threads, args.attempts)
+    elif args.benchmark == "tracing":
+        bench_tracing(args.limit)
+    elif args.benchmark == "prompt_tokens":
+        bench_prompt_tokens(args.limit)
+    elif args.benchmark == "init_database":
+        bench_init_database(args.sizes)
+    elif args.benchmark == "migration":
+        bench_migration(args.dates)
+    elif args.benchmark == "importtime":
+        bench_import_time(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
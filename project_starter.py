@@ -3,16 +3,84 @@ import numpy as np
 import os
 import time
 import json
-import dotenv
 import ast
+import bisect
+import functools
+import hashlib
+import itertools
+import importlib
+import re
+import sys
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 from sqlalchemy.sql import text
 from datetime import datetime, timedelta
-from typing import Dict, List, Union
-from sqlalchemy import create_engine, Engine
-from smolagents import ToolCallingAgent, OpenAIServerModel, tool
+from typing import Callable, Dict, Iterator, List, TypeVar, Union
+from sqlalchemy import create_engine, event, Connection, Engine
+from sqlalchemy.exc import OperationalError
+
+# === REVIEW: database engine ===
+# Purpose: One configured engine shared by every helper and worker thread.
+# WAL journal: readers see the last committed state while a writer appends to the log, so
+#   get_all_inventory() and friends no longer wait for create_transaction() writers (with the
+#   default rollback journal a writer locks readers out while it commits). Only writers
+#   serialize, and they wait up to busy_timeout_ms for each other instead of failing with
+#   "database is locked". WAL persists in the database file once set.
+# synchronous=NORMAL: in WAL mode a commit is durable once the log is checkpointed; a power
+#   loss can drop the last commits but never corrupts the database.
+# Pool: up to pool_size + max_overflow connections are kept open and reused, so pd.read_sql /
+#   to_sql calls do not reconnect and re-run the PRAGMAs. Each connection keeps a cache of
+#   cached_statements prepared statements, and SQLAlchemy caches compiled SQL per engine.
+def create_db_engine(
+    path: str = "munder_difflin.db",
+    pool_size: int = 8,
+    max_overflow: int = 8,
+    busy_timeout_ms: int = 10_000,
+    cached_statements: int = 256,
+) -> Engine:
+    """
+    Create the SQLite engine used by the helpers: WAL journal, synchronous=NORMAL, busy timeout,
+    a sized connection pool and a larger per-connection prepared-statement cache.
+
+    Args:
+        path (str): SQLite database file. Default is "munder_difflin.db".
+        pool_size (int): Connections kept open in the pool. Default is 8.
+        max_overflow (int): Extra connections opened under load and closed when returned. Default is 8.
+        busy_timeout_ms (int): How long a writer waits for another writer's lock. Default is 10 seconds.
+        cached_statements (int): Prepared statements cached per connection. Default is 256.
+
+    Returns:
+        Engine: The configured engine.
+    """
+    engine = create_engine(
+        f"sqlite:///{path}",
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=busy_timeout_ms / 1000,
+        connect_args={
+            "timeout": busy_timeout_ms / 1000,
+            "check_same_thread": False,
+            "cached_statements": cached_statements,
+        },
+    )
+
+    @event.listens_for(engine, "connect")
+    def configure_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+        cursor.close()
+
+    return engine
+
 
 # Create an SQLite database
-db_engine = create_engine("sqlite:///munder_difflin.db")
+db_engine = create_db_engine("munder_difflin.db")
 
 # List containing the different kinds of papers 
 paper_supplies = [
@@ -137,33 +205,873 @@ def generate_sample_inventory(paper_supplies: list, coverage: float = 0.4, seed:
     # Return inventory as a pandas DataFrame
     return pd.DataFrame(inventory)
 
+# === REVIEW: tracing ===
+# Purpose: Lightweight spans showing where a request spends its time. Each span records a
+#   name, a category, start/duration, its parent span and attributes (row counts, tokens...).
+# Categories: 'request' (one per traced request), 'agent' (ToolCallingAgent.run), 'llm' (model
+#   completions with token usage), 'tool' (calls of tools patched by trace_tool), 'helper'
+#   (@traced helper functions, with result sizes) and 'sql' (every statement executed through any
+#   SQLAlchemy engine, with rows written). Spans nest, so category totals overlap.
+# Spans are only recorded inside request_trace(); elsewhere tracing costs one ContextVar
+#   lookup. The current trace and span live in ContextVars, which smolagents copies into its
+#   parallel tool-call threads.
+# Export: RequestTrace.write_jsonl() (one span per line) or write_chrome_trace() (open in
+#   chrome://tracing or Perfetto); summary() gives the per-request totals saved in test_results.csv.
+CURRENT_TRACE = ContextVar("current_trace", default=None)
+CURRENT_SPAN_ID = ContextVar("current_span_id", default=None)
+
+
+class RequestTrace:
+    """Spans recorded while handling one request.
+
+    Args:
+        name (str): Label of the trace, e.g. "request-3".
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.spans: List[Dict] = []
+        self.started_at = time.perf_counter()
+        self.span_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def add(self, span: Dict) -> None:
+        with self.lock:
+            self.spans.append(span)
+
+    def summary(self) -> Dict:
+        """
+        Per-request totals: span counts, milliseconds per category, tokens and SQL rows written.
+
+        Returns:
+            Dict: trace_ms plus '<category>_calls' and '<category>_ms' for agent, llm, tool,
+                helper and sql spans, llm_input_tokens, llm_output_tokens and sql_rows_written.
+        """
+        totals = {"trace_ms": 0.0}
+        for category in ("agent", "llm", "tool", "helper", "sql"):
+            totals[f"{category}_calls"] = 0
+            totals[f"{category}_ms"] = 0.0
+        totals.update({"llm_input_tokens": 0, "llm_output_tokens": 0, "sql_rows_written": 0})
+        with self.lock:
+            spans = list(self.spans)
+        for span in spans:
+            category = span["category"]
+            if category == "request":
+                totals["trace_ms"] += span["duration_ms"]
+                continue
+            totals[f"{category}_calls"] += 1
+            totals[f"{category}_ms"] += span["duration_ms"]
+            attributes = span["attributes"]
+            totals["llm_input_tokens"] += attributes.get("input_tokens", 0)
+            totals["llm_output_tokens"] += attributes.get("output_tokens", 0)
+            if category == "sql" and attributes.get("rows", 0) > 0:
+                totals["sql_rows_written"] += attributes["rows"]
+        return {key: round(value, 3) if isinstance(value, float) else value for key, value in totals.items()}
+
+    def write_jsonl(self, path: str) -> None:
+        """Write one JSON object per span, ordered by start time."""
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        with open(path, "w") as f:
+            for span in spans:
+                f.write(json.dumps({"trace": self.name, **span}, default=str) + "\n")
+
+    def write_chrome_trace(self, path: str) -> None:
+        """Write the spans in the Chrome trace event format (complete 'X' events, microseconds)."""
+        with self.lock:
+            spans = list(self.spans)
+        events = [
+            {
+                "name": span["name"],
+                "cat": span["category"],
+                "ph": "X",
+                "ts": round(span["start_ms"] * 1000, 1),
+                "dur": round(span["duration_ms"] * 1000, 1),
+                "pid": os.getpid(),
+                "tid": span["thread"],
+                "args": {"id": span["id"], "parent": span["parent"], **span["attributes"]},
+            }
+            for span in spans
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace": self.name}}, f, default=str)
+
+
+@contextmanager
+def request_trace(name: str):
+    """Record every span started in this context (and in threads that copy it) into a new RequestTrace."""
+    trace = RequestTrace(name)
+    trace_token = CURRENT_TRACE.set(trace)
+    try:
+        with trace_span(name, "request"):
+            yield trace
+    finally:
+        CURRENT_TRACE.reset(trace_token)
+
+
+@contextmanager
+def trace_span(name: str, category: str, **attributes):
+    """Record a span around the block, yielding its attributes dict so the block can add to it.
+
+    Args:
+        name: Span name (tool, agent, function or model name).
+        category: One of 'request', 'agent', 'llm', 'tool', 'helper', 'sql'.
+        **attributes: Initial span attributes.
+    """
+    trace = CURRENT_TRACE.get()
+    if trace is None:
+        yield attributes
+        return
+    span_id = next(trace.span_ids)
+    parent_id = CURRENT_SPAN_ID.get()
+    span_token = CURRENT_SPAN_ID.set(span_id)
+    start = time.perf_counter()
+    try:
+        yield attributes
+    except Exception as e:
+        attributes["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        end = time.perf_counter()
+        CURRENT_SPAN_ID.reset(span_token)
+        trace.add({
+            "id": span_id,
+            "parent": parent_id,
+            "name": name,
+            "category": category,
+            "start_ms": (start - trace.started_at) * 1000,
+            "duration_ms": (end - start) * 1000,
+            "thread": threading.get_ident(),
+            "attributes": attributes,
+        })
+
+
+def traced(function):
+    """Decorator recording each call of a helper function as a 'helper' span with its result size
+    (rows of a DataFrame or list, entries of a dict)."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with trace_span(function.__name__, "helper") as attributes:
+            result = function(*args, **kwargs)
+            if isinstance(result, (pd.DataFrame, list, dict)):
+                attributes["result_size"] = len(result)
+            return result
+    return wrapper
+
+
+def trace_tool(tool_obj):
+    """Record every call of a smolagents tool as a 'tool' span. Patches the tool in place.
+
+    Args:
+        tool_obj: A tool created with @tool.
+
+    Returns:
+        The same tool.
+    """
+    forward = tool_obj.forward
+
+    def traced_forward(*args, **kwargs):
+        arguments = {key: str(value)[:200] for key, value in kwargs.items()}
+        with trace_span(tool_obj.name, "tool", arguments=arguments) as attributes:
+            result = forward(*args, **kwargs)
+            attributes["output_chars"] = len(str(result))
+            return result
+
+    tool_obj.forward = traced_forward
+    return tool_obj
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _trace_sql_start(conn, cursor, statement, parameters, context, executemany):
+    if CURRENT_TRACE.get() is not None:
+        conn.info.setdefault("trace_sql_starts", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _trace_sql_end(conn, cursor, statement, parameters, context, executemany):
+    trace = CURRENT_TRACE.get()
+    starts = conn.info.get("trace_sql_starts")
+    if trace is None or not starts:
+        return
+    start = starts.pop()
+    end = time.perf_counter()
+    trace.add({
+        "id": next(trace.span_ids),
+        "parent": CURRENT_SPAN_ID.get(),
+        "name": " ".join(statement.split())[:120],
+        "category": "sql",
+        "start_ms": (start - trace.started_at) * 1000,
+        "duration_ms": (end - start) * 1000,
+        "thread": threading.get_ident(),
+        # sqlite3 reports rows changed by INSERT/UPDATE/DELETE (summed over executemany), -1 for SELECT
+        "attributes": {"rows": cursor.rowcount, "executemany": executemany},
+    })
+
+# === REVIEW: database schema ===
+# Purpose: Explicit DDL for every table, replacing the column types and missing keys that
+#   DataFrame.to_sql used to infer (e.g. 'transactions.id' was an empty REAL column).
+# TABLE_SCHEMAS always describes the latest schema and is what init_database() creates.
+# INDEX_SCHEMAS covers the quotes -> quote_requests join and the quote date filter.
+# RESERVATION_INDEX_SCHEMAS cover the reservation lookups by hold and by status. They are kept
+#   apart because 'reservations' only exists from v5 on, and earlier migrations run INDEX_SCHEMAS.
+# DAY_INDEX_SCHEMAS cover the filters every ledger query uses: item_name / transaction_type with a
+#   transaction_day range. They carry the columns those queries read, so SQLite answers them
+#   from the index alone. They are kept apart because migrations before v9 run INDEX_SCHEMAS on
+#   'transactions' tables that have no transaction_day column yet.
+# SEARCH_SCHEMAS adds the trigram FTS5 index behind search_quote_history() and the triggers
+#   that keep it in sync with 'quotes' and 'quote_requests'. It is optional: on SQLite builds
+#   without FTS5 (or the trigram tokenizer, SQLite < 3.34) searches fall back to LIKE scans.
+# PRICING_SCHEMAS index 'discount_tiers' by scope and add the triggers that bump 'pricing_version'
+#   on any change to 'item_prices' or 'discount_tiers', which is how pricing_engine() knows its
+#   compiled lookups are stale.
+# SCHEMA_VERSION is stored in SQLite's PRAGMA user_version. migrate_database() upgrades an
+#   existing munder_difflin.db in place by running each step in MIGRATIONS above its version.
+SCHEMA_VERSION = 11
+
+TABLE_SCHEMAS = {
+    "transactions": """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY,
+            item_name TEXT,
+            transaction_type TEXT NOT NULL,  -- 'stock_orders' or 'sales'
+            units INTEGER,                   -- Quantity involved
+            price REAL,                      -- Total price for the transaction
+            transaction_date TEXT NOT NULL,  -- ISO-formatted date or timestamp, as given
+            transaction_day INTEGER NOT NULL, -- Days since 1970-01-01 of transaction_date; all queries use this
+            request_id INTEGER               -- Scenario request that recorded it (NULL for seed stock and direct calls)
+        )
+    """,
+    "quote_requests": """
+        CREATE TABLE IF NOT EXISTS quote_requests (
+            id INTEGER PRIMARY KEY,
+            mood TEXT,
+            job TEXT,
+            need_size TEXT,
+            event TEXT,
+            response TEXT
+        )
+    """,
+    "quotes": """
+        CREATE TABLE IF NOT EXISTS quotes (
+            id INTEGER PRIMARY KEY,
+            request_id INTEGER,
+            total_amount REAL,
+            quote_explanation TEXT,
+            order_date TEXT,
+            job_type TEXT,
+            order_size TEXT,
+            event_type TEXT
+        )
+    """,
+    "inventory": """
+        CREATE TABLE IF NOT EXISTS inventory (
+            item_name TEXT PRIMARY KEY,
+            category TEXT,
+            unit_price REAL,
+            current_stock INTEGER,
+            min_stock_level INTEGER
+        )
+    """,
+    "stock_balances": """
+        CREATE TABLE IF NOT EXISTS stock_balances (
+            item_name TEXT PRIMARY KEY,
+            units INTEGER NOT NULL,
+            sales_units INTEGER NOT NULL DEFAULT 0,
+            sales_revenue REAL NOT NULL DEFAULT 0,
+            last_transaction_day INTEGER NOT NULL
+        )
+    """,
+    "stock_checkpoints": """
+        CREATE TABLE IF NOT EXISTS stock_checkpoints (
+            item_name TEXT NOT NULL,
+            checkpoint_day INTEGER NOT NULL,
+            units INTEGER NOT NULL,
+            sales_units INTEGER NOT NULL DEFAULT 0,
+            sales_revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (item_name, checkpoint_day)
+        )
+    """,
+    "cash_balance": """
+        CREATE TABLE IF NOT EXISTS cash_balance (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            balance REAL NOT NULL,
+            last_transaction_day INTEGER NOT NULL
+        )
+    """,
+    "cash_checkpoints": """
+        CREATE TABLE IF NOT EXISTS cash_checkpoints (
+            checkpoint_day INTEGER PRIMARY KEY,
+            balance REAL NOT NULL
+        )
+    """,
+    "reservations": """
+        CREATE TABLE IF NOT EXISTS reservations (
+            id INTEGER PRIMARY KEY,
+            hold_id TEXT NOT NULL,                  -- Groups the lines of one reserved quote
+            item_name TEXT NOT NULL,
+            units INTEGER NOT NULL,
+            price REAL NOT NULL,                    -- Quoted total price of the line, discount applied
+            hold_date TEXT NOT NULL,                -- ISO date the stock was checked as of
+            expires_day INTEGER NOT NULL,           -- Last day number (see _day_number) the hold counts on
+            status TEXT NOT NULL DEFAULT 'active'   -- 'active', 'sold', 'released' or 'expired'
+        )
+    """,
+    "item_prices": """
+        CREATE TABLE IF NOT EXISTS item_prices (
+            item_name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            unit_price REAL NOT NULL,
+            effective_date TEXT NOT NULL,   -- ISO date from which this price applies
+            PRIMARY KEY (item_name, effective_date)
+        )
+    """,
+    "discount_tiers": """
+        CREATE TABLE IF NOT EXISTS discount_tiers (
+            id INTEGER PRIMARY KEY,
+            scope TEXT NOT NULL DEFAULT 'all',      -- 'all', 'category' or 'item'
+            scope_value TEXT NOT NULL DEFAULT '',   -- Category or item name; '' for 'all'
+            min_units INTEGER NOT NULL,             -- Rate applies to quotes of more units than this
+            rate REAL NOT NULL,
+            effective_date TEXT NOT NULL            -- ISO date from which this scope's tier table applies
+        )
+    """,
+    "pricing_version": """
+        CREATE TABLE IF NOT EXISTS pricing_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """,
+    "data_sources": """
+        CREATE TABLE IF NOT EXISTS data_sources (
+            table_name TEXT PRIMARY KEY,    -- Seed table loaded from the source
+            source TEXT NOT NULL,           -- CSV path, or the generator of the table
+            content_hash TEXT NOT NULL,     -- sha256 of the source file (or generator inputs)
+            row_count INTEGER NOT NULL,
+            loaded_at TEXT NOT NULL
+        )
+    """,
+}
+
+INDEX_SCHEMAS = [
+    "CREATE INDEX IF NOT EXISTS idx_quotes_request_id ON quotes (request_id)",
+    "CREATE INDEX IF NOT EXISTS idx_quotes_order_date ON quotes (order_date)",
+]
+
+RESERVATION_INDEX_SCHEMAS = [
+    "CREATE INDEX IF NOT EXISTS idx_reservations_hold_id ON reservations (hold_id)",
+    "CREATE INDEX IF NOT EXISTS idx_reservations_status ON reservations (status, expires_day)",
+]
+
+DAY_INDEX_SCHEMAS = [
+    "CREATE INDEX IF NOT EXISTS idx_transactions_item_day "
+    "ON transactions (item_name, transaction_day, transaction_type, units, price)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_type_day ON transactions (transaction_type, transaction_day, price)",
+]
+
+# transaction_day of a stored transaction_date, for migrations ('1970-01-01' is Julian day 2440587.5)
+TRANSACTION_DAY_SQL = "CAST(julianday(substr(transaction_date, 1, 10)) - 2440587.5 AS INTEGER)"
+
+# Day number before any real date, standing in for "no checkpoint yet" in day ranges
+NO_DAY = -10 ** 9
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _day_number(value: Union[str, datetime, int]) -> int:
+    """Convert an ISO date or timestamp (or a datetime) to its day number, the days since 1970-01-01.
+
+    Only the date part counts, so '2025-01-01' and '2025-01-01T00:00:00' are the same day.
+    Day numbers are passed through unchanged.
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value)[:10])
+    return (value - EPOCH).days
+
+
+PRICING_SCHEMAS = [
+    "CREATE INDEX IF NOT EXISTS idx_discount_tiers_scope ON discount_tiers (scope, scope_value, effective_date)",
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {table_name}_{event.lower()}_version AFTER {event} ON {table_name} BEGIN
+        UPDATE pricing_version SET version = version + 1 WHERE id = 1;
+    END
+    """
+    for table_name in ("item_prices", "discount_tiers")
+    for event in ("INSERT", "UPDATE", "DELETE")
+]
+
+# One FTS row per quote (rowid = quotes.id) holding the customer request and the quote explanation.
+# The trigram tokenizer matches case-insensitive substrings, like the LOWER(...) LIKE '%term%' scan.
+SEARCH_SCHEMAS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS quotes_fts USING fts5(
+        original_request, quote_explanation, tokenize = 'trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS quotes_fts_insert AFTER INSERT ON quotes BEGIN
+        INSERT INTO quotes_fts (rowid, original_request, quote_explanation)
+        VALUES (new.id, (SELECT response FROM quote_requests WHERE id = new.request_id), new.quote_explanation);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS quotes_fts_delete AFTER DELETE ON quotes BEGIN
+        DELETE FROM quotes_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS quotes_fts_update AFTER UPDATE OF id, request_id, quote_explanation ON quotes BEGIN
+        DELETE FROM quotes_fts WHERE rowid = old.id;
+        INSERT INTO quotes_fts (rowid, original_request, quote_explanation)
+        VALUES (new.id, (SELECT response FROM quote_requests WHERE id = new.request_id), new.quote_explanation);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS quote_requests_fts_insert AFTER INSERT ON quote_requests BEGIN
+        UPDATE quotes_fts SET original_request = new.response
+        WHERE rowid IN (SELECT id FROM quotes WHERE request_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS quote_requests_fts_update AFTER UPDATE OF id, response ON quote_requests BEGIN
+        UPDATE quotes_fts SET original_request = NULL
+        WHERE rowid IN (SELECT id FROM quotes WHERE request_id = old.id);
+        UPDATE quotes_fts SET original_request = new.response
+        WHERE rowid IN (SELECT id FROM quotes WHERE request_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS quote_requests_fts_delete AFTER DELETE ON quote_requests BEGIN
+        UPDATE quotes_fts SET original_request = NULL
+        WHERE rowid IN (SELECT id FROM quotes WHERE request_id = old.id);
+    END
+    """,
+]
+
+
+def create_schema(db_engine: Engine) -> None:
+    """
+    Create every table and index at the latest schema version, leaving existing tables untouched.
+
+    Args:
+        db_engine (Engine): A SQLAlchemy engine connected to the SQLite database.
+    """
+    with db_engine.begin() as conn:
+        for ddl in TABLE_SCHEMAS.values():
+            conn.execute(text(ddl))
+        for ddl in INDEX_SCHEMAS + RESERVATION_INDEX_SCHEMAS + DAY_INDEX_SCHEMAS:
+            conn.execute(text(ddl))
+        _create_quote_search(conn)
+        _create_pricing_store(conn)
+        conn.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
+
+
+def _create_pricing_store(conn) -> None:
+    """Create the pricing version row, the tier index and the triggers that bump the version."""
+    conn.execute(text("INSERT OR IGNORE INTO pricing_version (id, version) VALUES (1, 0)"))
+    for ddl in PRICING_SCHEMAS:
+        conn.execute(text(ddl))
+
+
+def drop_schema(db_engine: Engine, tables: List[str] = None) -> None:
+    """
+    Drop every table known to the schema layer so init_database() can start from scratch.
+
+    Args:
+        db_engine (Engine): A SQLAlchemy engine connected to the SQLite database.
+        tables (List[str], optional): Drop only these tables and keep the schema version, so
+            create_schema() recreates just them. Default drops everything.
+    """
+    with db_engine.begin() as conn:
+        if tables is None:
+            conn.execute(text("DROP TABLE IF EXISTS quotes_fts"))
+        for table_name in tables or TABLE_SCHEMAS:
+            conn.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+        if tables is None:
+            conn.execute(text("PRAGMA user_version = 0"))
+
+
+def _create_quote_search(conn) -> bool:
+    """Create the quotes_fts index and its sync triggers, filling the index from existing quotes.
+
+    An index that already exists is kept as is: its triggers have kept it in sync.
+
+    Args:
+        conn: SQLAlchemy connection inside the schema or migration transaction.
+
+    Returns:
+        bool: False if this SQLite build lacks FTS5 or the trigram tokenizer (searches use LIKE).
+    """
+    existed = conn.execute(
+        text("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'quotes_fts'")
+    ).scalar()
+    try:
+        conn.execute(text(SEARCH_SCHEMAS[0]))
+    except OperationalError:
+        return False
+    for ddl in SEARCH_SCHEMAS[1:]:
+        conn.execute(text(ddl))
+    if existed:
+        return True
+    conn.execute(text("""
+        INSERT INTO quotes_fts (rowid, original_request, quote_explanation)
+        SELECT q.id, qr.response, q.quote_explanation
+        FROM quotes q
+        LEFT JOIN quote_requests qr ON qr.id = q.request_id
+    """))
+    return True
+
+
+def _rebuild_table(conn, table_name: str, insert_sql: str) -> None:
+    """Recreate `table_name` from TABLE_SCHEMAS and copy its rows back in.
+
+    Args:
+        conn: SQLAlchemy connection inside the migration transaction.
+        table_name: Table to rebuild. Missing tables are simply created.
+        insert_sql: INSERT ... SELECT reading from the old rows in `{table_name}_legacy`.
+    """
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": table_name},
+    ).first()
+    if not exists:
+        conn.execute(text(TABLE_SCHEMAS[table_name]))
+        return
+    conn.execute(text(f"ALTER TABLE {table_name} RENAME TO {table_name}_legacy"))
+    conn.execute(text(TABLE_SCHEMAS[table_name]))
+    conn.execute(text(insert_sql))
+    conn.execute(text(f"DROP TABLE {table_name}_legacy"))
+
+
+def _migrate_to_v1(conn) -> None:
+    """Give tables created by DataFrame.to_sql their explicit schema, keys and indexes."""
+    # Keep the IDs create_transaction() already handed out: they were the legacy rowids
+    _rebuild_table(conn, "transactions", f"""
+        INSERT INTO transactions (id, item_name, transaction_type, units, price, transaction_date, transaction_day)
+        SELECT rowid, item_name, transaction_type, units, price, transaction_date, {TRANSACTION_DAY_SQL}
+        FROM transactions_legacy ORDER BY rowid
+    """)
+    _rebuild_table(conn, "quote_requests", """
+        INSERT INTO quote_requests (id, mood, job, need_size, event, response)
+        SELECT id, mood, job, need_size, event, response FROM quote_requests_legacy
+    """)
+    _rebuild_table(conn, "quotes", """
+        INSERT INTO quotes (request_id, total_amount, quote_explanation, order_date, job_type, order_size, event_type)
+        SELECT request_id, total_amount, quote_explanation, order_date, job_type, order_size, event_type
+        FROM quotes_legacy
+    """)
+    _rebuild_table(conn, "inventory", """
+        INSERT INTO inventory (item_name, category, unit_price, current_stock, min_stock_level)
+        SELECT item_name, category, unit_price, current_stock, min_stock_level FROM inventory_legacy
+    """)
+    for ddl in INDEX_SCHEMAS:
+        conn.execute(text(ddl))
+    _rebuild_stock_ledger(conn)
+
+
+def _migrate_to_v2(conn) -> None:
+    """Add per-item sales totals to the stock ledger for the set-based financial report."""
+    _add_transaction_day(conn)
+    _rebuild_stock_ledger(conn)
+
+
+def _migrate_to_v3(conn) -> None:
+    """Add the running cash balance and its dated checkpoints."""
+    _add_transaction_day(conn)
+    _rebuild_cash_ledger(conn)
+
+
+def _migrate_to_v4(conn) -> None:
+    """Key 'quotes' by id and add the full-text quote search index."""
+    _rebuild_table(conn, "quotes", """
+        INSERT INTO quotes (id, request_id, total_amount, quote_explanation, order_date, job_type, order_size, event_type)
+        SELECT rowid, request_id, total_amount, quote_explanation, order_date, job_type, order_size, event_type
+        FROM quotes_legacy ORDER BY rowid
+    """)
+    for ddl in INDEX_SCHEMAS:
+        conn.execute(text(ddl))
+    _create_quote_search(conn)
+
+
+def _migrate_to_v5(conn) -> None:
+    """Add the 'reservations' table holding quoted stock."""
+    conn.execute(text(TABLE_SCHEMAS["reservations"]))
+    for ddl in RESERVATION_INDEX_SCHEMAS:
+        conn.execute(text(ddl))
+
+
+def _migrate_to_v6(conn) -> None:
+    """Add the dated pricing store, seeded with the catalog prices and discount tiers."""
+    for table_name in ("item_prices", "discount_tiers", "pricing_version"):
+        conn.execute(text(TABLE_SCHEMAS[table_name]))
+    _create_pricing_store(conn)
+    seed_pricing(conn)
+
+
+def _migrate_to_v7(conn) -> None:
+    """Add 'data_sources', which lets init_database() skip reloading unchanged seed CSVs."""
+    conn.execute(text(TABLE_SCHEMAS["data_sources"]))
+
+
+def _migrate_to_v8(conn) -> None:
+    """Replace the interval stock and cash checkpoints with daily snapshots."""
+    _add_transaction_day(conn)
+    _rebuild_stock_ledger(conn)
+    _rebuild_cash_ledger(conn)
+
+
+def _migrate_to_v9(conn) -> None:
+    """Add the integer transaction_day behind every date range, with covering indexes, and key the ledgers by it."""
+    _add_transaction_day(conn)
+    for ddl in DAY_INDEX_SCHEMAS:
+        conn.execute(text(ddl))
+    _rebuild_stock_ledger(conn)
+    _rebuild_cash_ledger(conn)
+
+
+def _migrate_to_v10(conn) -> None:
+    """Expire reservations by simulated day instead of wall-clock time."""
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(reservations)"))}
+    if "expires_day" not in columns:
+        _rebuild_table(conn, "reservations", f"""
+            INSERT INTO reservations (id, hold_id, item_name, units, price, hold_date, expires_day, status)
+            SELECT id, hold_id, item_name, units, price, hold_date,
+                   CAST(julianday(substr(hold_date, 1, 10)) - 2440587.5 AS INTEGER) + {RESERVATION_TTL_DAYS}, status
+            FROM reservations_legacy ORDER BY id
+        """)
+    for ddl in RESERVATION_INDEX_SCHEMAS:
+        conn.execute(text(ddl))
+
+
+def _migrate_to_v11(conn) -> None:
+    """Record which scenario request wrote each transaction, so a resumed run can skip it."""
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(transactions)"))}
+    if "request_id" not in columns:
+        conn.execute(text("ALTER TABLE transactions ADD COLUMN request_id INTEGER"))
+
+
+def _add_transaction_day(conn) -> None:
+    """Rebuild a 'transactions' table from before v9 with its transaction_day filled in.
+
+    The ledger rebuilds read transaction_day, so the earlier migrations that rebuild a ledger
+    call this first. Tables that already have the column are left alone. The old
+    transaction_date indexes are dropped with the old table.
+    """
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(transactions)"))}
+    if "transaction_day" in columns:
+        return
+    _rebuild_table(conn, "transactions", f"""
+        INSERT INTO transactions (id, item_name, transaction_type, units, price, transaction_date, transaction_day)
+        SELECT id, item_name, transaction_type, units, price, transaction_date, {TRANSACTION_DAY_SQL}
+        FROM transactions_legacy ORDER BY id
+    """)
+
+
+MIGRATIONS = {
+    1: _migrate_to_v1,
+    2: _migrate_to_v2,
+    3: _migrate_to_v3,
+    4: _migrate_to_v4,
+    5: _migrate_to_v5,
+    6: _migrate_to_v6,
+    7: _migrate_to_v7,
+    8: _migrate_to_v8,
+    9: _migrate_to_v9,
+    10: _migrate_to_v10,
+    11: _migrate_to_v11,
+}
+
+
+def migrate_database(db_engine: Engine) -> int:
+    """
+    Upgrade an existing database in place to SCHEMA_VERSION, keeping all of its records.
+
+    Each pending step in MIGRATIONS runs in its own transaction and bumps PRAGMA user_version,
+    so an interrupted upgrade resumes from the last completed step.
+
+    Args:
+        db_engine (Engine): A SQLAlchemy engine connected to the SQLite database.
+
+    Returns:
+        int: The schema version of the database after migrating.
+    """
+    with db_engine.connect() as conn:
+        version = conn.execute(text("PRAGMA user_version")).scalar()
+
+    for target_version in sorted(MIGRATIONS):
+        if target_version <= version:
+            continue
+        with db_engine.begin() as conn:
+            # pysqlite only opens transactions implicitly before DML; make the DDL part of it too
+            conn.exec_driver_sql("BEGIN")
+            MIGRATIONS[target_version](conn)
+            conn.execute(text(f"PRAGMA user_version = {target_version}"))
+        version = target_version
+
+    return version
+
+# === REVIEW: seed data sources ===
+# Purpose: Make re-initialization cheap when the seed data has not changed.
+# SOURCE_TABLES are filled from quote_requests.csv, quotes.csv and generate_sample_inventory().
+#   'data_sources' records the sha256 of each source (for the inventory: of the catalog and the
+#   seed) when its table is loaded; init_database() keeps a table whose source hash is unchanged
+#   and reloads only the others. The quotes table stores request_metadata already parsed into
+#   job_type / order_size / event_type, so a kept table skips ast.literal_eval entirely.
+# Loads stream the CSVs in CSV_CHUNK_ROWS chunks, so a large history file never sits in memory
+#   whole, and parse each distinct request_metadata string once.
+# Every other table (transactions, ledgers, reservations, prices) is run state and is always reset.
+# 'pricing_version' is kept too, so the compiled pricing cache never sees an old version number
+#   again after a reset.
+SOURCE_TABLES = ["quote_requests", "quotes", "inventory"]
+KEPT_TABLES = SOURCE_TABLES + ["data_sources", "pricing_version"]
+CSV_CHUNK_ROWS = 50_000
+
+
+def file_content_hash(path: str, block_size: int = 1 << 20) -> str:
+    """sha256 hex digest of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_quote_requests(conn: Connection, path: str) -> int:
+    """Stream quote_requests.csv into 'quote_requests', numbering ids from 1. Returns the row count."""
+    row_count = 0
+    for chunk in pd.read_csv(path, chunksize=CSV_CHUNK_ROWS):
+        chunk["id"] = range(row_count + 1, row_count + len(chunk) + 1)
+        chunk.to_sql("quote_requests", conn, if_exists="append", index=False)
+        row_count += len(chunk)
+    return row_count
+
+
+def _load_quotes(conn: Connection, path: str, order_date: str) -> int:
+    """Stream quotes.csv into 'quotes' with request_metadata unpacked. Returns the row count."""
+    row_count = 0
+    for chunk in pd.read_csv(path, chunksize=CSV_CHUNK_ROWS):
+        chunk["request_id"] = range(row_count + 1, row_count + len(chunk) + 1)
+        chunk["order_date"] = order_date
+
+        # Unpack metadata fields (job_type, order_size, event_type) if present
+        if "request_metadata" in chunk.columns:
+            # Metadata strings repeat a lot; parse each distinct one once
+            parsed = {
+                raw: ast.literal_eval(raw) for raw in chunk["request_metadata"].dropna().unique() if isinstance(raw, str)
+            }
+            metadata = chunk["request_metadata"].map(lambda x: parsed.get(x, x) if isinstance(x, str) else x)
+            for field in ("job_type", "order_size", "event_type"):
+                chunk[field] = metadata.map(lambda x: x.get(field, "") if isinstance(x, dict) else None)
+
+        # Retain only relevant columns
+        chunk = chunk[[
+            "request_id",
+            "total_amount",
+            "quote_explanation",
+            "order_date",
+            "job_type",
+            "order_size",
+            "event_type"
+        ]]
+        chunk.to_sql("quotes", conn, if_exists="append", index=False)
+        row_count += len(chunk)
+    return row_count
+
+
+def _load_inventory(conn: Connection, seed: int) -> int:
+    """Fill 'inventory' from generate_sample_inventory(). Returns the row count."""
+    inventory_df = generate_sample_inventory(paper_supplies, seed=seed)
+    inventory_df.to_sql("inventory", conn, if_exists="append", index=False)
+    return len(inventory_df)
+
+
+def load_data_sources(db_engine: Engine, sources: Dict[str, tuple], reuse_unchanged: bool = True) -> Dict[str, bool]:
+    """
+    Load each seed table whose source changed since it was last loaded, one transaction per table.
+
+    Args:
+        db_engine (Engine): A SQLAlchemy engine connected to the SQLite database.
+        sources (Dict[str, tuple]): Table name -> (source label, content hash, loader); the loader
+            fills the empty table through the given connection and returns its row count.
+        reuse_unchanged (bool, optional): Keep tables whose recorded hash matches. Default is True.
+
+    Returns:
+        Dict[str, bool]: Table name -> whether it was reloaded.
+    """
+    reloaded = {}
+    for table_name, (source, content_hash, load) in sources.items():
+        with db_engine.begin() as conn:
+            loaded_hash = conn.execute(
+                text("SELECT content_hash FROM data_sources WHERE table_name = :table_name"),
+                {"table_name": table_name},
+            ).scalar()
+            reloaded[table_name] = not (reuse_unchanged and loaded_hash == content_hash)
+            if not reloaded[table_name]:
+                continue
+            # Recreate rather than DELETE: dropping the table drops its triggers too, so the load
+            # pays for no per-row trigger (callers resync anything those triggers maintained)
+            conn.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+            conn.execute(text(TABLE_SCHEMAS[table_name]))
+            for ddl in INDEX_SCHEMAS:
+                conn.execute(text(ddl))
+            row_count = load(conn)
+            conn.execute(
+                text("""
+                    INSERT OR REPLACE INTO data_sources (table_name, source, content_hash, row_count, loaded_at)
+                    VALUES (:table_name, :source, :content_hash, :row_count, :loaded_at)
+                """),
+                {"table_name": table_name, "source": source, "content_hash": content_hash,
+                 "row_count": row_count, "loaded_at": datetime.now().isoformat()},
+            )
+    return reloaded
+
+
 # === REVIEW: init_database ===
 # Purpose: Full database setup - creates all tables and seeds initial data.
-# Steps: (1) Creates empty 'transactions' table for stock orders and sales
-#   (2) Loads quote_requests.csv (400 records) into 'quote_requests' table
-#   (3) Loads quotes.csv (108 records) into 'quotes' table with metadata extraction
-#   (4) Generates random inventory subset via generate_sample_inventory()
+# Steps: (1) Recreates the run-state tables from TABLE_SCHEMAS (empty 'transactions' table included);
+#       a database at an older schema version is rebuilt from scratch
+#   (2) Loads quote_requests.csv (400 records) into 'quote_requests' table, unless unchanged
+#   (3) Loads quotes.csv (108 records) into 'quotes' table with metadata extraction, unless unchanged
+#   (4) Generates random inventory subset via generate_sample_inventory(), unless unchanged
 #   (5) Seeds initial cash balance of $50,000 as a sales transaction
 #   (6) Records initial stock orders for each inventory item
-# Used by: run_test_scenarios() at startup (must pass db_engine argument).
+#   (7) Builds the materialized stock and cash ledgers via rebuild_ledgers()
+#   (8) Seeds the pricing store with catalog prices and DISCOUNT_TIERS via seed_pricing()
+# Used by: agent_team.run_test_scenarios() at startup (passes the shared db_engine).
 # Returns: The initialized SQLAlchemy engine.
 # Agent usage: Not an agent tool - one-time initialization at program start.
-# NOTE: run_test_scenarios() has a bug on line 616 - calls init_database() without db_engine param.
-def init_database(db_engine: Engine, seed: int = 137) -> Engine:
+def init_database(
+    db_engine: Engine,
+    seed: int = 137,
+    quote_requests_path: str = "quote_requests.csv",
+    quotes_path: str = "quotes.csv",
+    reuse_unchanged: bool = True,
+) -> Engine:
     """
     Set up the Munder Difflin database with all required tables and initial records.
 
     This function performs the following tasks:
-    - Creates the 'transactions' table for logging stock orders and sales
+    - Recreates the run-state tables and indexes from the explicit schema, including the 'transactions' table
     - Loads customer inquiries from 'quote_requests.csv' into a 'quote_requests' table
     - Loads previous quotes from 'quotes.csv' into a 'quotes' table, extracting useful metadata
     - Generates a random subset of paper inventory using `generate_sample_inventory`
     - Inserts initial financial records including available cash and starting stock levels
+    - Materializes stock and cash balances and checkpoints from those records
+    - Seeds the pricing store with the catalog prices and discount tiers
+
+    The quote_requests, quotes and inventory tables are kept from the previous run when their
+    source is unchanged (see load_data_sources).
 
     Args:
         db_engine (Engine): A SQLAlchemy engine connected to the SQLite database.
         seed (int, optional): A random seed used to control reproducibility of inventory stock levels.
                               Default is 137.
+        quote_requests_path (str, optional): CSV of customer inquiries. Default is "quote_requests.csv".
+        quotes_path (str, optional): CSV of previous quotes. Default is "quotes.csv".
+        reuse_unchanged (bool, optional): Keep seed tables whose source is unchanged. Default is True;
+                                          False reloads everything.
 
     Returns:
         Engine: The same SQLAlchemy engine, after initializing all necessary tables and records.
@@ -173,249 +1081,1060 @@ def init_database(db_engine: Engine, seed: int = 137) -> Engine:
     """
     try:
         # ----------------------------
-        # 1. Create an empty 'transactions' table schema
+        # 1. Recreate the run-state tables (including an empty 'transactions' table) and indexes
         # ----------------------------
-        transactions_schema = pd.DataFrame({
-            "id": [],
-            "item_name": [],
-            "transaction_type": [],  # 'stock_orders' or 'sales'
-            "units": [],             # Quantity involved
-            "price": [],             # Total price for the transaction
-            "transaction_date": [],  # ISO-formatted date
-        })
-        transactions_schema.to_sql("transactions", db_engine, if_exists="replace", index=False)
+        with db_engine.connect() as conn:
+            version = conn.execute(text("PRAGMA user_version")).scalar()
+        if reuse_unchanged and version == SCHEMA_VERSION:
+            drop_schema(db_engine, [table_name for table_name in TABLE_SCHEMAS if table_name not in KEPT_TABLES])
+        else:
+            drop_schema(db_engine)
+        create_schema(db_engine)
 
         # Set a consistent starting date
         initial_date = datetime(2025, 1, 1).isoformat()
 
         # ----------------------------
-        # 2. Load and initialize 'quote_requests' table
+        # 2-4. Load 'quote_requests', 'quotes' and 'inventory' where their source changed
         # ----------------------------
-        quote_requests_df = pd.read_csv("quote_requests.csv")
-        quote_requests_df["id"] = range(1, len(quote_requests_df) + 1)
-        quote_requests_df.to_sql("quote_requests", db_engine, if_exists="replace", index=False)
+        inventory_inputs = json.dumps({"paper_supplies": paper_supplies, "seed": seed}, sort_keys=True)
+        reloaded = load_data_sources(db_engine, {
+            "quote_requests": (
+                quote_requests_path,
+                file_content_hash(quote_requests_path),
+                lambda conn: _load_quote_requests(conn, quote_requests_path),
+            ),
+            "quotes": (
+                quotes_path,
+                file_content_hash(quotes_path),
+                lambda conn: _load_quotes(conn, quotes_path, initial_date),
+            ),
+            "inventory": (
+                "generate_sample_inventory",
+                hashlib.sha256(inventory_inputs.encode("utf-8")).hexdigest(),
+                lambda conn: _load_inventory(conn, seed),
+            ),
+        }, reuse_unchanged=reuse_unchanged)
+        if reloaded["quote_requests"] or reloaded["quotes"]:
+            # The reload bypassed the search triggers; rebuild the search index in one pass
+            with db_engine.begin() as conn:
+                conn.execute(text("DROP TABLE IF EXISTS quotes_fts"))
+                _create_quote_search(conn)
+        inventory_df = pd.read_sql("SELECT * FROM inventory ORDER BY rowid", db_engine)
 
-        # ----------------------------
-        # 3. Load and transform 'quotes' table
-        # ----------------------------
-        quotes_df = pd.read_csv("quotes.csv")
-        quotes_df["request_id"] = range(1, len(quotes_df) + 1)
-        quotes_df["order_date"] = initial_date
+        # Seed initial transactions
+        initial_transactions = []
 
-        # Unpack metadata fields (job_type, order_size, event_type) if present
-        if "request_metadata" in quotes_df.columns:
-            quotes_df["request_metadata"] = quotes_df["request_metadata"].apply(
-                lambda x: ast.literal_eval(x) if isinstance(x, str) else x
+        # Add a starting cash balance via a dummy sales transaction
+        initial_transactions.append({
+            "item_name": None,
+            "transaction_type": "sales",
+            "units": None,
+            "price": 50000.0,
+            "transaction_date": initial_date,
+            "transaction_day": _day_number(initial_date),
+        })
+
+        # Add one stock order transaction per inventory item
+        for _, item in inventory_df.iterrows():
+            initial_transactions.append({
+                "item_name": item["item_name"],
+                "transaction_type": "stock_orders",
+                "units": item["current_stock"],
+                "price": item["current_stock"] * item["unit_price"],
+                "transaction_date": initial_date,
+                "transaction_day": _day_number(initial_date),
+            })
+
+        # Commit transactions to database
+        pd.DataFrame(initial_transactions).to_sql("transactions", db_engine, if_exists="append", index=False)
+
+        # Materialize stock and cash balances and checkpoints from the seeded transactions
+        rebuild_ledgers(db_engine)
+
+        # Price every catalog item at its list price and apply DISCOUNT_TIERS from the start
+        with db_engine.begin() as conn:
+            seed_pricing(conn)
+        # A full rebuild restarts pricing_version; forget pricing compiled from the old tables
+        with _pricing_cache_lock:
+            _pricing_cache["key"] = None
+
+        return db_engine
+
+    except Exception as e:
+        print(f"Error initializing database: {e}")
+        raise
+
+# === REVIEW: stock ledger ===
+# Purpose: Keeps stock and sales queries from re-aggregating the whole 'transactions' table.
+#   - stock_balances: running units, units sold and sales revenue per item over ALL transactions,
+#     plus the latest transaction_day seen for that item. Any as-of date on or after it reads
+#     the balance directly.
+#   - stock_checkpoints: daily snapshots, the same totals per item counting every transaction
+#     on or before checkpoint_day, one per item and transaction_day. An older as-of date reads
+#     the nearest snapshot on or before it; only transactions after that snapshot are replayed,
+#     and with daily snapshots there are none.
+# All dates are day numbers (see _day_number): the public helpers convert their as-of date once,
+#   so a timestamp and a plain date on the same day compare equal.
+# Both tables are updated inside the same database transaction as the insert in create_transaction().
+#   A new day's snapshot is the previous snapshot plus that day's transactions. A back-dated
+#   transaction only touches its own item's snapshots from its date on, so replays stay exact.
+
+STOCK_DELTA_SQL = """
+    CASE
+        WHEN transaction_type = 'stock_orders' THEN units
+        WHEN transaction_type = 'sales' THEN -units
+        ELSE 0
+    END
+"""
+SALES_UNITS_SQL = "CASE WHEN transaction_type = 'sales' THEN units ELSE 0 END"
+SALES_REVENUE_SQL = "CASE WHEN transaction_type = 'sales' THEN price ELSE 0 END"
+
+# Per-item totals as of :as_of_day in 'stock_as_of': one row per anchor (balance or checkpoint)
+# plus one per replayed tail. Items are 'stale' when they have transactions after :as_of_day.
+# {item_filter} restricts the items considered, e.g. "AND b.item_name = :item_name".
+STOCK_AS_OF_CTE = """
+    stale_items AS (
+        SELECT
+            b.item_name,
+            (SELECT MAX(c.checkpoint_day) FROM stock_checkpoints c
+             WHERE c.item_name = b.item_name AND c.checkpoint_day <= :as_of_day) AS checkpoint_day
+        FROM stock_balances b
+        WHERE b.last_transaction_day > :as_of_day {item_filter}
+    ),
+    stock_as_of AS (
+        SELECT b.item_name, b.units, b.sales_units, b.sales_revenue
+        FROM stock_balances b
+        WHERE b.last_transaction_day <= :as_of_day {item_filter}
+        UNION ALL
+        SELECT c.item_name, c.units, c.sales_units, c.sales_revenue
+        FROM stale_items s
+        JOIN stock_checkpoints c ON c.item_name = s.item_name AND c.checkpoint_day = s.checkpoint_day
+        UNION ALL
+        -- CROSS JOIN keeps stale_items as the outer loop, so each tail is an index range scan
+        SELECT
+            t.item_name,
+            SUM(""" + STOCK_DELTA_SQL + """),
+            SUM(""" + SALES_UNITS_SQL + """),
+            SUM(""" + SALES_REVENUE_SQL + """)
+        FROM stale_items s
+        CROSS JOIN transactions t
+        WHERE t.item_name = s.item_name
+        AND t.transaction_day > COALESCE(s.checkpoint_day, """ + str(NO_DAY) + """)
+        AND t.transaction_day <= :as_of_day
+        GROUP BY t.item_name
+    )
+"""
+
+
+def rebuild_stock_ledger(db_engine: Engine) -> None:
+    """
+    (Re)create the 'stock_balances' and 'stock_checkpoints' tables from the 'transactions' table.
+
+    Called by init_database() after seeding and by migrate_database(), and usable on any
+    existing database whose ledger tables are suspected to be out of sync.
+
+    Args:
+        db_engine (Engine): A SQLAlchemy engine connected to the SQLite database.
+    """
+    with db_engine.begin() as conn:
+        _rebuild_stock_ledger(conn)
+
+
+def _rebuild_stock_ledger(conn) -> None:
+    """Drop, recreate and refill the stock ledger tables on an open connection."""
+    for table_name in ("stock_balances", "stock_checkpoints"):
+        conn.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+        conn.execute(text(TABLE_SCHEMAS[table_name]))
+    conn.execute(text(f"""
+        INSERT INTO stock_balances (item_name, units, sales_units, sales_revenue, last_transaction_day)
+        SELECT
+            item_name,
+            COALESCE(SUM({STOCK_DELTA_SQL}), 0),
+            COALESCE(SUM({SALES_UNITS_SQL}), 0),
+            COALESCE(SUM({SALES_REVENUE_SQL}), 0.0),
+            MAX(transaction_day)
+        FROM transactions
+        WHERE item_name IS NOT NULL
+        GROUP BY item_name
+    """))
+    # One snapshot per item and transaction_day: running totals over the per-day sums
+    conn.execute(text(f"""
+        INSERT INTO stock_checkpoints (item_name, checkpoint_day, units, sales_units, sales_revenue)
+        SELECT
+            item_name,
+            transaction_day,
+            SUM(COALESCE(SUM({STOCK_DELTA_SQL}), 0)) OVER running,
+            SUM(COALESCE(SUM({SALES_UNITS_SQL}), 0)) OVER running,
+            SUM(COALESCE(SUM({SALES_REVENUE_SQL}), 0.0)) OVER running
+        FROM transactions
+        WHERE item_name IS NOT NULL
+        GROUP BY item_name, transaction_day
+        WINDOW running AS (PARTITION BY item_name ORDER BY transaction_day)
+    """))
+
+
+def _apply_to_stock_ledger(conn, transactions: List[Dict]) -> None:
+    """Fold newly inserted transactions into the stock ledger, using the caller's open connection.
+
+    Args:
+        conn: SQLAlchemy connection inside the transaction that inserted the rows.
+        transactions: Rows as inserted, each with 'item_name', 'transaction_type', 'units',
+            'price' and 'transaction_day'. Rows without an item or units are skipped.
+    """
+    params = []
+    for row in transactions:
+        if row["item_name"] is None or row["units"] is None:
+            continue
+        is_sale = row["transaction_type"] == "sales"
+        params.append({
+            "item_name": row["item_name"],
+            "delta": -row["units"] if is_sale else row["units"],
+            "sales_units": row["units"] if is_sale else 0,
+            "sales_revenue": (row["price"] or 0.0) if is_sale else 0.0,
+            "day": row["transaction_day"],
+        })
+    if not params:
+        return
+
+    conn.execute(text("""
+        INSERT INTO stock_balances (item_name, units, sales_units, sales_revenue, last_transaction_day)
+        VALUES (:item_name, :delta, :sales_units, :sales_revenue, :day)
+        ON CONFLICT(item_name) DO UPDATE SET
+            units = units + excluded.units,
+            sales_units = sales_units + excluded.sales_units,
+            sales_revenue = sales_revenue + excluded.sales_revenue,
+            last_transaction_day = MAX(last_transaction_day, excluded.last_transaction_day)
+    """), params)
+
+    # Existing snapshots of the item from the row's date on include it; for a row on the latest
+    # date that is at most the same day's snapshot
+    conn.execute(text("""
+        UPDATE stock_checkpoints SET
+            units = units + :delta,
+            sales_units = sales_units + :sales_units,
+            sales_revenue = sales_revenue + :sales_revenue
+        WHERE item_name = :item_name AND checkpoint_day >= :day
+    """), params)
+
+    # A day without a snapshot yet gets one: the previous snapshot plus that day's transactions
+    days = sorted({(p["item_name"], p["day"]) for p in params})
+    conn.execute(text(f"""
+        WITH previous AS (
+            SELECT checkpoint_day, units, sales_units, sales_revenue
+            FROM stock_checkpoints
+            WHERE item_name = :item_name AND checkpoint_day < :day
+            ORDER BY checkpoint_day DESC
+            LIMIT 1
+        )
+        INSERT OR IGNORE INTO stock_checkpoints (item_name, checkpoint_day, units, sales_units, sales_revenue)
+        SELECT
+            :item_name,
+            :day,
+            COALESCE((SELECT units FROM previous), 0) + COALESCE(SUM({STOCK_DELTA_SQL}), 0),
+            COALESCE((SELECT sales_units FROM previous), 0) + COALESCE(SUM({SALES_UNITS_SQL}), 0),
+            COALESCE((SELECT sales_revenue FROM previous), 0.0) + COALESCE(SUM({SALES_REVENUE_SQL}), 0.0)
+        FROM transactions
+        WHERE item_name = :item_name
+        AND transaction_day > COALESCE((SELECT checkpoint_day FROM previous), {NO_DAY})
+        AND transaction_day <= :day
+    """), [{"item_name": item_name, "day": day} for item_name, day in days])
+
+# === REVIEW: cash ledger ===
+# Purpose: Same idea as the stock ledger, for get_cash_balance(): a single running 'cash_balance'
+#   row (all sales minus all stock orders, with the latest transaction_day seen) and
+#   'cash_checkpoints' holding the daily snapshots: the balance over every transaction on or
+#   before checkpoint_day, one per transaction_day, maintained as in the stock ledger.
+# An as-of query reads the newest anchor on or before the day and sums only the transactions
+#   after it, from the (transaction_type, transaction_day, price) index. Memory use is one row.
+
+# Cash as of :as_of_day, as a one-row 'cash_as_of' table with a 'cash_balance' column.
+CASH_AS_OF_CTE = """
+    cash_anchors AS (
+        SELECT last_transaction_day AS anchor_day, balance
+        FROM cash_balance
+        WHERE last_transaction_day <= :as_of_day
+        UNION ALL
+        SELECT * FROM (
+            SELECT checkpoint_day, balance FROM cash_checkpoints
+            WHERE checkpoint_day <= :as_of_day
+            ORDER BY checkpoint_day DESC LIMIT 1
+        )
+    ),
+    cash_as_of AS (
+        SELECT
+            COALESCE(a.balance, 0.0) + COALESCE((
+                SELECT SUM(CASE WHEN transaction_type = 'sales' THEN price ELSE -price END)
+                FROM transactions
+                WHERE transaction_type IN ('sales', 'stock_orders')
+                AND transaction_day > COALESCE(a.anchor_day, """ + str(NO_DAY) + """)
+                AND transaction_day <= :as_of_day
+            ), 0.0) AS cash_balance
+        FROM (SELECT 1) AS one
+        LEFT JOIN (SELECT * FROM cash_anchors ORDER BY anchor_day DESC LIMIT 1) a ON 1 = 1
+    )
+"""
+
+
+def rebuild_cash_ledger(db_engine: Engine) -> None:
+    """
+    (Re)create the 'cash_balance' and 'cash_checkpoints' tables from the 'transactions' table.
+
+    Args:
+        db_engine (Engine): A SQLAlchemy engine connected to the SQLite database.
+    """
+    with db_engine.begin() as conn:
+        _rebuild_cash_ledger(conn)
+
+
+def rebuild_ledgers(db_engine: Engine) -> None:
+    """
+    Rebuild both the stock and the cash ledger in one transaction.
+
+    Args:
+        db_engine (Engine): A SQLAlchemy engine connected to the SQLite database.
+    """
+    with db_engine.begin() as conn:
+        _rebuild_stock_ledger(conn)
+        _rebuild_cash_ledger(conn)
+
+
+def _rebuild_cash_ledger(conn) -> None:
+    """Drop, recreate and refill the cash ledger tables on an open connection."""
+    for table_name in ("cash_balance", "cash_checkpoints"):
+        conn.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+        conn.execute(text(TABLE_SCHEMAS[table_name]))
+    conn.execute(text("""
+        INSERT INTO cash_balance (id, balance, last_transaction_day)
+        SELECT 1, balance, last_transaction_day
+        FROM (
+            SELECT
+                COALESCE(SUM(CASE WHEN transaction_type = 'sales' THEN price ELSE -price END), 0.0) AS balance,
+                MAX(transaction_day) AS last_transaction_day
+            FROM transactions
+            WHERE transaction_type IN ('sales', 'stock_orders')
+        )
+        WHERE last_transaction_day IS NOT NULL
+    """))
+    # Same daily snapshots as the stock ledger, over all transactions
+    conn.execute(text("""
+        INSERT INTO cash_checkpoints (checkpoint_day, balance)
+        SELECT
+            transaction_day,
+            SUM(COALESCE(SUM(CASE WHEN transaction_type = 'sales' THEN price ELSE -price END), 0.0))
+                OVER (ORDER BY transaction_day)
+        FROM transactions
+        WHERE transaction_type IN ('sales', 'stock_orders')
+        GROUP BY transaction_day
+    """))
+
+
+def _apply_to_cash_ledger(conn, transactions: List[Dict]) -> None:
+    """Fold newly inserted transactions into the cash ledger, using the caller's open connection.
+
+    Args:
+        conn: SQLAlchemy connection inside the transaction that inserted the rows.
+        transactions: Rows as inserted, each with 'transaction_type', 'price' and
+            'transaction_day'. Rows without a price are skipped.
+    """
+    params = [
+        {
+            "delta": row["price"] if row["transaction_type"] == "sales" else -row["price"],
+            "day": row["transaction_day"],
+        }
+        for row in transactions
+        if row["price"] is not None
+    ]
+    if not params:
+        return
+
+    conn.execute(text("""
+        INSERT INTO cash_balance (id, balance, last_transaction_day)
+        VALUES (1, :delta, :day)
+        ON CONFLICT(id) DO UPDATE SET
+            balance = balance + excluded.balance,
+            last_transaction_day = MAX(last_transaction_day, excluded.last_transaction_day)
+    """), params)
+
+    # Existing snapshots from the row's date on include it
+    conn.execute(text("""
+        UPDATE cash_checkpoints SET balance = balance + :delta WHERE checkpoint_day >= :day
+    """), params)
+
+    # A day without a snapshot yet gets one: the previous snapshot plus that day's transactions
+    conn.execute(text(f"""
+        WITH previous AS (
+            SELECT checkpoint_day, balance FROM cash_checkpoints
+            WHERE checkpoint_day < :day
+            ORDER BY checkpoint_day DESC
+            LIMIT 1
+        )
+        INSERT OR IGNORE INTO cash_checkpoints (checkpoint_day, balance)
+        SELECT
+            :day,
+            COALESCE((SELECT balance FROM previous), 0.0)
+                + COALESCE(SUM(CASE WHEN transaction_type = 'sales' THEN price ELSE -price END), 0.0)
+        FROM transactions
+        WHERE transaction_type IN ('sales', 'stock_orders')
+        AND transaction_day > COALESCE((SELECT checkpoint_day FROM previous), {NO_DAY})
+        AND transaction_day <= :day
+    """), [{"day": day} for day in sorted({p["day"] for p in params})])
+
+
+class InsufficientBalanceError(ValueError):
+    """A checked transaction was rejected; `available` is the stock units or cash it was checked against."""
+
+    def __init__(self, available: float):
+        super().__init__(f"Insufficient balance: {available} available")
+        self.available = available
+
+
+# === REVIEW: create_transaction ===
+# Purpose: Records a single transaction (stock purchase or customer sale) in the database.
+# Parameters: item_name, transaction_type ('stock_orders' or 'sales'), quantity, price, date.
+# Returns: Integer ID of the newly created transaction row.
+# Validation: Raises ValueError if transaction_type is not 'stock_orders' or 'sales'.
+# Side effects: Modifies the 'transactions' table and, in the same DB transaction,
+#   the stock and cash ledger tables.
+# Implementation: A one-row call to create_transactions(), or with checked=True to
+#   create_checked_transactions(), raising InsufficientBalanceError if stock or cash is short.
+# Agent usage: CRITICAL - used by TWO agent tools (both with checked=True):
+#   - Inventory Agent's reorder_stock tool (transaction_type='stock_orders')
+#   - Sales Agent's finalize_sale tool (transaction_type='sales')
+# Rubric: B8 requires this function to be used in at least one tool definition.
+def create_transaction(
+    item_name: str,
+    transaction_type: str,
+    quantity: int,
+    price: float,
+    date: Union[str, datetime],
+    checked: bool = False,
+    hold_id: str = None,
+) -> int:
+    """
+    This function records a transaction of type 'stock_orders' or 'sales' with a specified
+    item name, quantity, total price, and transaction date into the 'transactions' table of the database.
+
+    Args:
+        item_name (str): The name of the item involved in the transaction.
+        transaction_type (str): Either 'stock_orders' or 'sales'.
+        quantity (int): Number of units involved in the transaction.
+        price (float): Total price of the transaction.
+        date (str or datetime): Date of the transaction in ISO 8601 format.
+        checked (bool, optional): Only record a sale if the available stock covers it, or a stock
+            order if the cash does, checking and writing atomically (see create_checked_transactions).
+            Default is False.
+        hold_id (str, optional): With `checked`, a hold from reserve_quote() this sale uses: its
+            units count as available, and its line for the item is marked sold.
+
+    Returns:
+        int: The ID of the newly inserted transaction.
+
+    Raises:
+        ValueError: If `transaction_type` is not 'stock_orders' or 'sales'.
+        InsufficientBalanceError: If `checked` and the stock or cash does not cover the transaction.
+        Exception: For other database or execution errors.
+    """
+    transaction = {
+        "item_name": item_name,
+        "transaction_type": transaction_type,
+        "quantity": quantity,
+        "price": price,
+        "date": date,
+    }
+    if not checked:
+        return create_transactions([transaction])[0]
+    [result] = create_checked_transactions([transaction], hold_id)
+    if result["transaction_id"] is None:
+        raise InsufficientBalanceError(result["available"])
+    return result["transaction_id"]
+
+
+
+# === REVIEW: create_transactions ===
+# Purpose: Batch version of create_transaction() for multi-line orders.
+# Writes all rows with multi-row INSERT ... RETURNING id statements (INSERT_BATCH_SIZE rows each)
+#   and folds them into the stock and cash ledgers, all inside ONE database transaction:
+#   either every row is recorded or none is.
+# Returns: List of transaction IDs in the same order as the input rows.
+# Agent usage: Used by the finalize_sale_items and reorder_stock_items tools.
+INSERT_BATCH_SIZE = 100
+
+
+@traced
+def create_transactions(transactions: List[Dict]) -> List[int]:
+    """
+    Record several 'stock_orders' or 'sales' transactions in a single database transaction.
+
+    Args:
+        transactions (List[Dict]): One dict per transaction with the same fields as the
+            create_transaction() arguments: 'item_name', 'transaction_type', 'quantity',
+            'price' and 'date' (str or datetime).
+
+    Returns:
+        List[int]: The IDs of the newly inserted transactions, in input order.
+
+    Raises:
+        ValueError: If any `transaction_type` is not 'stock_orders' or 'sales'.
+        Exception: For other database or execution errors.
+    """
+    try:
+        rows = _transaction_rows(transactions)
+        return run_write_transaction(lambda conn: _insert_transactions(conn, rows))
+
+    except Exception as e:
+        print(f"Error creating transaction: {e}")
+        raise
+
+
+# === REVIEW: request attribution ===
+# Purpose: Tie every transaction to the scenario request that recorded it.
+# process_requests() runs each request inside recording_request(), and _transaction_rows() stamps
+#   CURRENT_REQUEST_ID on every row, so the request_id is written in the same database
+#   transaction as the sale or stock order itself (threads that copy the context, such as the
+#   agents' parallel tool calls, inherit it). A resumed run uses get_recorded_request_ids() to
+#   tell a request that never started from one that died after some of its writes committed.
+CURRENT_REQUEST_ID: ContextVar = ContextVar("current_request_id", default=None)
+
+
+@contextmanager
+def recording_request(request_id: int):
+    """Attribute the transactions written in this context (and in threads that copy it) to `request_id`."""
+    token = CURRENT_REQUEST_ID.set(request_id)
+    try:
+        yield
+    finally:
+        CURRENT_REQUEST_ID.reset(token)
+
+
+def get_recorded_request_ids() -> set:
+    """
+    Scenario requests that have at least one transaction in the database.
+
+    Returns:
+        set: The request_ids recorded by recording_request() on any transaction.
+    """
+    with db_engine.connect() as conn:
+        rows = conn.execute(text("SELECT DISTINCT request_id FROM transactions WHERE request_id IS NOT NULL"))
+        return {int(request_id) for (request_id,) in rows}
+
+
+def _transaction_rows(transactions: List[Dict]) -> List[Dict]:
+    """Validate create_transactions() input and convert it to 'transactions' table rows."""
+    request_id = CURRENT_REQUEST_ID.get()
+    rows = []
+    for transaction in transactions:
+        # Validate transaction type
+        if transaction["transaction_type"] not in {"stock_orders", "sales"}:
+            raise ValueError("Transaction type must be 'stock_orders' or 'sales'")
+
+        # Keep the date as given for display; every query goes by its day number
+        date = transaction["date"]
+        rows.append({
+            "item_name": transaction["item_name"],
+            "transaction_type": transaction["transaction_type"],
+            "units": transaction["quantity"],
+            "price": transaction["price"],
+            "transaction_date": date.isoformat() if isinstance(date, datetime) else date,
+            "transaction_day": _day_number(date),
+            "request_id": request_id,
+        })
+    return rows
+
+
+def _insert_transactions(conn: Connection, rows: List[Dict]) -> List[int]:
+    """Insert 'transactions' rows and fold them into the ledgers on `conn`; returns their IDs in order."""
+    # The returned row IDs and the materialized balances always belong together
+    transaction_ids = []
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        batch = rows[start:start + INSERT_BATCH_SIZE]
+        placeholders = ", ".join(["(?, ?, ?, ?, ?, ?, ?)"] * len(batch))
+        values = [
+            value
+            for row in batch
+            for value in (
+                row["item_name"], row["transaction_type"], row["units"], row["price"],
+                row["transaction_date"], row["transaction_day"], row["request_id"],
             )
-            quotes_df["job_type"] = quotes_df["request_metadata"].apply(lambda x: x.get("job_type", ""))
-            quotes_df["order_size"] = quotes_df["request_metadata"].apply(lambda x: x.get("order_size", ""))
-            quotes_df["event_type"] = quotes_df["request_metadata"].apply(lambda x: x.get("event_type", ""))
+        ]
+        result = conn.exec_driver_sql(
+            "INSERT INTO transactions "
+            "(item_name, transaction_type, units, price, transaction_date, transaction_day, request_id) "
+            f"VALUES {placeholders} RETURNING id",
+            tuple(values),
+        )
+        # RETURNING order is unspecified, but rowids are assigned in VALUES order
+        transaction_ids.extend(sorted(row_id for (row_id,) in result))
+
+    _apply_to_stock_ledger(conn, rows)
+    _apply_to_cash_ledger(conn, rows)
+    return transaction_ids
+
+
+# === REVIEW: checked writes ===
+# Purpose: Check-and-commit for writes that must not overdraw stock or cash. The check (stock
+#   or cash as of the transaction date) and the insert run in ONE write transaction, so
+#   concurrent workers, in this or another process, can never both sell the same units or
+#   spend the same cash.
+# run_write_transaction() starts it with BEGIN IMMEDIATE, which takes SQLite's write lock
+#   up front. Reads inside then see the latest committed state, and no other writer can commit
+#   before this one does. A plain BEGIN would only lock at the first write, after the check.
+# Contention: a waiting BEGIN IMMEDIATE first uses the engine's busy timeout. If the database is
+#   still locked, the whole unit of work is rolled back and retried with jittered exponential
+#   backoff, up to WRITE_MAX_ATTEMPTS times. The work function must therefore only touch the
+#   database through the connection it is given.
+# Agent usage: finalize_sale, finalize_sale_items, reorder_stock, reorder_stock_items and the
+#   fast path go through create_checked_transactions() or run_write_transaction().
+WRITE_MAX_ATTEMPTS = 5
+WRITE_RETRY_BACKOFF_S = 0.05
+
+T = TypeVar("T")
+
+
+def run_write_transaction(work: Callable[[Connection], T], max_attempts: int = WRITE_MAX_ATTEMPTS) -> T:
+    """
+    Run `work(conn)` inside a BEGIN IMMEDIATE transaction and commit it, retrying on lock contention.
 
-        # Retain only relevant columns
-        quotes_df = quotes_df[[
-            "request_id",
-            "total_amount",
-            "quote_explanation",
-            "order_date",
-            "job_type",
-            "order_size",
-            "event_type"
-        ]]
-        quotes_df.to_sql("quotes", db_engine, if_exists="replace", index=False)
+    Args:
+        work (Callable[[Connection], T]): Reads and writes through the given connection only.
+            It may run several times if the database stays locked, so it must not have other side effects.
+        max_attempts (int, optional): Attempts before the "database is locked" error is raised.
+
+    Returns:
+        T: What `work` returned on the attempt that committed.
+    """
+    for attempt in range(1, max_attempts + 1):
+        with db_engine.connect() as conn:
+            try:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                result = work(conn)
+                conn.commit()
+                return result
+            except OperationalError as e:
+                conn.rollback()
+                if ("locked" not in str(e) and "busy" not in str(e)) or attempt == max_attempts:
+                    raise
+            except BaseException:
+                conn.rollback()
+                raise
+        time.sleep(WRITE_RETRY_BACKOFF_S * 2 ** (attempt - 1) * (0.5 + np.random.random()))
+
+
+@traced
+def create_checked_transactions(transactions: List[Dict], hold_id: str = None) -> List[Dict]:
+    """
+    Record transactions only when stock (for sales) or cash (for stock orders) covers them.
+
+    Each line is checked against the balance as of its own date, minus the lines accepted before
+    it in the same call; for sales, minus the units held by active reservations too, except
+    those of `hold_id`. Stock orders do not add to the stock available to later lines, and sales
+    do not add to the cash. Checks and inserts run in one write transaction (see
+    run_write_transaction), so concurrent callers cannot overdraw stock or cash.
+
+    Args:
+        transactions (List[Dict]): Same fields as for create_transactions().
+        hold_id (str, optional): A hold from reserve_quote() that these sales use. Its units are
+            available to them, and its lines for the items sold are marked 'sold'.
+
+    Returns:
+        List[Dict]: One result per input line, in order, with 'transaction_id' (None if the line
+            was rejected) and 'available' (the stock units or cash the line was checked against).
+
+    Raises:
+        ValueError: If any `transaction_type` is not 'stock_orders' or 'sales', or any line lacks
+            an item, a non-negative quantity or a non-negative price to check.
+    """
+    rows = _transaction_rows(transactions)
+    # A missing quantity or price cannot be checked against a balance; reject the call up front
+    for row in rows:
+        if row["item_name"] is None:
+            raise ValueError("Checked transactions need an item_name")
+        for field in ("units", "price"):
+            if row[field] is None or row[field] < 0:
+                raise ValueError(f"Checked transactions need a non-negative {field}, got {row[field]!r}")
+
+    def check_and_insert(conn: Connection) -> List[Dict]:
+        stock_by_day: Dict[int, Dict[str, int]] = {}
+        cash_by_day: Dict[int, float] = {}
+        units_sold = Counter()
+        cash_spent = 0.0
+        results = []
+        accepted = []
+        for row in rows:
+            day = row["transaction_day"]
+            if row["transaction_type"] == "sales":
+                if day not in stock_by_day:
+                    stock_by_day[day] = _available_as_of(conn, day, exclude_hold=hold_id)
+                available = int(stock_by_day[day].get(row["item_name"], 0)) - units_sold[row["item_name"]]
+                ok = row["units"] <= available
+                if ok:
+                    units_sold[row["item_name"]] += row["units"]
+            else:
+                if day not in cash_by_day:
+                    cash_by_day[day] = _cash_as_of(conn, day)
+                available = cash_by_day[day] - cash_spent
+                ok = row["price"] <= available
+                if ok:
+                    cash_spent += row["price"]
+            results.append({"transaction_id": None, "available": available})
+            if ok:
+                accepted.append((results[-1], row))
+
+        transaction_ids = _insert_transactions(conn, [row for _, row in accepted]) if accepted else []
+        for (result, _), transaction_id in zip(accepted, transaction_ids):
+            result["transaction_id"] = transaction_id
+        sold_items = {row["item_name"] for _, row in accepted if row["transaction_type"] == "sales"}
+        if hold_id is not None and sold_items:
+            conn.execute(
+                text("""
+                    UPDATE reservations SET status = 'sold'
+                    WHERE hold_id = :hold_id AND item_name = :item_name AND status = 'active'
+                """),
+                [{"hold_id": hold_id, "item_name": item_name} for item_name in sorted(sold_items)],
+            )
+        return results
+
+    return run_write_transaction(check_and_insert)
+
+
+# === REVIEW: reservations ===
+# Purpose: Hold quoted stock until the sale, so a quote -> sale path needs no second stock check.
+# reserve_quote() checks availability, prices the lines that fit with build_quote() and records
+#   them as one hold in 'reservations', all in one write transaction. sell_reservation()
+#   later turns the hold into sales transactions at the quoted prices.
+# Availability everywhere stock is read for a sale (create_checked_transactions, the fast path,
+#   get_all_inventory, get_stock_level) is stock as of the date minus the units of active holds.
+#   A hold counts on every date up to its expiry, earlier dates included, so a back-dated sale
+#   cannot take units a later quote already holds.
+# Expiry follows the simulated calendar: a hold quoted on day D counts through day
+#   D + RESERVATION_TTL_DAYS (its expires_day). Lapsed holds are ignored at once and marked
+#   'expired' by the next reserve_quote(). Selling an expired hold re-checks its lines against
+#   the remaining stock instead of failing outright.
+# Scope: holds made inside reservation_scope() and not sold when it exits are released, so a
+#   request that quoted but never sold (or failed) gives its stock back at once.
+RESERVATION_TTL_DAYS = 7
+
+# Units held per item by holds still in force on :as_of_day, leaving out hold :exclude_hold
+HELD_UNITS_SQL = """
+    SELECT item_name, SUM(units) AS units
+    FROM reservations
+    WHERE status = 'active' AND expires_day >= :as_of_day AND hold_id <> :exclude_hold
+    GROUP BY item_name
+"""
+
+# Hold IDs made inside the innermost reservation_scope() of this context (None outside one)
+CURRENT_HOLDS: ContextVar = ContextVar("current_holds", default=None)
+
+
+def get_held_units(as_of_date: Union[str, datetime], hold_id: str = None) -> Dict[str, int]:
+    """
+    Units held by active reservations as of a date, per item.
+
+    Args:
+        as_of_date (str or datetime): Holds that expired before this date are not counted.
+        hold_id (str, optional): A hold to leave out, e.g. the one a sale is about to use.
+
+    Returns:
+        Dict[str, int]: Item names mapped to held units; items without holds are left out.
+    """
+    with db_engine.connect() as conn:
+        return _held_units(conn, _day_number(as_of_date), hold_id)
+
+
+def _held_units(conn: Connection, as_of_day: int, exclude_hold: str = None) -> Dict[str, int]:
+    rows = conn.execute(text(HELD_UNITS_SQL), {"as_of_day": as_of_day, "exclude_hold": exclude_hold or ""})
+    return {item_name: int(units) for item_name, units in rows}
+
+
+def _available_as_of(conn: Connection, as_of_day: int, exclude_hold: str = None) -> Dict[str, int]:
+    """Stock as of day number `as_of_day` minus active holds, per item (items with nothing available left out)."""
+    stock = _inventory_as_of(conn, as_of_day)
+    for item_name, units in _held_units(conn, as_of_day, exclude_hold).items():
+        if item_name in stock:
+            stock[item_name] -= units
+    return {item_name: units for item_name, units in stock.items() if units > 0}
+
+
+@contextmanager
+def reservation_scope() -> Iterator[List[str]]:
+    """
+    Release, on exit, the holds made inside the block that were not sold.
+
+    The holds are released on the error path too. Scopes nest; each releases only its own holds.
 
-        # ----------------------------
-        # 4. Generate inventory and seed stock
-        # ----------------------------
-        inventory_df = generate_sample_inventory(paper_supplies, seed=seed)
+    Yields:
+        List[str]: The IDs of the holds made so far inside the block.
+    """
+    holds: List[str] = []
+    token = CURRENT_HOLDS.set(holds)
+    try:
+        yield holds
+    finally:
+        CURRENT_HOLDS.reset(token)
+        for hold_id in holds:
+            release_reservation(hold_id)
 
-        # Seed initial transactions
-        initial_transactions = []
 
-        # Add a starting cash balance via a dummy sales transaction
-        initial_transactions.append({
-            "item_name": None,
-            "transaction_type": "sales",
-            "units": None,
-            "price": 50000.0,
-            "transaction_date": initial_date,
-        })
+@traced
+def reserve_quote(items: List[Dict], quote_date: str, ttl_days: int = RESERVATION_TTL_DAYS) -> Dict:
+    """
+    Quote the items that are available and hold their stock through `ttl_days` after `quote_date`.
 
-        # Add one stock order transaction per inventory item
-        for _, item in inventory_df.iterrows():
-            initial_transactions.append({
-                "item_name": item["item_name"],
-                "transaction_type": "stock_orders",
-                "units": item["current_stock"],
-                "price": item["current_stock"] * item["unit_price"],
-                "transaction_date": initial_date,
-            })
+    Inside a reservation_scope() the hold is released when the scope exits, unless it was sold.
 
-        # Commit transactions to database
-        pd.DataFrame(initial_transactions).to_sql("transactions", db_engine, if_exists="append", index=False)
+    Args:
+        items (List[Dict]): Items with a catalog 'item_name' and a 'quantity'.
+        quote_date (str): ISO date the stock is checked as of.
+        ttl_days (int, optional): Days after `quote_date` the hold still counts on. Default is
+            RESERVATION_TTL_DAYS.
 
-        # Save the inventory reference table
-        inventory_df.to_sql("inventory", db_engine, if_exists="replace", index=False)
+    Returns:
+        Dict: 'hold_id' and 'expires_on' (the last ISO date the hold counts on; both None if
+            nothing could be held), 'quote' (the build_quote() result for the held items, or
+            None) and 'unavailable' (a list of (item, available units) pairs for the items that
+            could not be held).
+    """
+    quote_day = _day_number(quote_date)
 
-        return db_engine
+    def check_and_hold(conn: Connection) -> Dict:
+        conn.execute(
+            text("UPDATE reservations SET status = 'expired' WHERE status = 'active' AND expires_day < :day"),
+            {"day": quote_day},
+        )
+        stock = _available_as_of(conn, quote_day)
+        available = []
+        unavailable = []
+        for item in items:
+            on_hand = stock.get(item["item_name"], 0)
+            if on_hand >= item["quantity"]:
+                available.append(item)
+                stock[item["item_name"]] = on_hand - item["quantity"]
+            else:
+                unavailable.append((item, on_hand))
+        if not available:
+            return {"hold_id": None, "expires_on": None, "quote": None, "unavailable": unavailable}
+
+        quote = build_quote(available, quote_date, conn)
+        hold_id = uuid.uuid4().hex[:12]
+        expires_day = quote_day + ttl_days
+        conn.execute(
+            text("""
+                INSERT INTO reservations (hold_id, item_name, units, price, hold_date, expires_day)
+                VALUES (:hold_id, :item_name, :units, :price, :hold_date, :expires_day)
+            """),
+            [
+                {
+                    "hold_id": hold_id,
+                    "item_name": line["catalog_name"],
+                    "units": line["quantity"],
+                    "price": round(line["net_total"], 2),
+                    "hold_date": quote_date,
+                    "expires_day": expires_day,
+                }
+                for line in quote["lines"]
+            ],
+        )
+        expires_on = (EPOCH + timedelta(days=expires_day)).strftime("%Y-%m-%d")
+        return {"hold_id": hold_id, "expires_on": expires_on, "quote": quote, "unavailable": unavailable}
+
+    result = run_write_transaction(check_and_hold)
+    # Register only once committed: the work function may run more than once
+    scope = CURRENT_HOLDS.get()
+    if scope is not None and result["hold_id"] is not None:
+        scope.append(result["hold_id"])
+    return result
 
-    except Exception as e:
-        print(f"Error initializing database: {e}")
-        raise
 
-# === REVIEW: create_transaction ===
-# Purpose: Records a single transaction (stock purchase or customer sale) in the database.
-# Parameters: item_name, transaction_type ('stock_orders' or 'sales'), quantity, price, date.
-# Returns: Integer ID of the newly created transaction row.
-# Validation: Raises ValueError if transaction_type is not 'stock_orders' or 'sales'.
-# Side effects: Modifies the 'transactions' table in the SQLite database.
-# Agent usage: CRITICAL - used by TWO agent tools:
-#   - Inventory Agent's reorder_stock tool (transaction_type='stock_orders')
-#   - Sales Agent's finalize_sale tool (transaction_type='sales')
-# Rubric: B8 requires this function to be used in at least one tool definition.
-def create_transaction(
-    item_name: str,
-    transaction_type: str,
-    quantity: int,
-    price: float,
-    date: Union[str, datetime],
-) -> int:
+@traced
+def sell_reservation(hold_id: str, sale_date: str) -> List[Dict]:
     """
-    This function records a transaction of type 'stock_orders' or 'sales' with a specified
-    item name, quantity, total price, and transaction date into the 'transactions' table of the database.
+    Record the sales for a hold made by reserve_quote(), at the quoted prices.
+
+    Lines of an active hold are sold without another stock check. If the hold has lapsed by
+    `sale_date`, each line is sold only if the remaining stock still covers it.
 
     Args:
-        item_name (str): The name of the item involved in the transaction.
-        transaction_type (str): Either 'stock_orders' or 'sales'.
-        quantity (int): Number of units involved in the transaction.
-        price (float): Total price of the transaction.
-        date (str or datetime): Date of the transaction in ISO 8601 format.
+        hold_id (str): The hold to sell.
+        sale_date (str): ISO date of the sales transactions.
 
     Returns:
-        int: The ID of the newly inserted transaction.
+        List[Dict]: One dict per line of the hold with 'item_name', 'quantity', 'price',
+            'transaction_id' (None if not sold) and 'available' (units checked against, or None
+            for lines sold from the hold). Empty if the hold does not exist or was already sold.
 
     Raises:
-        ValueError: If `transaction_type` is not 'stock_orders' or 'sales'.
-        Exception: For other database or execution errors.
+        ValueError: If `sale_date` is before the date the hold was quoted on; the hold only
+            covers stock from that date on.
     """
-    try:
-        # Convert datetime to ISO string if necessary
-        date_str = date.isoformat() if isinstance(date, datetime) else date
+    sale_day = _day_number(sale_date)
+
+    def convert(conn: Connection) -> List[Dict]:
+        holds = conn.execute(
+            text("""
+                SELECT id, item_name, units, price, hold_date, expires_day FROM reservations
+                WHERE hold_id = :hold_id AND status IN ('active', 'expired')
+                ORDER BY id
+            """),
+            {"hold_id": hold_id},
+        ).fetchall()
+        if holds and sale_day < _day_number(holds[0].hold_date):
+            raise ValueError(f"Sale date {sale_date} is before the quote date {holds[0].hold_date} of hold {hold_id}")
+        stock = None
+        results = []
+        sales = []
+        sold_ids = []
+        for reservation_id, item_name, units, price, _, expires_day in holds:
+            result = {"item_name": item_name, "quantity": units, "price": price, "transaction_id": None, "available": None}
+            results.append(result)
+            if expires_day < sale_day:
+                if stock is None:
+                    stock = _available_as_of(conn, sale_day, exclude_hold=hold_id)
+                result["available"] = stock.get(item_name, 0)
+                if result["available"] < units:
+                    continue
+                stock[item_name] -= units
+            sales.append(result)
+            sold_ids.append(reservation_id)
+
+        transaction_ids = _insert_transactions(conn, _transaction_rows([
+            {"item_name": sale["item_name"], "transaction_type": "sales", "quantity": sale["quantity"],
+             "price": sale["price"], "date": sale_date}
+            for sale in sales
+        ])) if sales else []
+        for sale, transaction_id in zip(sales, transaction_ids):
+            sale["transaction_id"] = transaction_id
+        conn.execute(
+            text("UPDATE reservations SET status = 'expired' WHERE hold_id = :hold_id AND status = 'active'"),
+            {"hold_id": hold_id},
+        )
+        if sold_ids:
+            conn.execute(
+                text("UPDATE reservations SET status = 'sold' WHERE id = :id"),
+                [{"id": reservation_id} for reservation_id in sold_ids],
+            )
+        return results
 
-        # Validate transaction type
-        if transaction_type not in {"stock_orders", "sales"}:
-            raise ValueError("Transaction type must be 'stock_orders' or 'sales'")
+    return run_write_transaction(convert)
 
-        # Prepare transaction record as a single-row DataFrame
-        transaction = pd.DataFrame([{
-            "item_name": item_name,
-            "transaction_type": transaction_type,
-            "units": quantity,
-            "price": price,
-            "transaction_date": date_str,
-        }])
 
-        # Insert the record into the database
-        transaction.to_sql("transactions", db_engine, if_exists="append", index=False)
+def release_reservation(hold_id: str) -> int:
+    """
+    Give a hold's stock back before it expires (e.g. the customer declined the quote).
 
-        # Fetch and return the ID of the inserted row
-        result = pd.read_sql("SELECT last_insert_rowid() as id", db_engine)
-        return int(result.iloc[0]["id"])
+    Args:
+        hold_id (str): The hold to release.
 
-    except Exception as e:
-        print(f"Error creating transaction: {e}")
-        raise
+    Returns:
+        int: Number of lines released (0 if the hold was already sold, released or unknown).
+    """
+    def release(conn: Connection) -> int:
+        return conn.execute(
+            text("UPDATE reservations SET status = 'released' WHERE hold_id = :hold_id AND status = 'active'"),
+            {"hold_id": hold_id},
+        ).rowcount
+
+    return run_write_transaction(release)
 
 # === REVIEW: get_all_inventory ===
-# Purpose: Retrieves a snapshot of ALL items with positive stock as of a specific date.
-# Calculates net stock per item: SUM(stock_orders) - SUM(sales) up to as_of_date.
-# Returns: Dict[str, int] mapping item names to their current stock quantities.
-#   Only items with stock > 0 are included in the result.
+# Purpose: Retrieves a snapshot of ALL items with available stock as of a specific date.
+# Calculates net stock per item: SUM(stock_orders) - SUM(sales) up to as_of_date, read from
+#   the stock ledger (running balance, or nearest checkpoint plus the transactions after it),
+#   minus the units held by active reservations (see reservations above).
+# Returns: Dict[str, int] mapping item names to the units available for sale.
+#   Only items with available stock > 0 are included in the result.
 # Agent usage: Used by Inventory Agent's check_inventory tool to give a full stock overview.
 # Rubric: B9 requires this function to be used in at least one tool definition.
-def get_all_inventory(as_of_date: str) -> Dict[str, int]:
+@traced
+def get_all_inventory(as_of_date: str, hold_id: str = None) -> Dict[str, int]:
     """
     Retrieve a snapshot of available inventory as of a specific date.
 
     This function calculates the net quantity of each item by summing 
-    all stock orders and subtracting all sales up to and including the given date.
+    all stock orders and subtracting all sales up to and including the given date,
+    then subtracts the units held by active reservations.
 
-    Only items with positive stock are included in the result.
+    Only items with positive available stock are included in the result.
 
     Args:
         as_of_date (str): ISO-formatted date string (YYYY-MM-DD) representing the inventory cutoff.
+        hold_id (str, optional): A reservation whose held units count as available.
 
     Returns:
-        Dict[str, int]: A dictionary mapping item names to their current stock levels.
+        Dict[str, int]: A dictionary mapping item names to their available stock levels.
     """
-    # SQL query to compute stock levels per item as of the given date
-    query = """
-        SELECT
-            item_name,
-            SUM(CASE
-                WHEN transaction_type = 'stock_orders' THEN units
-                WHEN transaction_type = 'sales' THEN -units
-                ELSE 0
-            END) as stock
-        FROM transactions
-        WHERE item_name IS NOT NULL
-        AND transaction_date <= :as_of_date
+    as_of_day = _day_number(as_of_date)
+    with db_engine.connect() as conn:
+        return _available_as_of(conn, as_of_day, exclude_hold=hold_id)
+
+
+def _inventory_as_of(conn: Connection, as_of_day: int) -> Dict[str, int]:
+    """get_all_inventory() for a day number on an open connection (e.g. inside a write transaction)."""
+    # SQL query to compute stock levels per item as of the given date from the stock ledger
+    query = "WITH" + STOCK_AS_OF_CTE.format(item_filter="") + """
+        SELECT item_name, SUM(units) as stock
+        FROM stock_as_of
         GROUP BY item_name
         HAVING stock > 0
     """
 
     # Execute the query with the date parameter
-    result = pd.read_sql(query, db_engine, params={"as_of_date": as_of_date})
+    result = pd.read_sql(text(query), conn, params={"as_of_day": as_of_day})
 
     # Convert the result into a dictionary {item_name: stock}
     return dict(zip(result["item_name"], result["stock"]))
 
 # === REVIEW: get_stock_level ===
 # Purpose: Retrieves the net stock level of a SINGLE specific item as of a given date.
-# Calculates: SUM(stock_orders units) - SUM(sales units) for the item up to as_of_date.
-# Returns: Single-row DataFrame with columns 'item_name' and 'current_stock'.
+# Calculates: SUM(stock_orders units) - SUM(sales units) for the item up to as_of_date,
+#   from the stock ledger rather than the full transaction history, minus the units held by
+#   active reservations (as get_all_inventory does).
+# Returns: Single-row DataFrame with columns 'item_name', 'current_stock' (available units)
+#   and 'held' (units reserved on top of that).
 #   Returns 0 if the item has no transactions (COALESCE handles NULL case).
 # Agent usage: Used by TWO agent tools:
 #   - Inventory Agent's check_item_stock tool (to check individual item availability)
 #   - Sales Agent's finalize_sale tool (to verify stock before completing a sale)
 # Rubric: B10 requires this function to be used in at least one tool definition.
-def get_stock_level(item_name: str, as_of_date: Union[str, datetime]) -> pd.DataFrame:
+@traced
+def get_stock_level(item_name: str, as_of_date: Union[str, datetime], hold_id: str = None) -> pd.DataFrame:
     """
     Retrieve the stock level of a specific item as of a given date.
 
     This function calculates the net stock by summing all 'stock_orders' and 
-    subtracting all 'sales' transactions for the specified item up to the given date.
+    subtracting all 'sales' transactions for the specified item up to the given date,
+    then subtracts the units held by active reservations.
 
     Args:
         item_name (str): The name of the item to look up.
         as_of_date (str or datetime): The cutoff date (inclusive) for calculating stock.
+        hold_id (str, optional): A reservation whose held units count as available.
 
     Returns:
-        pd.DataFrame: A single-row DataFrame with columns 'item_name' and 'current_stock'.
+        pd.DataFrame: A single-row DataFrame with columns 'item_name', 'current_stock'
+            (units available for sale) and 'held' (units reserved by other holds).
     """
-    # Convert date to ISO string format if it's a datetime object
-    if isinstance(as_of_date, datetime):
-        as_of_date = as_of_date.isoformat()
+    # Convert the date (ISO string or datetime) to its day number once, here
+    as_of_day = _day_number(as_of_date)
 
-    # SQL query to compute net stock level for the item
-    stock_query = """
+    # SQL query to compute net stock level for the item from the stock ledger
+    stock_query = "WITH" + STOCK_AS_OF_CTE.format(item_filter="AND b.item_name = :item_name") + """
         SELECT
-            item_name,
-            COALESCE(SUM(CASE
-                WHEN transaction_type = 'stock_orders' THEN units
-                WHEN transaction_type = 'sales' THEN -units
-                ELSE 0
-            END), 0) AS current_stock
-        FROM transactions
-        WHERE item_name = :item_name
-        AND transaction_date <= :as_of_date
+            MAX(item_name) AS item_name,
+            COALESCE(SUM(units), 0) AS current_stock
+        FROM stock_as_of
     """
 
-    # Execute query and return result as a DataFrame
-    return pd.read_sql(
-        stock_query,
-        db_engine,
-        params={"item_name": item_name, "as_of_date": as_of_date},
-    )
+    # Read stock and holds on one connection, so both come from the same committed state
+    with db_engine.connect() as conn:
+        stock = pd.read_sql(
+            text(stock_query),
+            conn,
+            params={"item_name": item_name, "as_of_day": as_of_day},
+        )
+        held = _held_units(conn, as_of_day, hold_id).get(item_name, 0)
+    stock["held"] = held
+    stock["current_stock"] = (stock["current_stock"] - held).clip(lower=0)
+    return stock
 
 # === REVIEW: get_supplier_delivery_date ===
 # Purpose: Estimates when a supplier delivery would arrive based on order quantity.
@@ -424,9 +2143,12 @@ def get_stock_level(item_name: str, as_of_date: Union[str, datetime]) -> pd.Data
 # Parameters: input_date_str (ISO YYYY-MM-DD), quantity (number of units).
 # Returns: Estimated delivery date as ISO format string (YYYY-MM-DD).
 # Fallback: If date parsing fails, uses current date as base.
+# Logging: no per-call print, as the fast path calls this for every order line; @traced records
+#   each call as a span instead.
 # Agent usage: Used by Inventory Agent's check_delivery_date tool to estimate
 #   when restocked items would arrive from the supplier.
 # Rubric: B11 requires this function to be used in at least one tool definition.
+@traced
 def get_supplier_delivery_date(input_date_str: str, quantity: int) -> str:
     """
     Estimate the supplier delivery date based on the requested order quantity and a starting date.
@@ -444,9 +2166,6 @@ def get_supplier_delivery_date(input_date_str: str, quantity: int) -> str:
     Returns:
         str: Estimated delivery date in ISO format (YYYY-MM-DD).
     """
-    # Debug log (comment out in production if needed)
-    print(f"FUNC (get_supplier_delivery_date): Calculating for qty {quantity} from date string '{input_date_str}'")
-
     # Attempt to parse the input date
     try:
         input_date_dt = datetime.fromisoformat(input_date_str.split("T")[0])
@@ -473,13 +2192,16 @@ def get_supplier_delivery_date(input_date_str: str, quantity: int) -> str:
 
 # === REVIEW: get_cash_balance ===
 # Purpose: Calculates the company's net cash balance as of a given date.
-# Formula: SUM(sales prices) - SUM(stock_orders prices) for all transactions up to as_of_date.
+# Formula: SUM(sales prices) - SUM(stock_orders prices) for all transactions up to as_of_date,
+#   aggregated in SQLite from the cash ledger (running balance or nearest checkpoint plus the
+#   transactions after it) - no transaction rows are loaded into pandas.
 # Initial balance: Starts at $50,000 (seeded as a sales transaction in init_database).
 # Returns: Float representing available cash. Returns 0.0 if no transactions or on error.
 # Agent usage: Used by TWO agent tools:
 #   - Inventory Agent's reorder_stock tool (to verify cash before placing stock orders)
 #   - Sales Agent's check_cash_balance tool (to report current financial position)
 # Rubric: B12 requires this function to be used in at least one tool definition.
+@traced
 def get_cash_balance(as_of_date: Union[str, datetime]) -> float:
     """
     Calculate the current cash balance as of a specified date.
@@ -494,39 +2216,75 @@ def get_cash_balance(as_of_date: Union[str, datetime]) -> float:
         float: Net cash balance as of the given date. Returns 0.0 if no transactions exist or an error occurs.
     """
     try:
-        # Convert date to ISO format if it's a datetime object
-        if isinstance(as_of_date, datetime):
-            as_of_date = as_of_date.isoformat()
-
-        # Query all transactions on or before the specified date
-        transactions = pd.read_sql(
-            "SELECT * FROM transactions WHERE transaction_date <= :as_of_date",
-            db_engine,
-            params={"as_of_date": as_of_date},
-        )
+        # Convert the date (ISO string or datetime) to its day number once, here
+        as_of_day = _day_number(as_of_date)
 
-        # Compute the difference between sales and stock purchases
-        if not transactions.empty:
-            total_sales = transactions.loc[transactions["transaction_type"] == "sales", "price"].sum()
-            total_purchases = transactions.loc[transactions["transaction_type"] == "stock_orders", "price"].sum()
-            return float(total_sales - total_purchases)
-
-        return 0.0
+        # Aggregate in the database from the nearest cash ledger anchor
+        with db_engine.connect() as conn:
+            return _cash_as_of(conn, as_of_day)
 
     except Exception as e:
         print(f"Error getting cash balance: {e}")
         return 0.0
 
 
+def _cash_as_of(conn: Connection, as_of_day: int) -> float:
+    """get_cash_balance() for a day number on an open connection, without the error fallback."""
+    balance = conn.execute(
+        text("WITH" + CASH_AS_OF_CTE + "SELECT cash_balance FROM cash_as_of"),
+        {"as_of_day": as_of_day},
+    ).scalar()
+    return float(balance)
+
+
 # === REVIEW: generate_financial_report ===
 # Purpose: Generates a comprehensive financial report including cash, inventory valuation,
 #   total assets, per-item inventory breakdown, and top 5 selling products by revenue.
-# Internally calls: get_cash_balance() and get_stock_level() for each inventory item.
+# Internally runs two set-based queries on one connection instead of one get_stock_level()
+#   round trip per inventory row: (1) cash plus every inventory item's stock, (2) the top
+#   sellers, both read from the cash/stock ledgers. Valuation is one vectorized pandas pass over (1).
 # Returns: Dict with keys: as_of_date, cash_balance, inventory_value, total_assets,
 #   inventory_summary (list of dicts), top_selling_products (list of top 5 dicts).
 # Agent usage: Used by Sales Agent's get_financial_report tool to provide
 #   post-transaction financial snapshots and final reporting.
 # Rubric: B13 requires this function to be used in at least one tool definition.
+# One row per inventory item (in inventory order) with its stock as of :as_of_day.
+# Starting from the single cash row keeps cash in the result even when inventory is empty.
+INVENTORY_REPORT_SQL = "WITH" + STOCK_AS_OF_CTE.format(item_filter="") + "," + CASH_AS_OF_CTE + """,
+    item_stock AS (
+        SELECT item_name, SUM(units) AS stock FROM stock_as_of GROUP BY item_name
+    )
+    SELECT
+        c.cash_balance,
+        i.item_name,
+        COALESCE(s.stock, 0) AS stock,
+        i.unit_price
+    FROM cash_as_of c
+    LEFT JOIN inventory i ON 1 = 1
+    LEFT JOIN item_stock s ON s.item_name = i.item_name
+    ORDER BY i.rowid
+"""
+
+# Item sales come from the stock ledger; sales without an item (the seeded starting cash)
+# are few and aggregated straight from 'transactions' through the item_name index.
+TOP_SELLERS_SQL = "WITH" + STOCK_AS_OF_CTE.format(item_filter="") + """
+    SELECT item_name, total_units, total_revenue FROM (
+        SELECT item_name, SUM(sales_units) AS total_units, SUM(sales_revenue) AS total_revenue
+        FROM stock_as_of
+        GROUP BY item_name
+        HAVING total_units > 0 OR total_revenue <> 0
+        UNION ALL
+        SELECT NULL, SUM(units), SUM(price)
+        FROM transactions
+        WHERE item_name IS NULL AND transaction_type = 'sales' AND transaction_day <= :as_of_day
+        GROUP BY item_name
+    )
+    ORDER BY total_revenue DESC
+    LIMIT 5
+"""
+
+
+@traced
 def generate_financial_report(as_of_date: Union[str, datetime]) -> Dict:
     """
     Generate a complete financial report for the company as of a specific date.
@@ -554,38 +2312,21 @@ def generate_financial_report(as_of_date: Union[str, datetime]) -> Dict:
     if isinstance(as_of_date, datetime):
         as_of_date = as_of_date.isoformat()
 
-    # Get current cash balance
-    cash = get_cash_balance(as_of_date)
-
-    # Get current inventory snapshot
-    inventory_df = pd.read_sql("SELECT * FROM inventory", db_engine)
-    inventory_value = 0.0
-    inventory_summary = []
+    params = {"as_of_day": _day_number(as_of_date)}
+    with db_engine.connect() as conn:
+        # Cash and per-item stock in one statement, top sellers in a second
+        report_df = pd.read_sql(text(INVENTORY_REPORT_SQL), conn, params=params)
+        top_sales = pd.read_sql(text(TOP_SELLERS_SQL), conn, params=params)
 
-    # Compute total inventory value and summary by item
-    for _, item in inventory_df.iterrows():
-        stock_info = get_stock_level(item["item_name"], as_of_date)
-        stock = stock_info["current_stock"].iloc[0]
-        item_value = stock * item["unit_price"]
-        inventory_value += item_value
+    cash = float(report_df["cash_balance"].iloc[0])
 
-        inventory_summary.append({
-            "item_name": item["item_name"],
-            "stock": stock,
-            "unit_price": item["unit_price"],
-            "value": item_value,
-        })
+    # Compute total inventory value and summary by item in one vectorized pass
+    inventory_df = report_df.dropna(subset=["item_name"])
+    inventory_df = inventory_df.assign(value=inventory_df["stock"] * inventory_df["unit_price"])
+    inventory_value = float(inventory_df["value"].sum())
+    inventory_summary = inventory_df[["item_name", "stock", "unit_price", "value"]].to_dict(orient="records")
 
     # Identify top-selling products by revenue
-    top_sales_query = """
-        SELECT item_name, SUM(units) as total_units, SUM(price) as total_revenue
-        FROM transactions
-        WHERE transaction_type = 'sales' AND transaction_date <= :date
-        GROUP BY item_name
-        ORDER BY total_revenue DESC
-        LIMIT 5
-    """
-    top_sales = pd.read_sql(top_sales_query, db_engine, params={"date": as_of_date})
     top_selling_products = top_sales.to_dict(orient="records")
 
     return {
@@ -601,24 +2342,60 @@ def generate_financial_report(as_of_date: Union[str, datetime]) -> Dict:
 # === REVIEW: search_quote_history ===
 # Purpose: Searches historical quotes for matches based on keyword terms.
 # Searches both the original customer request text (quote_requests.response) and
-#   the quote explanation text (quotes.quote_explanation) using LIKE matching.
+#   the quote explanation text (quotes.quote_explanation); every term must match one of them.
+# Matching runs on the quotes_fts trigram index (case-insensitive substring, same hits as
+#   LIKE '%term%'). Terms shorter than 3 characters or containing LIKE wildcards, and SQLite
+#   builds without FTS5, use the original LIKE scan instead.
+# rank_by="date" (default) orders by most recent order_date; rank_by="relevance" orders by
+#   the FTS5 BM25 score (falling back to date order when the LIKE scan is used). Date-ordered
+#   searches for very common terms also use the LIKE scan, which walks idx_quotes_order_date
+#   newest first and stops after 'limit' hits.
 # Returns: List[Dict] with up to 'limit' results (default 5), each containing:
 #   original_request, total_amount, quote_explanation, job_type, order_size, event_type, order_date.
 # Joins quotes table with quote_requests table on request_id/id.
 # Agent usage: Used by Quoting Agent's search_quotes tool to find similar past quotes
 #   and inform pricing decisions based on historical patterns.
 # Rubric: B14 requires this function to be used in at least one tool definition.
-def search_quote_history(search_terms: List[str], limit: int = 5) -> List[Dict]:
+QUOTE_SEARCH_PROBE_LIMIT = 1000
+
+QUOTE_SEARCH_COLUMNS = """
+            qr.response AS original_request,
+            q.total_amount,
+            q.quote_explanation,
+            q.job_type,
+            q.order_size,
+            q.event_type,
+            q.order_date
+"""
+
+
+def _fts_match_expression(search_terms: List[str]) -> Union[str, None]:
+    """Build an FTS5 MATCH expression requiring every term as a substring, or None if the
+    terms need the LIKE scan (fewer than 3 characters, or LIKE wildcards '%' / '_')."""
+    if not search_terms:
+        return None
+    phrases = []
+    for term in search_terms:
+        if len(term) < 3 or "%" in term or "_" in term:
+            return None
+        phrases.append('"' + term.replace('"', '""') + '"')
+    return " AND ".join(phrases)
+
+
+@traced
+def search_quote_history(search_terms: List[str], limit: int = 5, rank_by: str = "date") -> List[Dict]:
     """
     Retrieve a list of historical quotes that match any of the provided search terms.
 
     The function searches both the original customer request (from `quote_requests`) and
     the explanation for the quote (from `quotes`) for each keyword. Results are sorted by
-    most recent order date and limited by the `limit` parameter.
+    most recent order date, or by BM25 relevance, and limited by the `limit` parameter.
 
     Args:
         search_terms (List[str]): List of terms to match against customer requests and explanations.
         limit (int, optional): Maximum number of quote records to return. Default is 5.
+        rank_by (str, optional): "date" for most recent first or "relevance" for best BM25 match
+                                 first. Default is "date".
 
     Returns:
         List[Dict]: A list of matching quotes, each represented as a dictionary with fields:
@@ -629,41 +2406,69 @@ def search_quote_history(search_terms: List[str], limit: int = 5) -> List[Dict]:
             - order_size
             - event_type
             - order_date
-    """
-    conditions = []
-    params = {}
 
-    # Build SQL WHERE clause using LIKE filters for each search term
-    for i, term in enumerate(search_terms):
-        param_name = f"term_{i}"
-        conditions.append(
-            f"(LOWER(qr.response) LIKE :{param_name} OR "
-            f"LOWER(q.quote_explanation) LIKE :{param_name})"
-        )
-        params[param_name] = f"%{term.lower()}%"
-
-    # Combine conditions; fallback to always-true if no terms provided
-    where_clause = " AND ".join(conditions) if conditions else "1=1"
-
-    # Final SQL query to join quotes with quote_requests
-    query = f"""
-        SELECT
-            qr.response AS original_request,
-            q.total_amount,
-            q.quote_explanation,
-            q.job_type,
-            q.order_size,
-            q.event_type,
-            q.order_date
-        FROM quotes q
-        JOIN quote_requests qr ON q.request_id = qr.id
-        WHERE {where_clause}
-        ORDER BY q.order_date DESC
-        LIMIT {limit}
+    Raises:
+        ValueError: If rank_by is not "date" or "relevance".
     """
+    if rank_by not in ("date", "relevance"):
+        raise ValueError(f"rank_by must be 'date' or 'relevance', got {rank_by!r}")
 
-    # Execute parameterized query
     with db_engine.connect() as conn:
+        match_expression = _fts_match_expression(search_terms)
+        use_index = match_expression is not None and conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'quotes_fts'")
+        ).first() is not None
+
+        if use_index and rank_by == "date":
+            # Terms matching more than QUOTE_SEARCH_PROBE_LIMIT quotes are common enough that
+            # walking idx_quotes_order_date newest first reaches `limit` hits sooner than
+            # sorting every match, so they take the LIKE path below
+            probe = conn.execute(
+                text("SELECT COUNT(*) FROM (SELECT 1 FROM quotes_fts WHERE quotes_fts MATCH :match_expression LIMIT :probe_limit)"),
+                {"match_expression": match_expression, "probe_limit": QUOTE_SEARCH_PROBE_LIMIT},
+            ).scalar()
+            use_index = probe < QUOTE_SEARCH_PROBE_LIMIT
+
+        if use_index:
+            order_by = "bm25(quotes_fts), q.order_date DESC" if rank_by == "relevance" else "q.order_date DESC"
+            query = f"""
+                SELECT {QUOTE_SEARCH_COLUMNS}
+                FROM quotes_fts
+                JOIN quotes q ON q.id = quotes_fts.rowid
+                JOIN quote_requests qr ON q.request_id = qr.id
+                WHERE quotes_fts MATCH :match_expression
+                ORDER BY {order_by}
+                LIMIT {limit}
+            """
+            result = conn.execute(text(query), {"match_expression": match_expression})
+            return [dict(row._mapping) for row in result]
+
+        conditions = []
+        params = {}
+
+        # Build SQL WHERE clause using LIKE filters for each search term
+        for i, term in enumerate(search_terms):
+            param_name = f"term_{i}"
+            conditions.append(
+                f"(LOWER(qr.response) LIKE :{param_name} OR "
+                f"LOWER(q.quote_explanation) LIKE :{param_name})"
+            )
+            params[param_name] = f"%{term.lower()}%"
+
+        # Combine conditions; fallback to always-true if no terms provided
+        where_clause = " AND ".join(conditions) if conditions else "1=1"
+
+        # Final SQL query to join quotes with quote_requests
+        query = f"""
+            SELECT {QUOTE_SEARCH_COLUMNS}
+            FROM quotes q
+            JOIN quote_requests qr ON q.request_id = qr.id
+            WHERE {where_clause}
+            ORDER BY q.order_date DESC
+            LIMIT {limit}
+        """
+
+        # Execute parameterized query
         result = conn.execute(text(query), params)
         return [dict(row._mapping) for row in result]
 
@@ -676,17 +2481,6 @@ def search_quote_history(search_terms: List[str], limit: int = 5) -> List[Dict]:
 ########################
 
 
-# =====================================================================
-# Environment setup and model initialization
-# =====================================================================
-dotenv.load_dotenv()
-
-model = OpenAIServerModel(
-    model_id="gpt-4o-mini",
-    api_key=os.getenv("OPENAI_API_KEY"),
-)
-
-
 # =====================================================================
 # Item name matching utility
 # Maps customer descriptions to exact catalog names using fuzzy matching
@@ -694,7 +2488,110 @@ model = OpenAIServerModel(
 
 # Build a lookup of exact catalog item names
 CATALOG_ITEMS = {p["item_name"].lower(): p["item_name"] for p in paper_supplies}
-CATALOG_PRICES = {p["item_name"]: p["unit_price"] for p in paper_supplies}
+
+
+def _trigrams(value: str) -> set:
+    """Return the distinct 3-character substrings of a string."""
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class CatalogMatcher:
+    """Prebuilt index that resolves customer item descriptions to catalog names.
+
+    Returns the same answer as a linear scan of the catalog (exact match, then the
+    longest substring match, then the largest word overlap, ties going to the earliest
+    catalog entry) without visiting every entry on each call:
+
+    - a catalog name containing the request is found through a trigram inverted index,
+    - catalog names contained in the request are found by looking up the request's
+      substrings of every catalog name length,
+    - word overlap is counted from a token inverted index.
+
+    Resolved names are kept in an LRU cache.
+
+    Args:
+        item_names (List[str]): Exact catalog item names, in catalog order.
+        cache_size (int): Maximum number of resolved requests kept in the LRU cache.
+    """
+
+    def __init__(self, item_names: List[str], cache_size: int = 4096):
+        # Same construction as CATALOG_ITEMS: a duplicate lowercase name keeps its first
+        # position and its last spelling
+        self.catalog = {name.lower(): name for name in item_names}
+        self.lower_names = list(self.catalog)
+        self.exact_names = list(self.catalog.values())
+        self.positions = {lower: i for i, lower in enumerate(self.lower_names)}
+        self.lengths = sorted({len(lower) for lower in self.lower_names}, reverse=True)
+
+        # Posting lists are built in catalog order, so they are sorted by position
+        self.trigram_index: Dict[str, List[int]] = {}
+        self.token_index: Dict[str, List[int]] = {}
+        for i, lower in enumerate(self.lower_names):
+            for gram in _trigrams(lower):
+                self.trigram_index.setdefault(gram, []).append(i)
+            for token in set(lower.split()):
+                self.token_index.setdefault(token, []).append(i)
+
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+
+    def _containing(self, lower_name: str) -> Union[int, None]:
+        """Return the first catalog position whose name contains the request, if any."""
+        if len(lower_name) < 3:
+            candidates = range(len(self.lower_names))
+        else:
+            postings = []
+            for gram in _trigrams(lower_name):
+                if gram not in self.trigram_index:
+                    return None
+                postings.append(self.trigram_index[gram])
+            # Every containing name carries every request trigram; verify the rarest list
+            candidates = min(postings, key=len)
+        for i in candidates:
+            if lower_name in self.lower_names[i]:
+                return i
+        return None
+
+    def _longest_contained(self, lower_name: str) -> Union[int, None]:
+        """Return the first catalog position among the longest names contained in the request."""
+        for length in self.lengths:
+            if length >= len(lower_name):
+                continue
+            found = [
+                self.positions[lower_name[start:start + length]]
+                for start in range(len(lower_name) - length + 1)
+                if lower_name[start:start + length] in self.positions
+            ]
+            if found:
+                return min(found)
+        return None
+
+    def _best_overlap(self, lower_name: str) -> Union[int, None]:
+        """Return the first catalog position sharing the most words with the request."""
+        overlaps = Counter()
+        for token in set(lower_name.split()):
+            overlaps.update(self.token_index.get(token, ()))
+        if not overlaps:
+            return None
+        return max(overlaps.items(), key=lambda entry: (entry[1], -entry[0]))[0]
+
+    def _match(self, requested_name: str) -> Union[str, None]:
+        lower_name = requested_name.strip().lower()
+
+        if lower_name in self.catalog:
+            return self.catalog[lower_name]
+        if not lower_name:
+            return None
+
+        # A name containing the whole request outscores any name shorter than the request
+        position = self._containing(lower_name)
+        if position is None:
+            position = self._longest_contained(lower_name)
+        if position is None:
+            position = self._best_overlap(lower_name)
+        return self.exact_names[position] if position is not None else None
+
+
+CATALOG_MATCHER = CatalogMatcher([p["item_name"] for p in paper_supplies])
 
 
 def match_item_name(requested_name: str) -> str:
@@ -703,489 +2600,699 @@ def match_item_name(requested_name: str) -> str:
     Tries exact match first, then partial/fuzzy match.
     Returns the exact catalog name or None if no match found.
     """
-    lower_name = requested_name.strip().lower()
-
-    # Exact match
-    if lower_name in CATALOG_ITEMS:
-        return CATALOG_ITEMS[lower_name]
-
-    # Partial match: check if requested name contains a catalog name or vice versa
-    best_match = None
-    best_score = 0
-    for catalog_lower, catalog_exact in CATALOG_ITEMS.items():
-        # Check if catalog name is contained in the request
-        if catalog_lower in lower_name:
-            score = len(catalog_lower)
-            if score > best_score:
-                best_score = score
-                best_match = catalog_exact
-        # Check if request is contained in the catalog name
-        elif lower_name in catalog_lower:
-            score = len(lower_name)
-            if score > best_score:
-                best_score = score
-                best_match = catalog_exact
-
-    # Word overlap matching as fallback
-    if best_match is None:
-        request_words = set(lower_name.split())
-        for catalog_lower, catalog_exact in CATALOG_ITEMS.items():
-            catalog_words = set(catalog_lower.split())
-            overlap = len(request_words & catalog_words)
-            if overlap > best_score:
-                best_score = overlap
-                best_match = catalog_exact
-
-    return best_match if best_score > 0 else None
+    return CATALOG_MATCHER.match(requested_name)
 
 
 # =====================================================================
-# Tool definitions for agents
-# Each tool wraps one or more of the 7 required helper functions.
+# Quote pricing
+# Shared by the calculate_quote tool, reservations and the deterministic fast path
 # =====================================================================
 
-
-# --- Tools for Inventory Agent ---
-
-@tool
-def check_inventory(as_of_date: str) -> str:
-    """Check the complete inventory of all items currently in stock as of a given date.
-    Returns a formatted list of item names and their stock quantities.
+# === REVIEW: pricing engine ===
+# Purpose: Price many quotes and line items at once with NumPy/pandas column operations
+#   instead of a Python loop per line (price_lines() / summarize()).
+# Single quotes: build_quote() calls quote(), which prices its few lines with plain dict and
+#   bisect lookups. The column pass costs about a millisecond of pandas overhead however few
+#   lines it gets, so it only pays off for batches of roughly a thousand lines or more (see
+#   benchmarks.py pricing). Both paths do the same arithmetic in the same order, so their
+#   totals agree to the cent.
+# Steps: names are resolved once per distinct description (CATALOG_MATCHER) and looked up in
+#   the catalog for category and unit price, units are summed per quote, and each line's
+#   discount is found for all lines sharing a tier table at once with np.searchsorted.
+# Tiers: rows of (scope, scope_value, min_units, rate); a quote of MORE than min_units units in
+#   total gets `rate`. A line uses its item's tier table if there is one, else its category's,
+#   else the 'all' table. The engine is built from the pricing store for a given date (see
+#   pricing_engine()); DISCOUNT_TIERS are the historical 5% / 10% / 15% above 500 / 1000 /
+#   5000 units it is seeded with.
+DISCOUNT_TIERS = [(500, 0.05), (1000, 0.10), (5000, 0.15)]
+
+
+class PricingEngine:
+    """
+    Vectorized quote pricing over a catalog and discount tier tables.
 
     Args:
-        as_of_date: Date string in ISO format (YYYY-MM-DD) for inventory snapshot.
-    """
-    inventory = get_all_inventory(as_of_date)
-    if not inventory:
-        return "No items currently in stock."
-    result = "Current inventory as of {}:\n".format(as_of_date)
-    for item_name, qty in sorted(inventory.items()):
-        result += "  - {}: {} units\n".format(item_name, qty)
-    result += "\nTotal items in stock: {}".format(len(inventory))
-    return result
-
+        catalog (pd.DataFrame): One row per item with 'item_name', 'category' and 'unit_price'.
+        tiers (pd.DataFrame, optional): Rows with 'scope' ('all', 'category' or 'item'),
+            'scope_value' (the category or item name, '' for 'all'), 'min_units' and 'rate'.
+            Default is DISCOUNT_TIERS for every item.
+        match (callable, optional): Resolves a description to a catalog name or None.
+            Default is match_item_name.
+    """
 
-@tool
-def check_item_stock(item_name: str, as_of_date: str) -> str:
-    """Check the stock level of a specific item as of a given date.
-    Uses fuzzy matching to find the closest catalog item name.
+    def __init__(self, catalog: pd.DataFrame, tiers: pd.DataFrame = None, match=None):
+        if tiers is None:
+            tiers = pd.DataFrame(
+                [("all", "", units, rate) for units, rate in DISCOUNT_TIERS],
+                columns=["scope", "scope_value", "min_units", "rate"],
+            )
+        self.catalog = catalog.set_index("item_name")
+        self.categories = self.catalog["category"].to_numpy(dtype=object)
+        self.unit_prices = self.catalog["unit_price"].to_numpy(dtype=float)
+
+        # One (thresholds, rates) table per scope; rates[i] applies above i thresholds, so rates[0] = 0
+        tables = {
+            (scope, scope_value): (
+                rows["min_units"].to_numpy(dtype=float),
+                np.concatenate([[0.0], rows["rate"].to_numpy(dtype=float)]),
+            )
+            for (scope, scope_value), rows in tiers.sort_values("min_units").groupby(["scope", "scope_value"])
+        }
+        global_table = tables.pop(("all", ""), (np.array([]), np.array([0.0])))
+        self.tier_tables = [global_table] + list(tables.values())
+        table_ids = {key: table_id for table_id, key in enumerate(tables, start=1)}
+        # Tier table of each catalog item: its own, else its category's, else the global one (0)
+        self.item_tables = np.array([
+            table_ids.get(("item", item_name), table_ids.get(("category", category), 0))
+            for item_name, category in zip(self.catalog.index, self.categories)
+        ], dtype=int)
+        self.match = match or match_item_name
+        # Plain-Python copies for quote(): (category, unit price, tier table) per item, and the tables as lists
+        self.item_lookup = {
+            item_name: (category, unit_price, table)
+            for item_name, category, unit_price, table in zip(
+                self.catalog.index, self.categories, self.unit_prices.tolist(), self.item_tables.tolist()
+            )
+        }
+        self.tier_lists = [(thresholds.tolist(), rates.tolist()) for thresholds, rates in self.tier_tables]
+
+    def tier_discount(self, total_units, table: int = 0) -> np.ndarray:
+        """Discount rate for each quote total in `total_units`, from one tier table (default: global)."""
+        thresholds, rates = self.tier_tables[table]
+        return rates[np.searchsorted(thresholds, np.asarray(total_units, dtype=float), side="left")]
+
+    def price_lines(self, item_names, quantities, quote_ids=None) -> pd.DataFrame:
+        """
+        Price line items of one or many quotes in one pass.
+
+        Args:
+            item_names: Requested item descriptions, one per line.
+            quantities: Units per line.
+            quote_ids: Quote each line belongs to. Default puts every line in quote 0.
+
+        Returns:
+            pd.DataFrame: One row per line, in input order, with 'quote_id', 'item_name',
+                'catalog_name', 'category', 'quantity', 'unit_price', 'line_total', 'total_units'
+                (of its quote), 'discount', 'discount_amount' and 'net_total'. Lines not in the
+                catalog have None/NaN in the catalog and price columns.
+        """
+        item_names = np.asarray(item_names, dtype=object)
+        quantities = np.asarray(quantities)
+        quote_ids = np.zeros(len(item_names), dtype=int) if quote_ids is None else np.asarray(quote_ids)
+
+        # Resolve each distinct description once, then look its catalog row up by position
+        name_codes, unique_names = pd.factorize(item_names)
+        catalog_names = np.array([self.match(name) for name in unique_names], dtype=object)
+        positions = self.catalog.index.get_indexer(catalog_names)[name_codes]
+        in_catalog = positions >= 0
+        positions = np.where(in_catalog, positions, 0)
+
+        unit_price = np.where(in_catalog, self.unit_prices[positions], np.nan)
+        line_total = quantities * unit_price
+        quote_codes, _ = pd.factorize(quote_ids)
+        # Every requested unit counts towards the tier, as in the original quotes
+        total_units = np.bincount(quote_codes, weights=quantities)[quote_codes].astype(quantities.dtype)
+        line_tables = np.where(in_catalog, self.item_tables[positions], -1)
+        discount = np.full(len(item_names), np.nan)
+        for table in np.unique(line_tables[in_catalog]):
+            lines_in_table = line_tables == table
+            discount[lines_in_table] = self.tier_discount(total_units[lines_in_table], table)
+        discount_amount = line_total * discount
+        return pd.DataFrame({
+            "quote_id": quote_ids,
+            "item_name": item_names,
+            "catalog_name": np.where(in_catalog, catalog_names[name_codes], None),
+            "category": np.where(in_catalog, self.categories[positions], None),
+            "quantity": quantities,
+            "unit_price": unit_price,
+            "line_total": line_total,
+            "total_units": total_units,
+            "discount": discount,
+            "discount_amount": discount_amount,
+            "net_total": line_total - discount_amount,
+        })
 
-    Args:
-        item_name: The name of the paper item to check (will be matched to catalog).
-        as_of_date: Date string in ISO format (YYYY-MM-DD).
-    """
-    matched_name = match_item_name(item_name)
-    if matched_name is None:
-        return "{}: NOT FOUND IN CATALOG. This item does not exist in our product line.".format(item_name)
-    stock_df = get_stock_level(matched_name, as_of_date)
-    stock_level = int(stock_df["current_stock"].iloc[0])
-    if stock_level > 0:
-        return "{} (catalog name: '{}'): {} units in stock as of {}".format(
-            item_name, matched_name, stock_level, as_of_date
+    def summarize(self, lines: pd.DataFrame) -> pd.DataFrame:
+        """
+        Quote totals for the output of price_lines().
+
+        Totals are computed as build_quote() does: line totals summed in order, the tier rate
+        applied to the subtotal, and Python's round() to cents (NumPy's rounding can differ by
+        a cent on half cents).
+
+        Returns:
+            pd.DataFrame: Indexed by quote_id, with 'total_units', 'subtotal', 'discount' (the
+                global tier rate), 'discount_amount' and 'total'.
+        """
+        quote_codes, quote_ids = pd.factorize(lines["quote_id"], sort=True)
+        count = len(quote_ids)
+        line_total = np.nan_to_num(lines["line_total"].to_numpy(dtype=float))
+        total_units = np.bincount(quote_codes, weights=lines["quantity"], minlength=count).astype(lines["quantity"].dtype)
+        subtotal = np.bincount(quote_codes, weights=line_total, minlength=count)
+        discount = self.tier_discount(total_units)
+        # Lines on an item or category tier table correct subtotal * rate by their rate difference
+        shortfall = np.nan_to_num(discount[quote_codes] - lines["discount"].to_numpy(dtype=float))
+        discount_amount = subtotal * discount - np.bincount(
+            quote_codes, weights=line_total * shortfall, minlength=count
         )
-    else:
-        return "{} (catalog name: '{}'): OUT OF STOCK (0 units) as of {}".format(
-            item_name, matched_name, as_of_date
+        return pd.DataFrame(
+            {
+                "total_units": total_units,
+                "subtotal": subtotal,
+                "discount": discount,
+                "discount_amount": discount_amount,
+                "total": [round(total, 2) for total in (subtotal - discount_amount).tolist()],
+            },
+            index=pd.Index(quote_ids, name="quote_id"),
         )
 
+    def quote(self, items: List[Dict]) -> Dict:
+        """Price one quote; see build_quote(). Same results as price_lines() and summarize(), without pandas."""
+        total_units = sum(item["quantity"] for item in items)
+        discount = self._scalar_discount(total_units, 0) if items else 0.0
+        lines = []
+        subtotal = 0.0
+        correction = 0.0
+        for item in items:
+            catalog_name = self.match(item["item_name"])
+            lookup = self.item_lookup.get(catalog_name)
+            if lookup is None:
+                lines.append({
+                    "item_name": item["item_name"], "catalog_name": None, "category": None,
+                    "quantity": item["quantity"], "unit_price": None, "line_total": None,
+                    "discount": None, "net_total": None,
+                })
+                continue
+            category, unit_price, table = lookup
+            line_total = item["quantity"] * unit_price
+            line_discount = self._scalar_discount(total_units, table)
+            subtotal += line_total
+            correction += line_total * (discount - line_discount)
+            lines.append({
+                "item_name": item["item_name"],
+                "catalog_name": catalog_name,
+                "category": category,
+                "quantity": item["quantity"],
+                "unit_price": unit_price,
+                "line_total": float(line_total),
+                "discount": line_discount,
+                "net_total": float(line_total - line_total * line_discount),
+            })
+        # As in summarize(): the global rate on the subtotal, corrected for lines on other tier tables
+        discount_amount = subtotal * discount - correction
+        return {
+            "lines": lines,
+            "subtotal": float(subtotal),
+            "discount": discount,
+            "discount_amount": float(discount_amount),
+            "total": round(float(subtotal - discount_amount), 2),
+        }
+
+    def _scalar_discount(self, total_units: int, table: int) -> float:
+        """tier_discount() for a single quote total."""
+        thresholds, rates = self.tier_lists[table]
+        return rates[bisect.bisect_left(thresholds, total_units)]
+
+
+def order_lines_from_requests(requests: pd.Series) -> pd.DataFrame:
+    """
+    Extract "<quantity> [<unit>] <description>" order lines from many customer requests at once.
+
+    Args:
+        requests (pd.Series): Request texts; the index identifies each request.
 
-@tool
-def check_delivery_date(order_date: str, quantity: int) -> str:
-    """Estimate when a supplier delivery would arrive based on order date and quantity.
-    Delivery times: <=10 units same day, 11-100 +1 day, 101-1000 +4 days, >1000 +7 days.
+    Returns:
+        pd.DataFrame: 'quote_id' (the request's index label), 'item_name' (the description) and
+            'quantity', ready for PricingEngine.price_lines(). Units such as reams are not converted.
+    """
+    texts = requests.str.replace(REQUEST_DATE_PATTERN, " ", regex=True).str.replace(TEXT_DATE_PATTERN, " ", regex=True)
+    matches = texts.str.extractall(ORDER_LINE_PATTERN)
+    return pd.DataFrame({
+        "quote_id": matches.index.get_level_values(0),
+        "item_name": matches[2].str.strip().to_numpy(),
+        "quantity": matches[0].str.replace(",", "").astype(int).to_numpy(),
+    })
+
+
+# === REVIEW: pricing store ===
+# Purpose: Keep item prices and discount tiers in the database with effective dates, so prices
+#   can change without a code edit and a quote for an old request_date uses the prices of that day.
+# Tables: 'item_prices' has one row per item and effective date; 'discount_tiers' one row per
+#   tier, and all rows of a scope (scope, scope_value) with the same effective date form its
+#   tier table. On a date, each item has its latest price and each scope its latest tier table.
+# Cache: pricing_engine() compiles a PricingEngine per snapshot (the latest effective date on
+#   or before the quote date) and keeps up to PRICING_CACHE_SIZE of them. Triggers bump
+#   'pricing_version' on every change; the cache is keyed on it, so a quote costs a single
+#   one-row query for the version and no query per line item.
+# Used by: build_quote(); set_item_price() and set_discount_tiers() change the store.
+PRICING_START_DATE = "1970-01-01"
+PRICING_CACHE_SIZE = 32
+_pricing_cache_lock = threading.Lock()
+_pricing_cache = {"key": None, "dates": [], "engines": OrderedDict()}
+
+
+def _pricing_date(value: Union[str, datetime]) -> str:
+    """Normalize a date or ISO timestamp to the 'YYYY-MM-DD' form effective dates are stored in."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return value[:10]
+
+
+def seed_pricing(conn: Connection) -> None:
+    """
+    Fill an empty pricing store with the catalog prices and DISCOUNT_TIERS, effective from the start.
 
     Args:
-        order_date: The date the order would be placed, in ISO format (YYYY-MM-DD).
-        quantity: Number of units to order from the supplier.
+        conn (Connection): An open connection inside a write transaction.
     """
-    delivery_date = get_supplier_delivery_date(order_date, quantity)
-    return "Estimated delivery date for {} units ordered on {}: {}".format(
-        quantity, order_date, delivery_date
+    if conn.execute(text("SELECT COUNT(*) FROM item_prices")).scalar():
+        return
+    conn.execute(
+        text("""
+            INSERT INTO item_prices (item_name, category, unit_price, effective_date)
+            VALUES (:item_name, :category, :unit_price, :effective_date)
+        """),
+        [{**item, "effective_date": PRICING_START_DATE} for item in paper_supplies],
+    )
+    conn.execute(
+        text("""
+            INSERT INTO discount_tiers (scope, scope_value, min_units, rate, effective_date)
+            VALUES ('all', '', :min_units, :rate, :effective_date)
+        """),
+        [{"min_units": units, "rate": rate, "effective_date": PRICING_START_DATE} for units, rate in DISCOUNT_TIERS],
     )
 
 
-@tool
-def reorder_stock(item_name: str, quantity: int, unit_price: float, order_date: str) -> str:
-    """Place a stock reorder with the supplier for a specific item.
-    Creates a stock_orders transaction that increases inventory and decreases cash.
-    Checks cash balance before ordering. Uses fuzzy matching for item names.
-
-    Args:
-        item_name: The name of the item to reorder (will be matched to catalog).
-        quantity: Number of units to order.
-        unit_price: The cost per unit from the supplier.
-        order_date: Date string in ISO format (YYYY-MM-DD).
-    """
-    matched_name = match_item_name(item_name)
-    if matched_name is None:
-        return "CANNOT REORDER: '{}' not found in catalog.".format(item_name)
-    total_cost = quantity * unit_price
-    cash = get_cash_balance(order_date)
-    if total_cost > cash:
-        return "CANNOT REORDER: Insufficient cash. Need ${:.2f}, have ${:.2f}".format(
-            total_cost, cash
-        )
-    txn_id = create_transaction(matched_name, "stock_orders", quantity, total_cost, order_date)
-    return "Reorder placed: {} units of {} at ${:.2f} total. Transaction ID: {}".format(
-        quantity, matched_name, total_cost, txn_id
+def _compile_pricing_engine(conn: Connection, snapshot_date: str) -> PricingEngine:
+    """Build a PricingEngine from the prices and tier tables in effect on snapshot_date."""
+    catalog = pd.read_sql(
+        text("""
+            SELECT p.item_name, p.category, p.unit_price
+            FROM item_prices p
+            JOIN (
+                SELECT item_name, MAX(effective_date) AS effective_date
+                FROM item_prices
+                WHERE effective_date <= :snapshot_date
+                GROUP BY item_name
+            ) latest USING (item_name, effective_date)
+            ORDER BY p.item_name
+        """),
+        conn,
+        params={"snapshot_date": snapshot_date},
     )
+    tiers = pd.read_sql(
+        text("""
+            SELECT t.scope, t.scope_value, t.min_units, t.rate
+            FROM discount_tiers t
+            JOIN (
+                SELECT scope, scope_value, MAX(effective_date) AS effective_date
+                FROM discount_tiers
+                WHERE effective_date <= :snapshot_date
+                GROUP BY scope, scope_value
+            ) latest USING (scope, scope_value, effective_date)
+        """),
+        conn,
+        params={"snapshot_date": snapshot_date},
+    )
+    return PricingEngine(catalog, tiers)
 
 
-# --- Tools for Quoting Agent ---
-
-@tool
-def search_quotes(search_terms: str) -> str:
-    """Search historical quote records for similar past orders.
-    Use comma-separated keywords related to the job type, event type, order size, or item types.
+def pricing_engine(as_of_date: Union[str, datetime] = None, conn: Connection = None) -> PricingEngine:
+    """
+    Return the compiled PricingEngine for the prices in effect on a date, building it on first use.
 
     Args:
-        search_terms: Comma-separated keyword strings to search for in quote history (e.g. 'cardstock, ceremony, large').
-    """
-    terms_list = [t.strip() for t in search_terms.split(",") if t.strip()]
-    results = search_quote_history(terms_list, limit=5)
-    if not results:
-        return "No matching historical quotes found for terms: {}".format(search_terms)
-    output = "Found {} historical quotes:\n".format(len(results))
-    for i, q in enumerate(results, 1):
-        output += (
-            "\n  Quote {}:\n"
-            "    Amount: ${}\n"
-            "    Job type: {}\n"
-            "    Order size: {}\n"
-            "    Event type: {}\n"
-            "    Explanation: {}\n"
-        ).format(
-            i, q["total_amount"], q["job_type"],
-            q["order_size"], q["event_type"],
-            q["quote_explanation"][:300]
-        )
-    return output
-
+        as_of_date (str or datetime, optional): The quote date. Default is the latest prices.
+        conn (Connection, optional): Connection to read through, e.g. inside a write transaction.
+            Default opens one from db_engine.
 
-@tool
-def calculate_quote(items_json: str) -> str:
-    """Calculate a price quote for a list of items with quantities.
-    Applies bulk discounts based on total quantity ordered.
-    Uses fuzzy matching to resolve item names to catalog entries.
-
-    Args:
-        items_json: JSON string of items list, each with 'item_name' and 'quantity' keys.
-            Example: '[{"item_name": "A4 paper", "quantity": 500}, {"item_name": "Cardstock", "quantity": 300}]'
-    """
-    items = json.loads(items_json)
-    total_units = sum(item["quantity"] for item in items)
-
-    # Bulk discount tiers based on historical quote patterns
-    if total_units > 5000:
-        discount = 0.15
-    elif total_units > 1000:
-        discount = 0.10
-    elif total_units > 500:
-        discount = 0.05
-    else:
-        discount = 0.0
-
-    breakdown = []
-    subtotal = 0.0
-    matched_items = []
-    for item in items:
-        name = item["item_name"]
-        qty = item["quantity"]
-        matched_name = match_item_name(name)
-        if matched_name and matched_name in CATALOG_PRICES:
-            unit_price = CATALOG_PRICES[matched_name]
-            line_total = qty * unit_price
-            subtotal += line_total
-            breakdown.append("  {} ({}): {} x ${:.2f} = ${:.2f}".format(
-                name, matched_name, qty, unit_price, line_total
-            ))
-            matched_items.append({"catalog_name": matched_name, "quantity": qty, "line_total": line_total})
+    Returns:
+        PricingEngine: Shared between calls; do not modify.
+    """
+    if conn is None:
+        with db_engine.connect() as conn:
+            return pricing_engine(as_of_date, conn)
+
+    key = (str(conn.engine.url), conn.execute(text("SELECT version FROM pricing_version WHERE id = 1")).scalar())
+    with _pricing_cache_lock:
+        if _pricing_cache["key"] != key:
+            _pricing_cache["key"] = key
+            _pricing_cache["dates"] = list(conn.execute(text("""
+                SELECT effective_date FROM item_prices
+                UNION SELECT effective_date FROM discount_tiers
+                ORDER BY 1
+            """)).scalars())
+            _pricing_cache["engines"].clear()
+
+        dates = _pricing_cache["dates"]
+        if as_of_date is None:
+            position = len(dates)
         else:
-            breakdown.append("  {}: ITEM NOT IN CATALOG - cannot quote".format(name))
+            position = bisect.bisect_right(dates, _pricing_date(as_of_date))
+        if position == 0:
+            raise ValueError(f"No prices are in effect on {as_of_date}.")
+        snapshot_date = dates[position - 1]
+
+        engines = _pricing_cache["engines"]
+        if snapshot_date not in engines:
+            engines[snapshot_date] = _compile_pricing_engine(conn, snapshot_date)
+            if len(engines) > PRICING_CACHE_SIZE:
+                engines.popitem(last=False)
+        engines.move_to_end(snapshot_date)
+        return engines[snapshot_date]
+
+
+def set_item_price(item_name: str, unit_price: float, effective_date: Union[str, datetime],
+                   category: str = None) -> None:
+    """
+    Set an item's unit price from a date on. Earlier dates keep their prices.
 
-    discount_amount = subtotal * discount
-    total = round(subtotal - discount_amount, 2)
+    Args:
+        item_name (str): The catalog name of the item.
+        unit_price (float): The new price per unit.
+        effective_date (str or datetime): The first date the price applies to.
+        category (str, optional): Required for an item not priced before; default keeps its category.
 
-    result = "Quote breakdown:\n" + "\n".join(breakdown)
-    result += "\n\nSubtotal: ${:.2f}".format(subtotal)
-    if discount > 0:
-        result += "\nBulk discount ({:.0f}%): -${:.2f}".format(discount * 100, discount_amount)
-    result += "\nTotal: ${:.2f}".format(total)
-    return result
+    Raises:
+        ValueError: If the item has no price yet and no category is given.
+    """
+    def write(conn: Connection) -> None:
+        item_category = category or conn.execute(
+            text("SELECT category FROM item_prices WHERE item_name = :item_name ORDER BY effective_date DESC LIMIT 1"),
+            {"item_name": item_name},
+        ).scalar()
+        if item_category is None:
+            raise ValueError(f"Item '{item_name}' has no price yet; give its category.")
+        conn.execute(
+            text("""
+                INSERT OR REPLACE INTO item_prices (item_name, category, unit_price, effective_date)
+                VALUES (:item_name, :category, :unit_price, :effective_date)
+            """),
+            {"item_name": item_name, "category": item_category, "unit_price": float(unit_price),
+             "effective_date": _pricing_date(effective_date)},
+        )
 
+    run_write_transaction(write)
 
-# --- Tools for Sales Agent ---
 
-@tool
-def finalize_sale(item_name: str, quantity: int, sale_price: float, sale_date: str) -> str:
-    """Finalize a sale by recording it as a sales transaction.
-    Decreases inventory of the item and increases cash balance.
-    Verifies stock availability before completing the sale.
-    Uses fuzzy matching to resolve item names to catalog entries.
+def set_discount_tiers(tiers: List[tuple], effective_date: Union[str, datetime],
+                       scope: str = "all", scope_value: str = "") -> None:
+    """
+    Replace the tier table of a scope from a date on. Earlier dates keep their tiers.
 
     Args:
-        item_name: The name of the item being sold (will be matched to catalog).
-        quantity: Number of units sold.
-        sale_price: Total sale price for the entire quantity (not per unit).
-        sale_date: Date string in ISO format (YYYY-MM-DD).
-    """
-    matched_name = match_item_name(item_name)
-    if matched_name is None:
-        return "SALE REJECTED: '{}' not found in catalog.".format(item_name)
-    stock_df = get_stock_level(matched_name, sale_date)
-    current_stock = int(stock_df["current_stock"].iloc[0])
-    if current_stock < quantity:
-        return "SALE REJECTED: Insufficient stock for {}. Have {} units, need {}.".format(
-            matched_name, current_stock, quantity
+        tiers (List[tuple]): (min_units, rate) pairs; an empty list means no discount for the scope.
+            For 'category' and 'item' scopes an empty list falls back to no discount, not to the
+            'all' tiers.
+        effective_date (str or datetime): The first date the tiers apply to.
+        scope (str, optional): 'all', 'category' or 'item'. Default is 'all'.
+        scope_value (str, optional): The category or item name for those scopes.
+
+    Raises:
+        ValueError: If the scope is unknown or its scope_value is missing.
+    """
+    if scope not in ("all", "category", "item") or (scope == "all") != (scope_value == ""):
+        raise ValueError(f"Invalid discount tier scope: {scope!r} {scope_value!r}")
+    if not tiers:
+        # A row that never applies, so the scope still has a (discount-free) table on this date
+        tiers = [(float("inf"), 0.0)]
+    date = _pricing_date(effective_date)
+
+    def write(conn: Connection) -> None:
+        conn.execute(
+            text("""
+                DELETE FROM discount_tiers
+                WHERE scope = :scope AND scope_value = :scope_value AND effective_date = :effective_date
+            """),
+            {"scope": scope, "scope_value": scope_value, "effective_date": date},
+        )
+        conn.execute(
+            text("""
+                INSERT INTO discount_tiers (scope, scope_value, min_units, rate, effective_date)
+                VALUES (:scope, :scope_value, :min_units, :rate, :effective_date)
+            """),
+            [{"scope": scope, "scope_value": scope_value, "min_units": units, "rate": float(rate),
+              "effective_date": date} for units, rate in tiers],
         )
-    txn_id = create_transaction(matched_name, "sales", quantity, sale_price, sale_date)
-    return "Sale completed: {} units of {} for ${:.2f}. Transaction ID: {}".format(
-        quantity, matched_name, sale_price, txn_id
-    )
 
+    run_write_transaction(write)
 
-@tool
-def check_cash_balance(as_of_date: str) -> str:
-    """Check the current cash balance of the company as of a given date.
 
-    Args:
-        as_of_date: Date string in ISO format (YYYY-MM-DD).
+def build_quote(items: List[Dict], quote_date: Union[str, datetime] = None, conn: Connection = None) -> Dict:
     """
-    balance = get_cash_balance(as_of_date)
-    return "Cash balance as of {}: ${:.2f}".format(as_of_date, balance)
-
-
-@tool
-def get_financial_report(as_of_date: str) -> str:
-    """Generate a complete financial report including cash balance, inventory value,
-    total assets, and top-selling products.
+    Price a list of requested items at the prices and bulk discount tiers in effect on a date.
 
     Args:
-        as_of_date: Date string in ISO format (YYYY-MM-DD).
-    """
-    report = generate_financial_report(as_of_date)
-    result = "Financial Report as of {}:\n".format(report["as_of_date"])
-    result += "  Cash Balance: ${:.2f}\n".format(report["cash_balance"])
-    result += "  Inventory Value: ${:.2f}\n".format(report["inventory_value"])
-    result += "  Total Assets: ${:.2f}\n".format(report["total_assets"])
-    if report["top_selling_products"]:
-        result += "  Top Selling Products:\n"
-        for p in report["top_selling_products"]:
-            result += "    - {}: ${:.2f} revenue\n".format(
-                p.get("item_name", "N/A"), p.get("total_revenue", 0)
-            )
-    return result
+        items (List[Dict]): Items with 'item_name' (matched to the catalog) and 'quantity' keys.
+        quote_date (str or datetime, optional): Date whose prices apply. Default is the latest prices.
+        conn (Connection, optional): Connection to read the pricing store through.
+
+    Returns:
+        Dict: A dictionary containing:
+            - 'lines': one dict per item with 'item_name', 'catalog_name' (None if not in the
+              catalog), 'category', 'quantity', 'unit_price', 'line_total', 'discount' (rate
+              applied to the line) and 'net_total' (line total after discount)
+            - 'subtotal', 'discount' (tier rate), 'discount_amount' and 'total'
+    """
+    return pricing_engine(quote_date, conn).quote(items)
 
 
 # =====================================================================
-# Agent creation
+# Deterministic fast path
+# Plain orders ("500 sheets of Cardstock, 200 Paper plates and ...") whose every line resolves
+# to a catalog item with confidence are priced and sold directly through the helper functions,
+# without any model call. Anything the parser is not sure about goes to the agents.
 # =====================================================================
 
-# Worker Agent 1: Inventory Agent
-# Handles stock checks, availability assessment, reorder decisions, delivery estimates
-inventory_agent = ToolCallingAgent(
-    tools=[check_inventory, check_item_stock, check_delivery_date, reorder_stock],
-    model=model,
-    max_steps=10,
-    name="inventory_agent",
-    description=(
-        "Specialist agent for checking paper supply inventory levels, "
-        "assessing stock availability for specific items, estimating supplier "
-        "delivery dates, and placing restock orders when needed. "
-        "IMPORTANT: Always use the date provided in the task for all tool calls. "
-        "Start by calling check_inventory with the provided date to see all available items."
-    ),
-)
+REQUEST_DATE_PATTERN = re.compile(r"\(Date of request: (\d{4}-\d{2}-\d{2})\)")
 
-# Worker Agent 2: Quoting Agent
-# Searches historical quotes and calculates prices with bulk discounts
-quoting_agent = ToolCallingAgent(
-    tools=[search_quotes, calculate_quote],
-    model=model,
-    max_steps=10,
-    name="quoting_agent",
-    description=(
-        "Specialist agent for generating price quotes based on historical "
-        "quote data and applying appropriate bulk discounts. Provide this agent "
-        "with the list of items, quantities, job type, and event type."
-    ),
+# Free-text dates such as "April 15, 2025" (delivery deadlines) are not quantities
+TEXT_DATE_PATTERN = re.compile(
+    r"\b(?:January|February|March|April|May|June|July|August|September|October|November|December)"
+    r"\s+\d{1,2}(?:st|nd|rd|th)?(?:,?\s*\d{4})?",
+    re.IGNORECASE,
 )
 
-# Worker Agent 3: Sales Agent
-# Finalizes transactions, verifies cash, generates financial reports
-sales_agent = ToolCallingAgent(
-    tools=[finalize_sale, check_cash_balance, get_financial_report],
-    model=model,
-    max_steps=10,
-    name="sales_agent",
-    description=(
-        "Specialist agent for finalizing sales transactions by recording them "
-        "in the database. Also checks cash balance and generates financial "
-        "reports. Use after a quote is ready to complete the sale."
-    ),
+# "<quantity> [<unit> [of]] <description>", the description running to the next list separator
+ORDER_LINE_PATTERN = re.compile(
+    r"(?<![\w.,$])(\d{1,3}(?:,\d{3})+|\d+)\s+"
+    r"(?:(sheets?|units?|pieces?|pcs|reams?|rolls?|boxes?|packs?|packages?|cases?|pads?|dozen)\s+(?:of\s+)?)?"
+    r"([^,;\n]+?)"
+    r"(?=\s*(?:[,;\n]|\band\b|\.\s|\.?$))",
+    re.IGNORECASE,
 )
 
-# Orchestrator Agent: Manages the overall workflow
-# Delegates to inventory, quoting, and sales agents
-ORCHESTRATOR_PROMPT = """You are the customer service coordinator for Beaver's Choice Paper Company.
-
-Your job is to process customer requests for paper supplies by coordinating with your specialist team.
-
-CRITICAL DATE HANDLING:
-- Each customer request contains "(Date of request: YYYY-MM-DD)" at the end.
-- You MUST extract this date and pass it to ALL agents in your task descriptions.
-- ALL inventory checks, quotes, and sales MUST use this exact date.
-
-WORKFLOW FOR EACH REQUEST:
-1. Extract the request date from the customer message.
-2. Ask the inventory_agent to check full inventory using check_inventory with the request date. ALWAYS include the request date in your task message, e.g.: "Check inventory as of 2025-04-01. The customer needs..."
-3. Compare the customer's requested items against available inventory items.
-4. For items that ARE in stock with sufficient quantity, ask the quoting_agent to generate a quote. Include the request date.
-5. MANDATORY: Ask the sales_agent to finalize the sale for EACH available item individually using the finalize_sale tool. Include the exact item name, quantity, total sale price, and the request date. You MUST wait for the sales_agent to confirm the sale was completed before proceeding.
-6. ONLY AFTER the sales_agent confirms each sale, compose a professional customer-facing response.
-
-SALE VERIFICATION:
-- Do NOT claim a sale was completed unless the sales_agent explicitly confirms it with a Transaction ID.
-- If the sales_agent reports a rejection (e.g., insufficient stock), report that item as unavailable to the customer.
-- If no items can be sold, do NOT claim any sale was made. Inform the customer that the order cannot be fulfilled.
-
-ITEM NAME MATCHING:
-Our catalog uses these exact names. Map customer requests to these:
-- "A4 paper", "Letter-sized paper", "Cardstock", "Colored paper", "Glossy paper"
-- "Matte paper", "Recycled paper", "Eco-friendly paper", "Poster paper", "Banner paper"
-- "Kraft paper", "Construction paper", "Wrapping paper", "Glitter paper"
-- "Decorative paper", "Letterhead paper", "Legal-size paper", "Crepe paper"
-- "Photo paper", "Uncoated paper", "Butcher paper", "Heavyweight paper"
-- "Standard copy paper", "Bright-colored paper", "Patterned paper"
-- "Paper plates", "Paper cups", "Paper napkins", "Disposable cups", "Table covers"
-- "Envelopes", "Sticky notes", "Notepads", "Invitation cards", "Flyers"
-- "Party streamers", "Decorative adhesive tape (washi tape)", "Paper party bags"
-- "Name tags with lanyards", "Presentation folders"
-- "Large poster paper (24x36 inches)", "Rolls of banner paper (36-inch width)"
-- "100 lb cover stock", "80 lb text paper", "250 gsm cardstock", "220 gsm poster paper"
-
-If a customer asks for "construction paper" use "Construction paper".
-If they ask for "cardstock" use "Cardstock".
-If they ask for "A4 glossy paper" these are TWO items: "A4 paper" and "Glossy paper".
-Only items in inventory can be sold - check inventory FIRST.
-
-IMPORTANT RULES:
-- Only sell items confirmed as in-stock by the inventory agent.
-- If an item is not in inventory, politely inform the customer it is unavailable.
-- Always provide a rationale for pricing (mention bulk discounts when applied).
-- Include delivery date estimates when fulfilling orders.
-- If only some items can be fulfilled, explain what can and cannot be supplied with reasons.
-- Be polite, professional, and transparent.
-- NEVER expose internal profit margins, supplier costs, or system error messages.
-- Always complete the FULL workflow: inventory check -> quote -> finalize sale.
-- Always sign off as "Beaver's Choice Paper Company" - never use placeholders like "[Your Name]".
-"""
+# Units that count catalog units one for one; reams, boxes, rolls... need a conversion the agents decide
+FAST_PATH_UNITS = {None, "sheet", "sheets", "unit", "units", "piece", "pieces", "pcs"}
 
-orchestrator_agent = ToolCallingAgent(
-    tools=[],
-    model=model,
-    managed_agents=[inventory_agent, quoting_agent, sales_agent],
-    max_steps=15,
-    instructions=ORCHESTRATOR_PROMPT,
-    name="orchestrator_agent",
-    description="Main orchestrator that coordinates inventory, quoting, and sales agents.",
+# Text allowed between two order lines, and after the last one up to the end of its sentence
+ORDER_SEPARATOR_PATTERN = re.compile(
+    r"[\s,;:*\-]*(?:(?:and|plus|along with|as well as)\b[\s,;:*\-]*)?", re.IGNORECASE
 )
 
+# Words of each catalog name, and the names each word appears in
+CATALOG_NAME_WORDS = {
+    lower: frozenset(re.findall(r"[a-z0-9]+", lower)) - {"of", "with"} for lower in CATALOG_ITEMS
+}
+CATALOG_WORD_INDEX: Dict[str, List[str]] = {}
+for _lower_name, _words in CATALOG_NAME_WORDS.items():
+    for _word in _words:
+        CATALOG_WORD_INDEX.setdefault(_word, []).append(_lower_name)
 
-def process_customer_request(request_text: str) -> str:
-    """Process a single customer request through the multi-agent system.
 
-    Args:
-        request_text: The full customer request text including date context.
+def _resolve_order_description(description: str) -> Union[str, None]:
+    """Return the catalog item a line description names unambiguously, or None.
 
-    Returns:
-        str: The customer-facing response from the orchestrator.
+    The matched catalog name must appear verbatim in the description, the rest of the
+    description may hold no digits, and no other catalog name may have all of its words in
+    the description ("A4 glossy paper" could be "A4 paper" or "Glossy paper", so it is left
+    to the agents).
     """
-    try:
-        response = orchestrator_agent.run(request_text)
-        return str(response)
-    except Exception as e:
-        print(f"  [Agent Error: {type(e).__name__}: {e}]")
-        return (
-            "We apologize, but we were unable to fully process your request at this time. "
-            "Please contact our sales team directly for assistance."
-        )
-
-
-# Run your test scenarios by writing them here. Make sure to keep track of them.
-
-def run_test_scenarios():
-    
-    print("Initializing Database...")
-    init_database(db_engine)
-    try:
-        quote_requests_sample = pd.read_csv("quote_requests_sample.csv")
-        quote_requests_sample["request_date"] = pd.to_datetime(
-            quote_requests_sample["request_date"], format="%m/%d/%y", errors="coerce"
-        )
-        quote_requests_sample.dropna(subset=["request_date"], inplace=True)
-        quote_requests_sample = quote_requests_sample.sort_values("request_date")
-    except Exception as e:
-        print(f"FATAL: Error loading test data: {e}")
-        return
-
-    # Get initial state
-    initial_date = quote_requests_sample["request_date"].min().strftime("%Y-%m-%d")
-    report = generate_financial_report(initial_date)
-    current_cash = round(report["cash_balance"], 2)
-    current_inventory = round(report["inventory_value"], 2)
-
-    # Multi-agent system is initialized at module level (orchestrator_agent).
-    # No additional initialization needed here.
+    lower_description = description.strip().lower()
+    matched_name = match_item_name(lower_description)
+    if matched_name is None or matched_name.lower() not in lower_description:
+        return None
+    remainder = lower_description.replace(matched_name.lower(), " ", 1)
+    if any(ch.isdigit() for ch in remainder):
+        return None
+
+    matched_words = CATALOG_NAME_WORDS[matched_name.lower()]
+    shared_words = Counter()
+    for word in set(re.findall(r"[a-z0-9]+", lower_description)):
+        shared_words.update(CATALOG_WORD_INDEX.get(word, ()))
+    for lower_name, count in shared_words.items():
+        words = CATALOG_NAME_WORDS[lower_name]
+        if count == len(words) and not words <= matched_words:
+            return None
+    return matched_name
+
+
+def parse_order_request(request_text: str) -> Union[Dict, None]:
+    """
+    Extract the request date and item/quantity lines from a customer request, if all are unambiguous.
 
-    results = []
-    for req_num, (_, row) in enumerate(quote_requests_sample.iterrows(), start=1):
-        request_date = row["request_date"].strftime("%Y-%m-%d")
+    Args:
+        request_text (str): Customer request ending with "(Date of request: YYYY-MM-DD)".
 
-        print(f"\n=== Request {req_num} ===")
-        print(f"Context: {row['job']} organizing {row['event']}")
-        print(f"Request Date: {request_date}")
-        print(f"Cash Balance: ${current_cash:.2f}")
-        print(f"Inventory Value: ${current_inventory:.2f}")
+    Returns:
+        Dict or None: {'request_date': 'YYYY-MM-DD', 'items': [{'item_name', 'quantity',
+            'description'}, ...]} with catalog item names, or None when the request has no
+            date, no order lines, or any quantity or line the parser cannot resolve with confidence.
+    """
+    date_match = REQUEST_DATE_PATTERN.search(request_text)
+    if date_match is None:
+        return None
+    body = REQUEST_DATE_PATTERN.sub(" ", request_text)
+    body = TEXT_DATE_PATTERN.sub(lambda m: " " * len(m.group(0)), body)
+
+    items = []
+    spans = []
+    for line in ORDER_LINE_PATTERN.finditer(body):
+        unit = line.group(2).lower() if line.group(2) else None
+        quantity = int(line.group(1).replace(",", ""))
+        catalog_name = _resolve_order_description(line.group(3))
+        if unit not in FAST_PATH_UNITS or quantity <= 0 or catalog_name is None:
+            return None
+        items.append({"item_name": catalog_name, "quantity": quantity, "description": line.group(3).strip()})
+        spans.append(line.span())
+    if not items:
+        return None
+
+    # Every number must belong to an order line, and the lines must form one list with
+    # nothing else ("... and balloons") inside it
+    outside = "".join(body[end:start] for (_, end), (start, _) in zip([(0, 0)] + spans, spans + [(len(body), 0)]))
+    if any(ch.isdigit() for ch in outside):
+        return None
+    for (_, end), (start, _) in zip(spans, spans[1:]):
+        if not ORDER_SEPARATOR_PATTERN.fullmatch(body[end:start]):
+            return None
+    tail = re.split(r"[.\n!?]", body[spans[-1][1]:], maxsplit=1)[0]
+    if tail.strip():
+        return None
+
+    return {"request_date": date_match.group(1), "items": items}
+
+
+def run_fast_path(request_text: str) -> Union[str, None]:
+    """
+    Fulfil a fully structured order without the agents: check stock, quote and sell.
 
-        # Process request
-        request_with_date = f"{row['request']} (Date of request: {request_date})"
+    Mirrors the agent workflow (check_item_stock -> calculate_quote -> finalize_sale): lines
+    in stock are quoted together, sold at their discounted line price in one batch, and the
+    rest are reported as unavailable.
 
-        # Process the customer request through the multi-agent system
-        response = process_customer_request(request_with_date)
+    Args:
+        request_text (str): Customer request ending with "(Date of request: YYYY-MM-DD)".
 
-        # Update state
-        report = generate_financial_report(request_date)
-        current_cash = round(report["cash_balance"], 2)
-        current_inventory = round(report["inventory_value"], 2)
+    Returns:
+        str or None: The customer-facing response, or None if the request needs the agents.
+    """
+    order = parse_order_request(request_text)
+    if order is None:
+        return None
+    request_date = order["request_date"]
+
+    def check_quote_and_sell(conn: Connection):
+        # The quote depends on which lines are in stock, so check, quote and sell in one write transaction
+        stock = _available_as_of(conn, _day_number(request_date))
+        available = []
+        unavailable = []
+        for item in order["items"]:
+            on_hand = stock.get(item["item_name"], 0)
+            if on_hand >= item["quantity"]:
+                available.append(item)
+                stock[item["item_name"]] = on_hand - item["quantity"]
+            else:
+                unavailable.append((item, on_hand))
+
+        quote = build_quote(available, request_date, conn) if available else None
+        txn_ids = []
+        if quote is not None:
+            txn_ids = _insert_transactions(conn, _transaction_rows([
+                {
+                    "item_name": line["catalog_name"],
+                    "transaction_type": "sales",
+                    "quantity": line["quantity"],
+                    "price": round(line["net_total"], 2),
+                    "date": request_date,
+                }
+                for line in quote["lines"]
+            ]))
+        return quote, unavailable, txn_ids
+
+    quote, unavailable, txn_ids = run_write_transaction(check_quote_and_sell)
+    return format_order_response(request_date, quote, txn_ids, unavailable)
+
+
+def format_order_response(
+    request_date: str,
+    quote: Union[Dict, None],
+    txn_ids: List[int],
+    unavailable: List[tuple],
+    not_in_catalog: List[Dict] = (),
+) -> str:
+    """
+    Compose the customer-facing response for an order fulfilled without the agents.
 
-        print(f"Response: {response}")
-        print(f"Updated Cash: ${current_cash:.2f}")
-        print(f"Updated Inventory: ${current_inventory:.2f}")
+    Args:
+        request_date (str): Order date in ISO format (YYYY-MM-DD), for the delivery estimate.
+        quote (Dict or None): The quote (see build_quote) of the lines sold, or None if nothing was sold.
+        txn_ids (List[int]): Transaction IDs of the sales, quoted as the order reference.
+        unavailable (List[tuple]): (item, units on hand) for each line that could not be supplied,
+            each item a dict with 'item_name' and 'quantity'.
+        not_in_catalog (List[Dict], optional): Requested lines matching no catalog item. Default is none.
 
-        results.append(
-            {
-                "request_id": req_num,
-                "request_date": request_date,
-                "cash_balance": current_cash,
-                "inventory_value": current_inventory,
-                "response": response,
-            }
-        )
+    Returns:
+        str: The response, signed by the company.
+    """
+    response = "Thank you for your order.\n"
+    if quote is not None:
+        total_units = sum(line["quantity"] for line in quote["lines"])
+        response += "\nWe have confirmed the following items from stock:\n"
+        for line in quote["lines"]:
+            response += "  - {} x {} at ${:.2f} each = ${:.2f}\n".format(
+                line["quantity"], line["catalog_name"], line["unit_price"], line["line_total"]
+            )
+        response += "Subtotal: ${:.2f}\n".format(quote["subtotal"])
+        if quote["discount"] > 0:
+            response += "Bulk discount ({:.0f}% for {} units): -${:.2f}\n".format(
+                quote["discount"] * 100, total_units, quote["discount_amount"]
+            )
+        response += "Total: ${:.2f}\n".format(quote["total"])
+        response += "Estimated delivery: {}\n".format(get_supplier_delivery_date(request_date, total_units))
+        response += "Order reference: {}\n".format(", ".join(str(txn_id) for txn_id in txn_ids))
+    if unavailable or not_in_catalog:
+        response += "\nUnfortunately we cannot supply the following items at this time:\n"
+        for item, on_hand in unavailable:
+            response += "  - {} x {}: only {} units in stock\n".format(item["quantity"], item["item_name"], on_hand)
+        for item in not_in_catalog:
+            response += "  - {} x {}: not in our catalog\n".format(item["quantity"], item["item_name"])
+    if quote is None:
+        response += "\nNo part of this order could be fulfilled, so no sale has been recorded.\n"
+    response += "\nBest regards,\nBeaver's Choice Paper Company"
+    return response
 
-        time.sleep(2)  # Rate limit buffer for multiple LLM calls per request
 
-    # Final report
-    final_date = quote_requests_sample["request_date"].max().strftime("%Y-%m-%d")
-    final_report = generate_financial_report(final_date)
-    print("\n===== FINAL FINANCIAL REPORT =====")
-    print(f"Final Cash: ${final_report['cash_balance']:.2f}")
-    print(f"Final Inventory: ${final_report['inventory_value']:.2f}")
+# =====================================================================
+# Agent system
+# The model, the agent tools, the agents and the test scenario runner live in agent_team.py,
+# so the helpers above import without smolagents or the OpenAI client.
+# =====================================================================
 
-    # Save results
-    pd.DataFrame(results).to_csv("test_results.csv", index=False)
-    return results
+# === REVIEW: lazy agent_team import ===
+# Purpose: Keep project_starter.build_orchestrator_agent, project_starter.calculate_quote,
+#   project_starter.run_test_scenarios, project_starter.orchestrator_agent etc. working for
+#   existing scripts. The first lookup of a name not defined here imports agent_team and
+#   returns its attribute (module __getattr__, PEP 562); helpers never pay for that import.
+def __getattr__(name: str):
+    if not name.startswith("__"):
+        agent_team = importlib.import_module("agent_team")
+        if hasattr(agent_team, name):
+            return getattr(agent_team, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
-    results = run_test_scenarios()
+    # agent_team imports this file as 'project_starter'; reuse this copy instead of loading a second
+    sys.modules.setdefault("project_starter", sys.modules[__name__])
+    importlib.import_module("agent_team").main()
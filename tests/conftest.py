@@ -0,0 +1,33 @@
+"""
+Shared setup for the equivalence tests.
+
+The tests import the project modules and the reference implementations in benchmarks.py from
+the repository root, read the seed CSVs relative to it, and never call a hosted model.
+Run from anywhere with:
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("MODEL_BACKEND", "scripted")
+os.environ.setdefault("SCRIPTED_MODEL_LATENCY", "0")
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    """Run every test from the repository root, where the seed CSVs live."""
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def database():
+    """A freshly initialized database in a temp directory, installed as project_starter.db_engine."""
+    import benchmarks
+
+    with benchmarks.temporary_database() as engine:
+        yield engine
@@ -0,0 +1,222 @@
+"""
+Equivalence tests: each optimized path must give the same answers as the code it replaced.
+
+The reference implementations are the legacy_* copies in benchmarks.py, or a full
+re-aggregation of the raw 'transactions' rows.
+"""
+import json
+import threading
+from collections import Counter
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import agent_team
+import benchmarks
+import project_starter as ps
+
+AS_OF_DATES = ["2025-01-01", "2025-02-01", "2025-03-10", "2025-04-30", "2025-06-15", "2025-09-30", "2025-12-31"]
+
+
+# =====================================================================
+# Stock and cash ledgers
+# =====================================================================
+
+def reaggregate(as_of_date: str):
+    """Cash balance and positive stock per item as of a date, summed from every raw transaction."""
+    transactions = pd.read_sql("SELECT * FROM transactions", ps.db_engine)
+    dates = pd.to_datetime(transactions["transaction_date"].str[:10])
+    transactions = transactions[dates <= pd.Timestamp(as_of_date)]
+    sales = transactions["transaction_type"] == "sales"
+    cash = transactions.loc[sales, "price"].sum() - transactions.loc[~sales, "price"].sum()
+    units = transactions["units"].where(~sales, -transactions["units"])
+    stock = units.groupby(transactions["item_name"]).sum()
+    return float(cash), {item_name: int(units) for item_name, units in stock.items() if units > 0}
+
+
+def test_ledgers_match_full_reaggregation(database):
+    benchmarks.seed_transactions(database, 5_000)
+    # Incremental ledger updates, including back-dated and timestamped rows
+    item_names = pd.read_sql("SELECT item_name FROM inventory ORDER BY item_name", database)["item_name"].tolist()
+    ps.create_transactions([
+        {"item_name": item_names[0], "transaction_type": "stock_orders", "quantity": 40, "price": 12.0,
+         "date": "2025-03-10T09:30:00"},
+        {"item_name": item_names[1], "transaction_type": "sales", "quantity": 3, "price": 4.5, "date": "2025-02-01"},
+        {"item_name": item_names[0], "transaction_type": "sales", "quantity": 5, "price": 7.0, "date": "2025-12-31"},
+    ])
+    ps.create_transaction(item_names[2], "stock_orders", 10, 2.0, "2025-01-01T00:00:00")
+
+    for as_of_date in AS_OF_DATES:
+        cash, stock = reaggregate(as_of_date)
+        assert ps.get_cash_balance(as_of_date) == pytest.approx(cash, abs=1e-6), as_of_date
+        assert ps.get_all_inventory(as_of_date) == stock, as_of_date
+        for item_name in item_names[:3]:
+            stock_level = ps.get_stock_level(item_name, as_of_date)["current_stock"].iloc[0]
+            assert max(int(stock_level), 0) == stock.get(item_name, 0), (as_of_date, item_name)
+        assert ps.generate_financial_report(as_of_date)["cash_balance"] == pytest.approx(cash, abs=1e-6)
+
+
+# =====================================================================
+# Catalog matcher
+# =====================================================================
+
+def test_catalog_matcher_matches_linear_scan_on_the_catalog():
+    for phrase in benchmarks.request_phrases(100_000):
+        assert ps.match_item_name(phrase) == benchmarks.legacy_match_item_name(ps.CATALOG_ITEMS, phrase), phrase
+
+
+def test_catalog_matcher_matches_linear_scan_on_a_large_catalog():
+    names = benchmarks.synthetic_catalog(2_000)
+    catalog_items = {name.lower(): name for name in names}
+    matcher = ps.CatalogMatcher(names)
+    for phrase in benchmarks.request_phrases(2_000):
+        assert matcher.match(phrase) == benchmarks.legacy_match_item_name(catalog_items, phrase), phrase
+
+
+# =====================================================================
+# Pricing engine
+# =====================================================================
+
+def test_pricing_engine_matches_loop(database):
+    engine = ps.pricing_engine()
+    lines = benchmarks.synthetic_order_lines(4_000)
+    quotes = [group[["item_name", "quantity"]].to_dict("records") for _, group in lines.groupby("quote_id")]
+    expected = [benchmarks.legacy_build_quote(items)["total"] for items in quotes]
+
+    summary = engine.summarize(engine.price_lines(lines["item_name"], lines["quantity"], lines["quote_id"]))
+    assert summary["total"].tolist() == expected
+    assert [engine.quote(items)["total"] for items in quotes] == expected
+    assert [ps.build_quote(items)["total"] for items in quotes[:50]] == expected[:50]
+
+
+def test_single_quote_path_matches_batch_pass_with_scoped_tiers():
+    tiers = pd.DataFrame(
+        [("all", "", 500, 0.05), ("all", "", 1000, 0.10), ("category", "paper", 200, 0.03),
+         ("category", "paper", 800, 0.08), ("item", "Cardstock", 100, 0.20)],
+        columns=["scope", "scope_value", "min_units", "rate"],
+    )
+    engine = ps.PricingEngine(pd.DataFrame(ps.paper_supplies), tiers)
+    lines = benchmarks.synthetic_order_lines(2_000)
+    summary = engine.summarize(engine.price_lines(lines["item_name"], lines["quantity"], lines["quote_id"]))
+    for quote_id, group in lines.groupby("quote_id"):
+        quote = engine.quote(group[["item_name", "quantity"]].to_dict("records"))
+        assert quote["total"] == summary.at[quote_id, "total"]
+        assert quote["discount_amount"] == summary.at[quote_id, "discount_amount"]
+        priced = engine.price_lines(group["item_name"], group["quantity"])
+        assert [line["net_total"] for line in quote["lines"]] == [
+            None if catalog_name is None else net_total
+            for catalog_name, net_total in zip(priced["catalog_name"], priced["net_total"])
+        ]
+
+
+# =====================================================================
+# Schema migrations
+# =====================================================================
+
+def test_migration_matches_fresh_init(tmp_path, monkeypatch):
+    reads = {}
+    schemas = {}
+    for label in ("migrated", "fresh"):
+        engine = ps.create_db_engine(str(tmp_path / f"{label}.db"))
+        monkeypatch.setattr(ps, "db_engine", engine)
+        try:
+            if label == "migrated":
+                benchmarks.baseline_init_database(engine)
+                assert ps.migrate_database(engine) == ps.SCHEMA_VERSION
+            else:
+                ps.init_database(engine)
+                item_names = pd.read_sql("SELECT item_name FROM inventory ORDER BY rowid", engine)["item_name"]
+                ps.create_transactions([
+                    {"item_name": item_names.iloc[index], "transaction_type": transaction_type,
+                     "quantity": units, "price": units * unit_price, "date": date}
+                    for index, transaction_type, units, unit_price, date in benchmarks.MIGRATION_ORDERS
+                ])
+            with engine.connect() as conn:
+                schemas[label] = {
+                    table_name: [row[1:] for row in conn.execute(text(f"PRAGMA table_info({table_name})"))]
+                    for table_name in ps.TABLE_SCHEMAS
+                }
+                schemas[label]["indexes"] = sorted(conn.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'"
+                )).scalars())
+            reads[label] = {date: (ps.get_cash_balance(date), ps.get_all_inventory(date)) for date in AS_OF_DATES}
+        finally:
+            engine.dispose()
+
+    assert schemas["migrated"] == schemas["fresh"]
+    for date in AS_OF_DATES:
+        (migrated_cash, migrated_stock), (fresh_cash, fresh_stock) = reads["migrated"][date], reads["fresh"][date]
+        assert migrated_cash == pytest.approx(fresh_cash, abs=1e-6), date
+        assert migrated_stock == fresh_stock, date
+
+
+# =====================================================================
+# Checked writes
+# =====================================================================
+
+def run_concurrently(threads: int, attempts: int, call, *args) -> Counter:
+    """Start `threads` threads together, each making `attempts` calls; count the results."""
+    barrier = threading.Barrier(threads)
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def worker() -> None:
+        barrier.wait()
+        for _ in range(attempts):
+            outcome = call(*args)
+            with lock:
+                outcomes[outcome] += 1
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return outcomes
+
+
+def test_checked_writes_never_oversell(database):
+    sale_date = "2025-06-01"
+    item = max(ps.get_all_inventory(sale_date).items(), key=lambda entry: entry[1])[0]
+    initial_stock = int(ps.get_stock_level(item, sale_date)["current_stock"].iloc[0])
+    # 8 threads x 10 attempts ask for four times the stock
+    quantity = max(1, initial_stock // 20)
+    sales = run_concurrently(8, 10, benchmarks.checked_finalize_sale, item, quantity, 1.0, sale_date)
+
+    cash_before_reorders = ps.get_cash_balance(sale_date)
+    cost = cash_before_reorders / 20
+    reorders = run_concurrently(8, 10, benchmarks.checked_reorder_stock, item, 1, cost, sale_date)
+
+    # Recompute the balances from the raw transactions, independently of the ledger updates
+    ps.rebuild_ledgers(ps.db_engine)
+    final_stock = int(ps.get_stock_level(item, sale_date)["current_stock"].iloc[0])
+    final_cash = ps.get_cash_balance(sale_date)
+    assert sales[True] == initial_stock // quantity
+    assert final_stock == initial_stock - sales[True] * quantity + reorders[True] >= 0
+    assert reorders[True] == 20 or 0 <= final_cash < cost
+    assert final_cash >= -1e-6
+
+
+def test_hold_is_available_to_its_own_sale(database):
+    sale_date = "2025-04-01"
+    item, stock = max(ps.get_all_inventory(sale_date).items(), key=lambda entry: entry[1])
+    with ps.reservation_scope():
+        hold = ps.reserve_quote([{"item_name": item, "quantity": stock - 10}], sale_date)
+        assert ps.get_all_inventory(sale_date)[item] == 10
+        rejected = agent_team.finalize_sale(item, stock - 10, 1.0, sale_date)
+        assert rejected.startswith("SALE REJECTED")
+        sold = agent_team.finalize_sale_items(
+            json.dumps([{"item_name": item, "quantity": stock - 10, "sale_price": 1.0}]), sale_date,
+            hold_id=hold["hold_id"],
+        )
+        assert sold.startswith("Sale completed"), sold
+        other = ps.reserve_quote([{"item_name": item, "quantity": 5}], sale_date)
+        # A sale dated before the quote is not covered by the hold
+        with pytest.raises(ValueError):
+            ps.sell_reservation(other["hold_id"], "2025-03-31")
+    # Leaving the scope releases the unsold hold
+    assert ps.get_held_units(sale_date) == {}
+    with ps.db_engine.connect() as conn:
+        statuses = dict(conn.execute(text("SELECT hold_id, status FROM reservations")).all())
+    assert statuses == {hold["hold_id"]: "sold", other["hold_id"]: "released"}